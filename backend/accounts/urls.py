@@ -1,9 +1,10 @@
 from django.urls import path
 from .views import RegisterView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from core.throttling import LOGIN_THROTTLES
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
-    path('login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('login/', TokenObtainPairView.as_view(throttle_classes=LOGIN_THROTTLES), name='token_obtain_pair'),
+    path('refresh/', TokenRefreshView.as_view(throttle_classes=LOGIN_THROTTLES), name='token_refresh'),
 ]
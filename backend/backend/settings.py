@@ -166,5 +166,150 @@ SIMPLE_JWT = {
 
 
 
+# Cache shared by the booking/scanning helpers in core
+# Swap for a shared backend (e.g. Redis) when running several workers
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Most tickets a single booking request may reserve
+MAX_TICKETS_PER_ORDER = 10
+
+# Most tokens a single bulk-validate request may check
+MAX_BULK_VALIDATE_TOKENS = 1000
+
+# How long a pending ticket holds its seat before release_expired_holds frees it
+SEAT_HOLD_SECONDS = 15 * 60
+
+# Virtual waiting room in front of events/<id>/book/ (see core/waiting_room.py)
+WAITING_ROOM = {
+    'ENABLED': False,
+    'ADMIT_PER_SECOND': 50,
+    'TOKEN_MAX_AGE': 600,  # seconds
+    'STORE': 'core.waiting_room.CacheQueueStore',
+}
+
+# Async booking: with ENABLED on, clients sending "Prefer: respond-async" get
+# 202 and a status URL; run process_booking_intents workers to drain the queue
+ASYNC_BOOKING = {
+    'ENABLED': False,
+    'BATCH_SIZE': 100,  # intents per worker transaction
+}
+
+# Write-behind in-memory inventory for the biggest on-sales (see core/inventory_engine.py)
+# The store must be shared by every process: point CACHE_ALIAS at Redis or
+# Memcached. Process-private stores (InMemoryInventoryStore, LocMemCache) oversell
+# across workers and are refused unless SINGLE_PROCESS says everything, the
+# release_expired_holds sweeper included, runs in one process.
+# Tickets waiting in the write buffer are lost if a worker dies; run
+# reconcile_inventory --recover after a crash
+INVENTORY_ENGINE = {
+    'ENABLED': False,
+    'STORE': 'core.inventory_engine.CacheInventoryStore',
+    'CACHE_ALIAS': 'default',
+    'SINGLE_PROCESS': False,
+    'FLUSH_SIZE': 500,  # tickets per bulk insert
+    'FLUSH_INTERVAL': 0.5,  # seconds between background flushes
+    'MAX_ATTEMPTS': 3,  # failed flushes before an order is dead-lettered and its seats freed
+}
+
+# Token-bucket throttles (see core/throttling.py)
+# burst = bucket size, refill = tokens added per second
+TOKEN_BUCKETS = {
+    'RATES': {
+        'booking_user': {'burst': 10, 'refill': 0.5},
+        'booking_ip': {'burst': 30, 'refill': 2},
+        'booking_event': {'burst': 500, 'refill': 200},
+        'login_ip': {'burst': 20, 'refill': 0.5},
+        'login_account': {'burst': 5, 'refill': 0.1},
+        # Scanning is unthrottled unless these are set. Every gate scans as the
+        # event's organizer, so scan_user is per scanner session (open one per
+        # device); scan_ip is shared by all gates behind a venue's NAT and must
+        # be sized for the whole venue
+        # 'scan_user': {'burst': 60, 'refill': 20},
+        # 'scan_ip': {'burst': 1200, 'refill': 400},
+    },
+}
+
+# Idempotency-Key handling on booking and scan POSTs (see core/idempotency.py)
+IDEMPOTENCY = {
+    'TTL': 24 * 60 * 60,  # seconds a stored response is replayed for
+    'LOCK_TIMEOUT': 30,
+    'WAIT_TIMEOUT': 10,  # how long a concurrent duplicate waits for the first
+}
+
+# Transactional email outbox (see core/outbox.py); run dispatch_outbox to send
+EMAIL_OUTBOX = {
+    'BATCH_SIZE': 100,  # messages per mail connection
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE': 30,  # seconds before the first retry, doubling after each failure
+    'BACKOFF_MAX': 60 * 60,
+}
+
+# Attendee broadcasts (see core/broadcast.py); run send_broadcasts to deliver
+BROADCASTS = {
+    'CHUNK_SIZE': 1000,  # recipients fetched per cursor round trip
+    'RATE': 20,  # messages per second, 0 for unlimited
+    'LEASE': 60,  # seconds a runner's claim on a broadcast lasts between checkpoints
+}
+
+# Offline scan manifests for gate devices (see core/manifest.py)
+SCAN_MANIFEST = {
+    'SIGNING_KEY': None,  # key provisioned on gate devices; derived from SECRET_KEY when unset
+    'BLOOM_FALSE_POSITIVE_RATE': 0.001,
+    'DELTA_OVERLAP': 5,  # seconds a delta reaches back before its base version
+}
+
+# Stateless signed QR payloads (see core/signed_tickets.py)
+# KEYS maps key id -> secret; ACTIVE_KEY signs, every listed key verifies
+SIGNED_TICKETS = {
+    'ENABLED': False,
+    'KEYS': {},  # derived from SECRET_KEY when empty
+    'ACTIVE_KEY': None,
+    'MAX_AGE': None,  # seconds
+}
+
+# Read-through cache for GET validate-ticket/ (see core/validation_cache.py)
+VALIDATION_CACHE = {
+    'ENABLED': False,
+    'TTL': 30 * 60,  # seconds a projection is kept
+    'TOMBSTONE_TTL': 10,  # seconds an invalidation blocks re-caching
+}
+
+# Live scan metrics (core/scan_metrics.py): aggregated in process, published
+# to the cache every FLUSH_INTERVAL seconds; never written to the database
+SCAN_METRICS = {
+    'ENABLED': True,
+    'BUCKET_SECONDS': 10,
+    'RETENTION': 15 * 60,  # seconds of history kept
+    'FLUSH_INTERVAL': 5,  # seconds between publishes
+}
+
+# Live check-in feed for dashboards (see core/live_feed.py); needs ASGI
+# (backend.asgi:application, e.g. under uvicorn) and answers 501 under WSGI.
+# The in-process broker reaches one process; plug in a shared one for more
+LIVE_FEED = {
+    'BROKER': 'core.live_feed.InProcessBroker',
+    'QUEUE_SIZE': 1000,  # messages a slow dashboard may lag before it is cut off
+    'HEARTBEAT': 15,  # seconds
+    'SNAPSHOT_TTL': 2,  # seconds a snapshot is shared between connecting dashboards
+}
+
+# Recently-scanned tokens refused from memory at the gate (see core/recent_scans.py)
+RECENT_SCANS = {
+    'ENABLED': False,
+    'TTL': 5 * 60,  # seconds a scanned token is remembered
+    'MAX_PER_EVENT': 50000,  # oldest entries are dropped beyond this
+    'SHARED': True,  # mirror to the cache so other processes see it too
+}
+
+# Signed scanner sessions for gate devices (see core/scanner_sessions.py)
+SCANNER_SESSIONS = {
+    'MAX_AGE': 8 * 60 * 60,  # seconds; sessions cannot be revoked early, keep it to a shift
+    'MAX_EVENTS': 50,  # events one session may cover
+}
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # for dev
 DEFAULT_FROM_EMAIL = 'noreply@ticketing.co.ke'
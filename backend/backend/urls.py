@@ -5,6 +5,7 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 from rest_framework import permissions
+from core.throttling import LOGIN_THROTTLES
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
@@ -21,8 +22,8 @@ schema_view = get_schema_view(
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/token/', TokenObtainPairView.as_view(throttle_classes=LOGIN_THROTTLES), name='token_obtain_pair'),
+    path('api/token/refresh/', TokenRefreshView.as_view(throttle_classes=LOGIN_THROTTLES), name='token_refresh'),
     path('api/', include('core.urls')),
     path('api/auth/', include('accounts.urls')),
     # Add this for API docs
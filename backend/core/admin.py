@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Event, Ticket
+from .models import Event, ScanConflict, Ticket
 
 admin.site.register(Event)
 admin.site.register(Ticket)
+admin.site.register(ScanConflict)
@@ -0,0 +1,123 @@
+"""
+Booking service shared by TicketCreateView and the async booking workers.
+
+book_tickets() claims seats through whichever inventory mode the event
+uses and creates the tickets. process_booking_intents() is the worker side
+of the async pipeline. It drains queued BookingIntent rows in id order, in
+batches, books each one and records the outcome.
+
+Confirmation emails go through the outbox (core/outbox.py) and are written
+in the booking transaction, so neither path waits on the mail server.
+"""
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import live_feed
+from .holds import hold_expiry
+from .inventory_engine import get_engine
+from .models import BookingIntent, Ticket
+from .outbox import build_email
+from .ticket_pool import claim_pooled_tickets
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'BATCH_SIZE': 100,
+}
+
+
+def get_async_config():
+    return {**DEFAULTS, **getattr(settings, 'ASYNC_BOOKING', {})}
+
+
+def async_requested(request):
+    """Whether the client asked for async booking (Prefer: respond-async) and it is enabled"""
+    if not get_async_config()['ENABLED']:
+        return False
+    prefer = request.headers.get('Prefer', '')
+    return 'respond-async' in [token.strip() for token in prefer.split(',')]
+
+
+def book_tickets(event, user, quantity=1, **fields):
+    """
+    Claim seats, create the user's tickets and queue the confirmation email;
+    returns the tickets, or None when sold out
+    """
+    fields.setdefault('hold_expires_at', hold_expiry())
+
+    engine = get_engine()
+    if engine:
+        # Admission from memory; the tickets are written behind in batches
+        if not engine.claim(event.pk, quantity):
+            return None
+        live_feed.publish(event.pk, live_feed.BOOKED, quantity)
+        # The email is buffered too and written in the same flush as the tickets
+        return engine.enqueue([
+            Ticket.prepare(user=user, event=event, **fields) for _ in range(quantity)
+        ], emails=[booking_confirmation(user, event, quantity)])
+
+    # Claim the seats and insert the tickets together; a failed insert
+    # rolls the counter back with it
+    with transaction.atomic():
+        if event.pre_minted:
+            # The pool is the inventory; no counter to update
+            tickets = claim_pooled_tickets(event, user, quantity, **fields)
+            if tickets is None:
+                return None
+        else:
+            if not event.reserve_seats(quantity):
+                return None
+            tickets = Ticket.objects.bulk_create([
+                Ticket.prepare(user=user, event=event, **fields) for _ in range(quantity)
+            ])
+        booking_confirmation(user, event, quantity).save()
+        live_feed.publish(event.pk, live_feed.BOOKED, quantity)
+    return tickets
+
+
+def booking_confirmation(user, event, quantity):
+    """One unsaved outbox email confirming a whole order"""
+    if quantity == 1:
+        reserved = f"your ticket for {event.name} has been reserved"
+    else:
+        reserved = f"your {quantity} tickets for {event.name} have been reserved"
+    return build_email(
+        subject='Your Ticket Confirmation',
+        message=f"Hi {user.username}, {reserved}. See you there!",
+        recipient_list=[user.email],
+    )
+
+
+def process_booking_intents(batch_size=None):
+    """Book one batch of queued intents in arrival order; returns how many were processed"""
+    batch_size = batch_size or get_async_config()['BATCH_SIZE']
+    with transaction.atomic():
+        queued = (
+            BookingIntent.objects.filter(status='queued')
+            .select_related('event', 'user')
+            .order_by('pk')
+        )
+        if connection.features.has_select_for_update_skip_locked:
+            # Parallel workers take different intents instead of waiting
+            queued = queued.select_for_update(skip_locked=True, of=('self',))
+        intents = list(queued[:batch_size])
+
+        for intent in intents:
+            try:
+                tickets = book_tickets(intent.event, intent.user, intent.quantity, booking_intent=intent)
+            except Exception:
+                logger.exception('Booking intent %s failed', intent.reference)
+                intent.status, intent.error = 'failed', 'Booking could not be completed'
+            else:
+                if tickets is None:
+                    intent.status, intent.error = 'rejected', 'Not enough tickets available'
+                else:
+                    intent.status = 'confirmed'
+            intent.processed_at = timezone.now()
+
+        BookingIntent.objects.bulk_update(intents, ['status', 'error', 'processed_at'])
+    return len(intents)
@@ -0,0 +1,179 @@
+"""
+Emails to every ticket holder of an event (reschedules, cancellations).
+
+send_broadcast() streams recipients in user id order with
+QuerySet.iterator(), which uses a server-side cursor on PostgreSQL and
+holds at most CHUNK_SIZE rows in memory. The subject and body templates
+are compiled once and rendered once per chunk. Every message goes out over
+one reused mail connection, paced to RATE messages per second.
+
+Templates only ever see a plain dict of the event's public fields
+(template_context), never model instances, so they cannot walk the ORM
+to other attendees. Tags that reach outside the template ({% load %},
+{% include %}, {% extends %}, {% debug %}) are refused when the broadcast
+is created and again when it is sent.
+
+A runner first claims the broadcast with a conditional UPDATE that takes a
+LEASE-second lease, and skips it if another runner holds a live one, so
+overlapping runs never stream the same recipients. Progress is
+checkpointed on the Broadcast row after every recipient, and every
+checkpoint renews the lease. A checkpoint that finds the lease taken over
+stops the run. A run that dies resumes, once its lease lapses, after the
+last recipient it reached, so at most the message in flight at the time
+of the crash can be sent twice. Messages the
+mail server refuses are handed to the outbox, which retries them with
+backoff.
+"""
+import logging
+import time
+import uuid
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F, Q
+from django.template import Context, Template, TemplateSyntaxError
+from django.template.defaulttags import DebugNode, LoadNode
+from django.template.loader_tags import ExtendsNode, IncludeNode
+from django.utils import timezone
+
+from .models import Broadcast, Ticket
+from .outbox import queue_email
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CHUNK_SIZE': 1000,
+    'RATE': 20,  # messages per second, 0 for unlimited
+    'LEASE': 60,  # seconds a claim lasts without a checkpoint
+}
+
+
+# Template tags a broadcast may not use
+FORBIDDEN_NODES = {
+    LoadNode: 'load', IncludeNode: 'include', ExtendsNode: 'extends', DebugNode: 'debug',
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'BROADCASTS', {})}
+
+
+def compile_template(source):
+    """Compile a broadcast template; raises TemplateSyntaxError for bad syntax or forbidden tags"""
+    template = Template(source)
+    for node_type, tag in FORBIDDEN_NODES.items():
+        if template.nodelist.get_nodes_by_type(node_type):
+            raise TemplateSyntaxError(f'{{% {tag} %}} is not allowed in broadcasts')
+    return template
+
+
+def template_context(event):
+    """The only values broadcast templates can see"""
+    return {
+        'event': {
+            'name': event.name,
+            'location': event.location,
+            'start_time': event.start_time,
+            'end_time': event.end_time,
+        }
+    }
+
+
+def recipients(broadcast):
+    """(user id, email) of holders not reached yet, in checkpoint order"""
+    holders = Ticket.objects.filter(event_id=broadcast.event_id).exclude(
+        status__in=Ticket.UNSOLD_STATUSES
+    ).values('user_id')
+    return (
+        get_user_model().objects.filter(pk__in=holders, pk__gt=broadcast.last_recipient_id)
+        .exclude(email='')
+        .order_by('pk')
+        .values_list('pk', 'email')
+    )
+
+
+def claim(broadcast, owner, lease):
+    """Take the broadcast for this runner; False if another runner holds a live lease"""
+    now = timezone.now()
+    return bool(
+        Broadcast.objects.filter(pk=broadcast.pk, status__in=['queued', 'sending'])
+        .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now))
+        .update(status='sending', claimed_by=owner, claimed_until=now + timedelta(seconds=lease))
+    )
+
+
+def send_broadcast(broadcast, chunk_size=None, rate=None):
+    """
+    Send (or resume) a broadcast; returns it with its final counts, or None
+    when another runner is sending it
+    """
+    config = get_config()
+    chunk_size = chunk_size or config['CHUNK_SIZE']
+    rate = config['RATE'] if rate is None else rate
+    interval = 1 / rate if rate else 0
+
+    owner = uuid.uuid4().hex
+    if not claim(broadcast, owner, config['LEASE']):
+        return None
+    # Re-read the checkpoint now that nobody else can move it
+    broadcast.refresh_from_db()
+    ours = Broadcast.objects.filter(pk=broadcast.pk, claimed_by=owner)
+    subject_template = compile_template(broadcast.subject)
+    body_template = compile_template(broadcast.body)
+    event_context = template_context(broadcast.event)
+    stream = recipients(broadcast).iterator(chunk_size=chunk_size)
+
+    mail_connection = get_connection()
+    next_send = time.monotonic()
+    completed = False
+    try:
+        while True:
+            chunk = list(islice(stream, chunk_size))
+            if not chunk:
+                break
+
+            context = Context(event_context, autoescape=False)
+            subject = subject_template.render(context).strip()
+            body = body_template.render(context)
+
+            for user_id, email in chunk:
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_send = max(next_send, time.monotonic()) + interval
+
+                sent = failed = 0
+                try:
+                    EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [email], connection=mail_connection).send()
+                    sent = 1
+                except Exception as exc:
+                    logger.warning('Broadcast %s to user %s failed, queued for retry: %s', broadcast.pk, user_id, exc)
+                    # Drop the broken connection; the backend reopens on the next send
+                    mail_connection.close()
+                    queue_email(subject, body, [email])
+                    failed = 1
+
+                checkpointed = ours.update(
+                    last_recipient_id=user_id,
+                    sent_count=F('sent_count') + sent,
+                    failed_count=F('failed_count') + failed,
+                    claimed_until=timezone.now() + timedelta(seconds=config['LEASE']),
+                )
+                if not checkpointed:
+                    logger.warning('Broadcast %s was taken over by another runner; stopping', broadcast.pk)
+                    broadcast.refresh_from_db()
+                    return broadcast
+        completed = True
+    finally:
+        mail_connection.close()
+        if completed:
+            ours.update(status='completed', completed_at=timezone.now(), claimed_by='', claimed_until=None)
+        else:
+            # Let the next run resume straight away instead of waiting out the lease
+            ours.update(claimed_by='', claimed_until=None)
+
+    broadcast.refresh_from_db()
+    return broadcast
@@ -0,0 +1,81 @@
+"""
+Expiring seat holds for pending tickets.
+
+Bookings create pending tickets with hold_expires_at set SEAT_HOLD_SECONDS
+ahead. release_expired_holds() cancels the ones that were never paid and
+hands their seats back to the event, one bounded batch at a time. Each
+batch is an index range read on ticket_pending_hold_idx plus one set-based
+UPDATE per event in it, so the sweep stays cheap however large core_ticket
+grows. The UPDATE repeats the expiry conditions, so a ticket paid (or
+released by another sweeper) after the read is left alone and its seat is
+not handed back twice.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import live_feed, validation_cache
+from .models import Event, Ticket
+
+
+def hold_expiry(now=None):
+    """When a hold placed now should lapse, or None if holds are disabled"""
+    seconds = getattr(settings, 'SEAT_HOLD_SECONDS', None)
+    if not seconds:
+        return None
+    return (now or timezone.now()) + timedelta(seconds=seconds)
+
+
+def release_expired_batch(batch_size=500, now=None):
+    """Cancel up to batch_size expired holds; returns how many were released"""
+    return _release_batch(batch_size, now or timezone.now())[0]
+
+
+def _release_batch(batch_size, now):
+    """(holds released, candidate holds read); the two differ when a hold was paid or taken meanwhile"""
+    with transaction.atomic():
+        expired = (
+            Ticket.objects.filter(status='pending', hold_expires_at__lte=now)
+            .order_by('hold_expires_at')
+        )
+        if connection.features.has_select_for_update_skip_locked:
+            # Concurrent sweepers take different rows instead of waiting
+            expired = expired.select_for_update(skip_locked=True)
+        rows = list(expired.values_list('pk', 'event_id', 'validation_token')[:batch_size])
+        if not rows:
+            return 0, 0
+
+        # Stale tokens only cost a cache miss, so invalidate every row read
+        validation_cache.invalidate([token for _, _, token in rows])
+
+        per_event = defaultdict(list)
+        for pk, event_id, _ in rows:
+            per_event[event_id].append(pk)
+        released = 0
+        for event in Event.objects.filter(pk__in=per_event).only('pk', 'inventory_shards', 'pre_minted'):
+            count = Ticket.objects.filter(
+                pk__in=per_event[event.pk], status='pending', hold_expires_at__lte=now
+            ).update(status='cancelled', hold_expires_at=None, updated_at=timezone.now())
+            if count:
+                event.release_seats(count)
+                live_feed.publish(event.pk, live_feed.CANCELLED, count)
+                released += count
+    return released, len(rows)
+
+
+def release_expired_holds(batch_size=500, max_batches=None, now=None):
+    """Release expired holds batch by batch until none are left"""
+    now = now or timezone.now()
+    released = batches = 0
+    while max_batches is None or batches < max_batches:
+        count, candidates = _release_batch(batch_size, now)
+        released += count
+        batches += 1
+        # A short read means the backlog is drained, however many of those
+        # rows were still ours to cancel
+        if candidates < batch_size:
+            break
+    return released
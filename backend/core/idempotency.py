@@ -0,0 +1,127 @@
+"""
+Idempotency-Key support for POST endpoints.
+
+The first request carrying a given key runs the view and its response is
+stored in the cache for IDEMPOTENCY['TTL'] seconds, keyed by user, path and
+key. Retries get the stored response back without running the view again.
+A duplicate that arrives while the first is still running waits for its
+result; if the first request fails without a response, one of the waiters
+takes over.
+"""
+import functools
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+DEFAULTS = {
+    'TTL': 24 * 60 * 60,
+    'LOCK_TIMEOUT': 30,
+    'WAIT_TIMEOUT': 10,
+    'POLL_INTERVAL': 0.05,
+    'CACHE_ALIAS': 'default',
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'IDEMPOTENCY', {})}
+
+
+def cache_key(user_id, path, key):
+    digest = hashlib.sha256(f'{user_id}:{path}:{key}'.encode()).hexdigest()
+    return f'idempotency:{digest}'
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()[:16]
+
+
+def _replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return Response({
+            'error': f'{HEADER} was already used with a different request body'
+        }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    response = Response(json.loads(stored['content']), status=stored['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def has_result(request):
+    """
+    Whether a POST carries an Idempotency-Key whose response is stored or
+    still being produced, i.e. the view will replay rather than run. Checks
+    that consume something per attempt (a waiting room admission) let such
+    retries through so they reach the replay.
+    """
+    key = request.headers.get(HEADER)
+    if request.method != 'POST' or not key or len(key) > MAX_KEY_LENGTH:
+        return False
+    result_key = cache_key(request.user.pk, request.path, key)
+    return bool(caches[get_config()['CACHE_ALIAS']].get_many([result_key, f'{result_key}:lock']))
+
+
+def idempotent(view_func):
+    """
+    Honour the Idempotency-Key header on POST requests. Apply it inside
+    @api_view (or with method_decorator on an APIView method) so it sees
+    the DRF request.
+    """
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if request.method != 'POST' or not key:
+            return view_func(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({
+                'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        config = get_config()
+        cache = caches[config['CACHE_ALIAS']]
+        result_key = cache_key(request.user.pk, request.path, key)
+        lock_key = f'{result_key}:lock'
+        fingerprint = _fingerprint(request)
+        deadline = time.monotonic() + config['WAIT_TIMEOUT']
+
+        while True:
+            stored = cache.get(result_key)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+
+            if cache.add(lock_key, fingerprint, timeout=config['LOCK_TIMEOUT']):
+                break
+
+            if time.monotonic() >= deadline:
+                return Response({
+                    'error': f'A request with this {HEADER} is still being processed'
+                }, status=status.HTTP_409_CONFLICT)
+            time.sleep(config['POLL_INTERVAL'])
+
+        try:
+            # The first request may have finished between our read and the lock
+            stored = cache.get(result_key)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code < 500 and hasattr(response, 'data'):
+                cache.set(result_key, {
+                    'fingerprint': fingerprint,
+                    'status': response.status_code,
+                    'content': JSONRenderer().render(response.data),
+                }, timeout=config['TTL'])
+            return response
+        finally:
+            cache.delete(lock_key)
+
+    return wrapper
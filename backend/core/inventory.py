@@ -0,0 +1,120 @@
+"""
+Sharded seat inventory for hot on-sale events.
+
+A sharded event keeps its remaining seats in several InventoryShard rows.
+Bookings claim from a random bucket with a conditional UPDATE, so
+concurrent requests mostly lock different rows. Event.tickets_sold is not
+touched on the hot path; it is rolled up from the buckets by
+sync_sold_counter() (run by the rebalance_inventory command).
+"""
+import random
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
+
+from .models import Event, InventoryShard
+
+
+def _split(total, buckets):
+    """Spread total over buckets as evenly as possible"""
+    base, extra = divmod(total, buckets)
+    return [base + (1 if i < extra else 0) for i in range(buckets)]
+
+
+def sharded_remaining(event):
+    """Seats left across all of an event's buckets"""
+    total = InventoryShard.objects.filter(event_id=event.pk).aggregate(total=Sum('remaining'))['total']
+    return total or 0
+
+
+def shard_inventory(event, shards, remaining=None):
+    """
+    Split the event's remaining seats over `shards` buckets, or fold them
+    back into tickets_sold when shards is 0. `remaining` defaults to what
+    the event currently has left.
+    """
+    with transaction.atomic():
+        event = Event.objects.select_for_update().get(pk=event.pk)
+        if remaining is None:
+            if event.inventory_shards:
+                remaining = sharded_remaining(event)
+            else:
+                remaining = event.available_capacity
+
+        InventoryShard.objects.filter(event=event).delete()
+        if shards:
+            InventoryShard.objects.bulk_create([
+                InventoryShard(event=event, index=index, remaining=amount)
+                for index, amount in enumerate(_split(remaining, shards))
+            ])
+
+        event.inventory_shards = shards
+        event.tickets_sold = max(event.capacity - remaining, 0)
+        event.save(update_fields=['inventory_shards', 'tickets_sold'])
+    return event
+
+
+def claim_from_shards(event, quantity=1):
+    """
+    Claim seats from one bucket, trying buckets in random order. When no
+    single bucket can cover the request the leftovers are pooled by
+    rebalance_shards() and the claim is retried once.
+    """
+    shards = InventoryShard.objects.filter(event_id=event.pk, remaining__gte=quantity)
+
+    for attempt in range(2):
+        candidates = list(shards.values_list('index', flat=True))
+        random.shuffle(candidates)
+        for index in candidates:
+            if shards.filter(index=index).update(remaining=F('remaining') - quantity):
+                return True
+        if attempt == 0 and rebalance_shards(event, min_bucket=quantity) < quantity:
+            break
+    return False
+
+
+def release_to_shards(event, quantity=1):
+    """Return seats to a random bucket"""
+    index = random.randrange(event.inventory_shards)
+    InventoryShard.objects.filter(event_id=event.pk, index=index).update(
+        remaining=F('remaining') + quantity
+    )
+
+
+def rebalance_shards(event, min_bucket=1):
+    """
+    Redistribute the remaining seats evenly over the event's buckets. When
+    there is too little left to give every bucket min_bucket seats the
+    remainder is concentrated in fewer buckets so it can still be sold.
+    Returns the total number of seats left.
+    """
+    with transaction.atomic():
+        rows = list(
+            InventoryShard.objects.select_for_update()
+            .filter(event_id=event.pk)
+            .order_by('index')
+        )
+        if not rows:
+            return 0
+
+        total = sum(row.remaining for row in rows)
+        active = max(1, min(len(rows), total // max(min_bucket, 1)))
+        amounts = _split(total, active) + [0] * (len(rows) - active)
+
+        changed = []
+        for row, amount in zip(rows, amounts):
+            if row.remaining != amount:
+                row.remaining = amount
+                changed.append(row)
+        InventoryShard.objects.bulk_update(changed, ['remaining'])
+    return total
+
+
+def sync_sold_counter(event):
+    """Roll the buckets up into Event.tickets_sold"""
+    remaining = sharded_remaining(event)
+    Event.objects.filter(pk=event.pk).update(
+        tickets_sold=Greatest(F('capacity') - remaining, 0)
+    )
+    return remaining
@@ -0,0 +1,387 @@
+"""
+Write-behind inventory engine for the largest on-sales.
+
+When INVENTORY_ENGINE['ENABLED'] is on, TicketCreateView asks the engine
+for seats instead of updating the Event row. Remaining capacity lives in an
+inventory store that every process must share: by default a Django cache
+(Redis or Memcached) through CacheInventoryStore. Claims are a counter decrement and cost
+microseconds. The booked tickets are buffered and written to core_ticket
+in batches by flush(), together with their confirmation emails. flush()
+runs on a background thread, never in the request: every FLUSH_INTERVAL
+seconds, and as soon as the buffer reaches FLUSH_SIZE.
+
+A batch that fails is retried one order at a time, so one bad row (say,
+its user was deleted) cannot hold up the others. The orders that still
+fail go to the back of the buffer. An order that fails MAX_ATTEMPTS
+flushes in which other orders were written is dead-lettered: logged with
+its validation tokens, kept in engine.dead_letters, and its seats handed
+back. A flush in which nothing could be written does not count, since the
+database is then more likely down than the rows bad.
+
+A store private to one process (InMemoryInventoryStore, or a cache store
+on LocMemCache) is refused unless SINGLE_PROCESS is set. Each process would
+load the same remaining count and sell it again, overselling by up to the
+number of processes, and seats released by release_expired_holds or any
+other command would never reach the web workers. SINGLE_PROCESS is only
+for a deployment (or test run) where bookings, the sweeper and every other
+writer run in one process.
+
+Tickets still in the buffer are lost if the process dies; the durability
+window is FLUSH_INTERVAL. The shared store outlives the process and keeps
+the lost seats counted as claimed; recover() rebuilds it from core_ticket.
+reconcile() checks that the store and the table agree.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils.module_loading import import_string
+
+from .models import Event, OutgoingEmail, Ticket
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'STORE': 'core.inventory_engine.CacheInventoryStore',
+    'SINGLE_PROCESS': False,
+    'FLUSH_SIZE': 500,
+    'FLUSH_INTERVAL': 0.5,
+    'MAX_ATTEMPTS': 3,
+    'CACHE_ALIAS': 'default',
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'INVENTORY_ENGINE', {})}
+
+
+class InMemoryInventoryStore:
+    """
+    Per-event (remaining, unflushed) counters in process memory. unflushed
+    counts seats claimed whose tickets are not in the database yet.
+    """
+    # Only the process that owns the counters can see them
+    shared = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def load(self, event_id, remaining):
+        """Seed an event's counters unless another loader got there first"""
+        with self._lock:
+            if event_id in self._counters:
+                return False
+            self._counters[event_id] = [remaining, 0]
+            return True
+
+    def reset(self, event_id, remaining):
+        with self._lock:
+            self._counters[event_id] = [remaining, 0]
+
+    def claim(self, event_id, quantity):
+        """True if claimed, False if sold out, None if the event is not loaded"""
+        with self._lock:
+            counters = self._counters.get(event_id)
+            if counters is None:
+                return None
+            if counters[0] < quantity:
+                return False
+            counters[0] -= quantity
+            counters[1] += quantity
+            return True
+
+    def release(self, event_id, quantity):
+        with self._lock:
+            if event_id in self._counters:
+                self._counters[event_id][0] += quantity
+
+    def mark_flushed(self, event_id, quantity):
+        with self._lock:
+            if event_id in self._counters:
+                self._counters[event_id][1] -= quantity
+
+    def snapshot(self, event_id):
+        with self._lock:
+            counters = self._counters.get(event_id)
+            return tuple(counters) if counters else None
+
+
+class CacheInventoryStore:
+    """
+    Counters kept in a Django cache with atomic incr/decr, so every worker
+    sharing the cache sees the same inventory.
+    """
+
+    def __init__(self):
+        self.cache = caches[get_config()['CACHE_ALIAS']]
+
+    @property
+    def shared(self):
+        # LocMemCache is a dict inside this process
+        return not isinstance(self.cache, LocMemCache)
+
+    def _keys(self, event_id):
+        return f'inventory:{event_id}:remaining', f'inventory:{event_id}:unflushed'
+
+    def load(self, event_id, remaining):
+        remaining_key, unflushed_key = self._keys(event_id)
+        if not self.cache.add(remaining_key, remaining, timeout=None):
+            return False
+        self.cache.set(unflushed_key, 0, timeout=None)
+        return True
+
+    def reset(self, event_id, remaining):
+        remaining_key, unflushed_key = self._keys(event_id)
+        self.cache.set_many({remaining_key: remaining, unflushed_key: 0}, timeout=None)
+
+    def claim(self, event_id, quantity):
+        remaining_key, unflushed_key = self._keys(event_id)
+        try:
+            left = self.cache.decr(remaining_key, quantity)
+        except ValueError:
+            return None
+        if left < 0:
+            self.cache.incr(remaining_key, quantity)
+            return False
+        self.cache.incr(unflushed_key, quantity)
+        return True
+
+    def release(self, event_id, quantity):
+        try:
+            self.cache.incr(self._keys(event_id)[0], quantity)
+        except ValueError:
+            pass
+
+    def mark_flushed(self, event_id, quantity):
+        try:
+            self.cache.decr(self._keys(event_id)[1], quantity)
+        except ValueError:
+            pass
+
+    def snapshot(self, event_id):
+        remaining_key, unflushed_key = self._keys(event_id)
+        values = self.cache.get_many([remaining_key, unflushed_key])
+        if remaining_key not in values:
+            return None
+        return values[remaining_key], values.get(unflushed_key, 0)
+
+
+def stored_remaining(event_ids):
+    """Remaining seats per event according to core_ticket"""
+    events = Event.objects.filter(pk__in=event_ids).annotate(
+        held=Count('ticket', filter=~Q(ticket__status__in=Ticket.UNSOLD_STATUSES))
+    ).values_list('pk', 'capacity', 'held')
+    return {pk: max(capacity - held, 0) for pk, capacity, held in events}
+
+
+class BufferedOrder:
+    """One booking's tickets and emails waiting to be written together"""
+
+    def __init__(self, tickets, emails):
+        self.tickets = tickets
+        self.emails = emails
+        self.attempts = 0
+        self.error = None
+
+    @property
+    def event_id(self):
+        return self.tickets[0].event_id
+
+
+class InventoryEngine:
+    """Admission decisions from the store, ticket inserts in batches"""
+
+    def __init__(self, store, flush_size=500, flush_interval=None, max_attempts=3):
+        self.store = store
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.dead_letters = []
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher = None
+
+    def claim(self, event_id, quantity=1):
+        """Claim seats from memory, loading the event from the database on first use"""
+        claimed = self.store.claim(event_id, quantity)
+        if claimed is None:
+            for pk, remaining in stored_remaining([event_id]).items():
+                self.store.load(pk, remaining)
+            claimed = self.store.claim(event_id, quantity)
+        return bool(claimed)
+
+    def release(self, event_id, quantity=1):
+        self.store.release(event_id, quantity)
+
+    def enqueue(self, tickets, emails=()):
+        """Buffer one order's tickets (and outbox emails) for the flusher and return the tickets"""
+        with self._buffer_lock:
+            self._buffer.append(BufferedOrder(list(tickets), list(emails)))
+            full = self._pending() >= self.flush_size
+        if full:
+            # Written by the flusher; a write error never reaches the request
+            self._wake.set()
+        if full or self.flush_interval:
+            self._start_flusher()
+        return tickets
+
+    def _pending(self):
+        """Caller holds _buffer_lock"""
+        return sum(len(order.tickets) for order in self._buffer)
+
+    def pending(self):
+        with self._buffer_lock:
+            return self._pending()
+
+    def _take_batch(self):
+        """Orders from the front of the buffer holding up to flush_size tickets (at least one order)"""
+        with self._buffer_lock:
+            taken = count = 0
+            for order in self._buffer:
+                if taken and count + len(order.tickets) > self.flush_size:
+                    break
+                taken += 1
+                count += len(order.tickets)
+            batch = self._buffer[:taken]
+            del self._buffer[:taken]
+        return batch
+
+    def _write(self, orders):
+        per_event = Counter()
+        for order in orders:
+            per_event[order.event_id] += len(order.tickets)
+        with transaction.atomic():
+            Ticket.objects.bulk_create([ticket for order in orders for ticket in order.tickets])
+            OutgoingEmail.objects.bulk_create([email for order in orders for email in order.emails])
+            for event_id, count in per_event.items():
+                Event.objects.filter(pk=event_id).update(tickets_sold=F('tickets_sold') + count)
+        for event_id, count in per_event.items():
+            self.store.mark_flushed(event_id, count)
+        return sum(per_event.values())
+
+    def flush(self):
+        """Write buffered tickets to the database; returns how many were written"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._take_batch()
+                if not batch:
+                    return written
+                try:
+                    written += self._write(batch)
+                except Exception:
+                    logger.exception('Inventory flush of %s order(s) failed; retrying them one by one', len(batch))
+                    written += self._write_one_by_one(batch)
+                    # Whatever failed waits for the next flush rather than spin here
+                    return written
+
+    def _write_one_by_one(self, orders):
+        written = 0
+        failed = []
+        for order in orders:
+            try:
+                written += self._write([order])
+            except Exception as e:
+                order.error = repr(e)
+                failed.append(order)
+        # When nothing could be written the database is more likely down than
+        # the rows bad, so that round does not count against them
+        if written:
+            for order in failed:
+                order.attempts += 1
+        with self._buffer_lock:
+            for order in failed:
+                if order.attempts >= self.max_attempts:
+                    self._dead_letter(order)
+                else:
+                    self._buffer.append(order)
+        return written
+
+    def _dead_letter(self, order):
+        """Give up on an order that keeps failing and hand its seats back; caller holds _buffer_lock"""
+        logger.error(
+            'Dropping %s ticket(s) for event %s after %s failed writes (%s): %s',
+            len(order.tickets), order.event_id, order.attempts, order.error,
+            ', '.join(str(ticket.validation_token) for ticket in order.tickets),
+        )
+        self.dead_letters.append(order)
+        self.store.mark_flushed(order.event_id, len(order.tickets))
+        self.store.release(order.event_id, len(order.tickets))
+
+    def _start_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        self._flusher = threading.Thread(target=self._flush_forever, name='inventory-flusher', daemon=True)
+        self._flusher.start()
+
+    def _flush_forever(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Inventory flush failed; %s ticket(s) kept for retry', self.pending())
+
+    def recover(self, event_ids):
+        """Rebuild the store for the given events from core_ticket"""
+        remaining = stored_remaining(event_ids)
+        for event_id, seats in remaining.items():
+            self.store.reset(event_id, seats)
+        return remaining
+
+    def reconcile(self, event_ids):
+        """
+        Flush, then compare the store with core_ticket. Returns
+        (mismatches, unchecked): mismatches lists (event_id, in_memory,
+        in_database) for events that disagree, where in_memory adds back
+        seats still waiting to be flushed; unchecked lists the events the
+        store has not loaded, which cannot be compared.
+        """
+        self.flush()
+        mismatches = []
+        unchecked = []
+        for event_id, seats in stored_remaining(event_ids).items():
+            snapshot = self.store.snapshot(event_id)
+            if snapshot is None:
+                unchecked.append(event_id)
+                continue
+            remaining, unflushed = snapshot
+            if remaining + unflushed != seats:
+                mismatches.append((event_id, remaining + unflushed, seats))
+        return mismatches, unchecked
+
+
+@lru_cache(maxsize=None)
+def _build_engine(store_path, flush_size, flush_interval, max_attempts, single_process):
+    store = import_string(store_path)()
+    if not (store.shared or single_process):
+        raise ImproperlyConfigured(
+            f"{type(store).__name__} is private to one process and would oversell across workers; "
+            "use a store on a shared cache, or set INVENTORY_ENGINE['SINGLE_PROCESS'] if everything "
+            "runs in one process"
+        )
+    return InventoryEngine(store, flush_size, flush_interval, max_attempts)
+
+
+def get_engine(force=False):
+    """The process-wide engine, or None while INVENTORY_ENGINE is disabled"""
+    config = get_config()
+    if not (config['ENABLED'] or force):
+        return None
+    return _build_engine(
+        config['STORE'], config['FLUSH_SIZE'], config['FLUSH_INTERVAL'],
+        config['MAX_ATTEMPTS'], config['SINGLE_PROCESS'],
+    )
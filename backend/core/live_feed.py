@@ -0,0 +1,197 @@
+"""
+Live check-in feed for organizer dashboards.
+
+GET organizer/events/<id>/live/ is a Server-Sent Events stream. It is
+served by an async view and only streams under an ASGI server, e.g.
+
+    uvicorn backend.asgi:application
+
+A WSGI server would read the never-ending stream to its end before sending
+anything, tying up a worker for good, so under WSGI the view answers 501.
+Deployments that stay on WSGI can route just this path to an ASGI process. A dashboard receives one `snapshot` event with the
+current counts, then a `delta` event for every change:
+
+    event: delta
+    data: {"type": "checked_in", "count": 1}
+
+The types are booked, checked_in and cancelled. Dashboards apply them to
+the snapshot. Watching costs no database queries after the snapshot.
+Snapshots are cached for SNAPSHOT_TTL seconds, so a wave of dashboards
+connecting at once shares one aggregate query. A shared snapshot can miss
+changes from the last SNAPSHOT_TTL seconds before the connection. Set
+SNAPSHOT_TTL to 0 to compute a fresh snapshot for every connection.
+
+Writers call publish() and the broker fans the message out to subscribers.
+A publish is delivered only after its transaction commits. The default
+InProcessBroker reaches subscribers in the same process only. Deployments
+running several workers can plug in a cross-process broker with the same
+publish/subscribe interface through LIVE_FEED['BROKER'].
+
+A subscriber that falls QUEUE_SIZE messages behind is cut off rather than
+allowed to buffer without bound. Its dashboard reconnects and starts again
+from a fresh snapshot.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils.module_loading import import_string
+
+DEFAULTS = {
+    'BROKER': 'core.live_feed.InProcessBroker',
+    'QUEUE_SIZE': 1000,  # messages buffered per subscriber before it is dropped
+    'HEARTBEAT': 15,  # seconds between keep-alive comments
+    'SNAPSHOT_TTL': 2,  # seconds a snapshot is shared between connecting dashboards
+    'CACHE_ALIAS': 'default',
+}
+
+BOOKED = 'booked'
+CHECKED_IN = 'checked_in'
+CANCELLED = 'cancelled'
+
+# Ends a subscription whose queue overflowed
+OVERFLOW = object()
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'LIVE_FEED', {})}
+
+
+class Subscription:
+    """One dashboard's queue, consumed on the event loop that created it"""
+
+    def __init__(self, event_id, maxsize):
+        self.event_id = event_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, message):
+        """Called on self.loop"""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Too far behind: drop the backlog and tell the reader to stop
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+
+    async def get(self, timeout):
+        """Next message, None on timeout, OVERFLOW when cut off"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class InProcessBroker:
+    """
+    Fans messages out to subscribers of this process. A publish wakes
+    each event loop with subscribers once, however many subscribers it
+    has, and can be called from any thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, event_id, maxsize):
+        subscription = Subscription(event_id, maxsize)
+        with self._lock:
+            self._subscribers[event_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.event_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.event_id]
+
+    def publish(self, event_id, message):
+        with self._lock:
+            subscribers = tuple(self._subscribers.get(event_id, ()))
+        by_loop = defaultdict(list)
+        for subscription in subscribers:
+            by_loop[subscription.loop].append(subscription)
+        for loop, batch in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_deliver_all, batch, message)
+            except RuntimeError:
+                # Loop already closed; its subscriptions are going away
+                pass
+
+    def subscriber_count(self, event_id):
+        with self._lock:
+            return len(self._subscribers.get(event_id, ()))
+
+
+def _deliver_all(subscriptions, message):
+    for subscription in subscriptions:
+        subscription.deliver(message)
+
+
+@lru_cache(maxsize=None)
+def _load_broker(path):
+    return import_string(path)()
+
+
+def get_broker():
+    return _load_broker(get_config()['BROKER'])
+
+
+def publish(event_id, kind, count=1):
+    """Announce a change to the event's dashboards once the current transaction commits"""
+    if count:
+        message = {'type': kind, 'count': count}
+        transaction.on_commit(lambda: get_broker().publish(event_id, message))
+
+
+def snapshot(event):
+    """Current counts of the event in one aggregate query, shared for SNAPSHOT_TTL seconds"""
+    from .models import Ticket
+    config = get_config()
+    cache = caches[config['CACHE_ALIAS']]
+    key = f'live-feed:snapshot:{event.pk}'
+    counts = cache.get(key) if config['SNAPSHOT_TTL'] else None
+    if counts is None:
+        counts = Ticket.objects.filter(event=event).aggregate(
+            booked=Count('pk', filter=~Q(status__in=Ticket.UNSOLD_STATUSES)),
+            checked_in=Count('pk', filter=Q(status='used')),
+            cancelled=Count('pk', filter=Q(status='cancelled')),
+        )
+        cache.set(key, counts, timeout=config['SNAPSHOT_TTL'])
+    return {'event_id': event.pk, 'capacity': event.capacity, **counts}
+
+
+def _sse(kind, data):
+    return f'event: {kind}\ndata: {json.dumps(data, default=str)}\n\n'
+
+
+async def stream(event):
+    """SSE chunks for one dashboard: the snapshot, then deltas until it disconnects or falls behind"""
+    config = get_config()
+    broker = get_broker()
+    # Subscribe before taking the snapshot so no change falls in between
+    subscription = broker.subscribe(event.pk, config['QUEUE_SIZE'])
+    try:
+        yield 'retry: 3000\n\n'
+        yield _sse('snapshot', await sync_to_async(snapshot)(event))
+        while True:
+            message = await subscription.get(config['HEARTBEAT'])
+            if message is OVERFLOW:
+                yield _sse('reset', {'reason': 'too far behind, reconnect for a fresh snapshot'})
+                return
+            if message is None:
+                yield ': keep-alive\n\n'
+            else:
+                yield _sse('delta', message)
+    finally:
+        broker.unsubscribe(subscription)
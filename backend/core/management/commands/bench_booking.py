@@ -0,0 +1,71 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Event, Ticket
+from core.ticket_pool import claim_pooled_tickets, mint_pool
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare booking latency of the insert path against claiming pre-minted "
+        "tickets. Everything runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        bookings = options['bookings']
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                username='bench-booking', email='bench-booking@example.invalid', password=None
+            )
+            inserted = self.make_event(user, bookings)
+            pooled = self.make_event(user, bookings)
+
+            started = time.perf_counter()
+            mint_pool(pooled)
+            self.stdout.write(f"Minted {bookings} tickets in {time.perf_counter() - started:.2f}s")
+
+            self.report('insert', self.time_bookings(bookings, lambda: self.book_insert(inserted, user)))
+            self.report('pool claim', self.time_bookings(bookings, lambda: self.book_pooled(pooled, user)))
+            transaction.set_rollback(True)
+
+    def make_event(self, organizer, capacity):
+        start = timezone.now() + timedelta(days=30)
+        return Event.objects.create(
+            name='Booking benchmark', description='', location='', capacity=capacity,
+            start_time=start, end_time=start + timedelta(hours=3), organizer=organizer
+        )
+
+    def book_insert(self, event, user):
+        with transaction.atomic():
+            event.reserve_seats()
+            Ticket.objects.bulk_create([Ticket.prepare(user=user, event=event)])
+
+    def book_pooled(self, event, user):
+        with transaction.atomic():
+            # The pool bounds capacity; no counter update
+            claim_pooled_tickets(event, user)
+
+    def time_bookings(self, count, book):
+        timings = []
+        for _ in range(count):
+            started = time.perf_counter()
+            book()
+            timings.append((time.perf_counter() - started) * 1_000_000)
+        return timings
+
+    def report(self, label, timings):
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.stdout.write(
+            f"{label:>10}: mean {statistics.mean(timings):7.0f}us  "
+            f"p50 {statistics.median(timings):7.0f}us  p95 {p95:7.0f}us"
+        )
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.outbox import dispatch_pending, get_config
+
+
+class Command(BaseCommand):
+    help = "Send queued outbox emails in batches over one mail connection per batch"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=get_config()['BATCH_SIZE'])
+        parser.add_argument(
+            '--interval', type=float,
+            help='Keep polling every N seconds when nothing is due instead of exiting'
+        )
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = dispatch_pending(options['batch_size'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                continue
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(f"Sent {total_sent} email(s), {total_failed} failed attempt(s)")
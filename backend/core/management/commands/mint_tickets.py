@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Event
+from core.ticket_pool import mint_pool
+
+
+class Command(BaseCommand):
+    help = "Pre-mint an event's capacity as unassigned tickets ahead of its on-sale"
+
+    def add_arguments(self, parser):
+        parser.add_argument('event', type=int, nargs='+', help='Event id(s) to mint tickets for')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Tickets per bulk insert')
+
+    def handle(self, *args, **options):
+        events = Event.objects.filter(pk__in=options['event'])
+        missing = set(options['event']) - {event.pk for event in events}
+        if missing:
+            raise CommandError(f"Unknown event id(s): {', '.join(map(str, sorted(missing)))}")
+
+        for event in events:
+            minted = mint_pool(event, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"{event.name}: minted {minted} ticket(s)"))
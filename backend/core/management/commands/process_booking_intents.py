@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.booking import get_async_config, process_booking_intents
+
+
+class Command(BaseCommand):
+    help = (
+        "Drain queued async booking intents. Run several of these side by side "
+        "for a worker pool; on PostgreSQL each takes different intents."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=get_async_config()['BATCH_SIZE'])
+        parser.add_argument(
+            '--interval', type=float,
+            help='Keep polling every N seconds when the queue is empty instead of exiting'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = process_booking_intents(options['batch_size'])
+            total += processed
+            if processed:
+                continue
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(f"Processed {total} booking intent(s)")
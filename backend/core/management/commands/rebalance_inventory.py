@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.inventory import rebalance_shards, shard_inventory, sync_sold_counter
+from core.models import Event
+
+
+class Command(BaseCommand):
+    help = "Rebalance sharded seat inventory, or change an event's shard count"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--event', type=int, action='append', dest='events',
+            help='Only handle the given event id (can be repeated)'
+        )
+        parser.add_argument(
+            '--shards', type=int,
+            help='Set the number of inventory buckets for the given events (0 disables sharding)'
+        )
+
+    def handle(self, *args, **options):
+        shards = options['shards']
+        if shards is not None:
+            if not options['events']:
+                raise CommandError('--shards requires at least one --event')
+            if shards < 0:
+                raise CommandError('--shards must be 0 or more')
+
+            for event in Event.objects.filter(pk__in=options['events']):
+                shard_inventory(event, shards)
+                self.stdout.write(f"{event.name}: {shards} inventory shard(s)")
+            return
+
+        events = Event.objects.filter(inventory_shards__gt=0)
+        if options['events']:
+            events = events.filter(pk__in=options['events'])
+
+        for event in events:
+            rebalance_shards(event)
+            remaining = sync_sold_counter(event)
+            self.stdout.write(f"{event.name}: {remaining} seat(s) left over {event.inventory_shards} shard(s)")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebalanced {len(events)} event(s)"))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.inventory import shard_inventory
+from core.models import Event, Ticket
+
+
+class Command(BaseCommand):
+    help = "Rebuild each event's tickets_sold counter from the Ticket table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--event', type=int, action='append', dest='events',
+            help='Only rebuild the given event id (can be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        held = (
+            Ticket.objects.filter(event=OuterRef('pk'))
+            .exclude(status__in=Ticket.UNSOLD_STATUSES)
+            .values('event')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        actual = Coalesce(Subquery(held), 0)
+
+        events = Event.objects.all()
+        if options['events']:
+            events = events.filter(pk__in=options['events'])
+
+        with transaction.atomic():
+            drifted = events.annotate(actual=actual).exclude(tickets_sold=F('actual')).count()
+            events.update(tickets_sold=actual)
+
+            # Sharded events keep their remaining seats in buckets; refill
+            # them from the rebuilt counter
+            for event in events.filter(inventory_shards__gt=0):
+                shard_inventory(event, event.inventory_shards, remaining=event.available_capacity)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt counters for {events.count()} event(s), {drifted} had drifted"
+        ))
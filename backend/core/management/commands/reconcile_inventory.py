@@ -0,0 +1,66 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from core.inventory_engine import get_engine
+from core.models import Event
+
+
+class Command(BaseCommand):
+    help = "Check the shared inventory store against core_ticket, optionally rebuilding it"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--event', type=int, action='append', dest='events',
+            help='Only check the given event id (can be repeated)'
+        )
+        parser.add_argument(
+            '--recover', action='store_true',
+            help='Rebuild the inventory store from core_ticket after reporting any drift (after a crash)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            engine = get_engine(force=True)
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+        if not engine.store.shared:
+            # This process would only see its own, empty, counters
+            raise CommandError(
+                f"{type(engine.store).__name__} is private to each process and cannot be checked "
+                "from here; configure a shared INVENTORY_ENGINE['STORE']"
+            )
+        events = Event.objects.all()
+        if options['events']:
+            events = events.filter(pk__in=options['events'])
+        event_ids = list(events.values_list('pk', flat=True))
+        missing = set(options['events'] or ()) - set(event_ids)
+        if missing:
+            raise CommandError(f"No such event: {', '.join(map(str, sorted(missing)))}")
+
+        mismatches, unchecked = engine.reconcile(event_ids)
+        for event_id, in_memory, in_database in mismatches:
+            self.stderr.write(
+                f"Event {event_id}: {in_memory} seat(s) left in memory, {in_database} in the database"
+            )
+        if unchecked:
+            self.stderr.write(self.style.WARNING(
+                f"{len(unchecked)} event(s) not loaded in the store, unchecked: "
+                + ', '.join(map(str, unchecked))
+            ))
+
+        if options['recover']:
+            recovered = engine.recover(event_ids)
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt inventory for {len(recovered)} event(s) from core_ticket "
+                f"({len(mismatches)} had drifted)"
+            ))
+            return
+
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} event(s) out of sync")
+        checked = len(event_ids) - len(unchecked)
+        if not checked and event_ids:
+            raise CommandError("No event is loaded in the store; nothing was checked")
+        self.stdout.write(self.style.SUCCESS(
+            f"Inventory matches the database for {checked} event(s), {len(unchecked)} unchecked"
+        ))
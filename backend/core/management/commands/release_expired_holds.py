@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.holds import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = "Cancel pending tickets whose seat hold has expired and free their seats"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--max-batches', type=int,
+            help='Stop after this many batches per sweep'
+        )
+        parser.add_argument(
+            '--interval', type=float,
+            help='Keep sweeping every N seconds instead of exiting'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired_holds(
+                batch_size=options['batch_size'],
+                max_batches=options['max_batches'],
+            )
+            self.stdout.write(f"Released {released} expired hold(s)")
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
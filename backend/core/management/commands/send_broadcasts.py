@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.broadcast import get_config, send_broadcast
+from core.models import Broadcast
+
+
+class Command(BaseCommand):
+    help = (
+        "Send queued attendee broadcasts, resuming any interrupted mid-send "
+        "from their checkpoint"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--broadcast', type=int, help='Only send this broadcast')
+        parser.add_argument('--chunk-size', type=int, default=get_config()['CHUNK_SIZE'])
+        parser.add_argument('--rate', type=float, help='Messages per second (0 for unlimited)')
+        parser.add_argument(
+            '--interval', type=float,
+            help='Keep polling every N seconds for new broadcasts instead of exiting'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            pending = Broadcast.objects.filter(status__in=['queued', 'sending']).select_related('event').order_by('pk')
+            if options['broadcast']:
+                pending = pending.filter(pk=options['broadcast'])
+
+            for broadcast in pending:
+                sent = send_broadcast(broadcast, options['chunk_size'], options['rate'])
+                if sent is None:
+                    self.stdout.write(f"Broadcast {broadcast.pk} is being sent by another runner, skipped")
+                    continue
+                broadcast = sent
+                self.stdout.write(
+                    f"Broadcast {broadcast.pk}: sent {broadcast.sent_count}, "
+                    f"{broadcast.failed_count} queued for retry"
+                )
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,155 @@
+"""
+Signed offline scan manifests for gate devices.
+
+A manifest lets a scanner validate tickets without a round trip per
+attendee. All integers are big-endian. The layout is:
+
+    header   magic b'TKM1', kind (1 byte), event id (uint32),
+             version (uint64), since (uint64)
+    body     kind FULL/DELTA: entries of 16-byte validation token +
+             1 status byte, sorted by token, so devices binary-search
+             in O(log n)
+             kind BLOOM: bit count m (uint32), hash count k (uint8),
+             then ceil(m / 8) bytes of filter bits (bit i is
+             byte i // 8, mask 1 << (i % 8))
+    trailer  32-byte HMAC-SHA256 of everything before it, keyed with
+             signing_key()
+
+Versions are millisecond timestamps of when the manifest was cut. A delta
+since version v carries every ticket that changed since v, including
+cancelled ones, which have status 0. A delta applied on top of its base
+gives the current state. Deltas overlap the previous version by
+DELTA_OVERLAP seconds, so a write that committed late is not missed;
+re-applying an entry is harmless.
+
+The Bloom variant holds only tokens with STATUS_ADMIT. Bit positions for
+a token are (h1 + i * h2) mod m for i < k, where h1 and h2 are the first
+two big-endian uint64s of SHA-256(token bytes).
+"""
+import hashlib
+import hmac
+import math
+import struct
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+from .models import Ticket
+
+MAGIC = b'TKM1'
+HEADER = struct.Struct('>4sBIQQ')
+KIND_FULL, KIND_DELTA, KIND_BLOOM = 0, 1, 2
+
+# Status byte bits; 0 means the token must be refused (cancelled or revoked)
+STATUS_ADMIT = 0x01
+STATUS_USED = 0x02
+STATUS_PENDING = 0x04
+
+DEFAULTS = {
+    'SIGNING_KEY': None,  # shared with gate devices; derived from SECRET_KEY when unset
+    'BLOOM_FALSE_POSITIVE_RATE': 0.001,
+    'DELTA_OVERLAP': 5,  # seconds
+    'CHUNK_SIZE': 2000,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'SCAN_MANIFEST', {})}
+
+
+def signing_key():
+    key = get_config()['SIGNING_KEY']
+    if key:
+        return key.encode() if isinstance(key, str) else key
+    return salted_hmac('core.manifest', 'signing-key', algorithm='sha256').digest()
+
+
+def current_version():
+    return int(timezone.now().timestamp() * 1000)
+
+
+def status_bits(status, is_valid, scanned_at):
+    if status == 'used' or scanned_at is not None:
+        return STATUS_USED
+    if not is_valid:
+        return 0
+    if status == 'paid':
+        return STATUS_ADMIT
+    if status == 'pending':
+        return STATUS_PENDING
+    return 0
+
+
+def _rows(queryset):
+    return queryset.order_by('validation_token').values_list(
+        'validation_token', 'status', 'is_valid', 'scanned_at'
+    ).iterator(chunk_size=get_config()['CHUNK_SIZE'])
+
+
+def _signed_stream(header, entries):
+    signature = hmac.new(signing_key(), digestmod=hashlib.sha256)
+    signature.update(header)
+    yield header
+
+    chunk = bytearray()
+    for token, status, is_valid, scanned_at in entries:
+        chunk += token.bytes
+        chunk.append(status_bits(status, is_valid, scanned_at))
+        if len(chunk) >= 64 * 1024:
+            signature.update(chunk)
+            yield bytes(chunk)
+            chunk = bytearray()
+    signature.update(chunk)
+    yield bytes(chunk)
+    yield signature.digest()
+
+
+def full_manifest(event):
+    """(version, byte chunks) of every booked ticket of the event"""
+    version = current_version()
+    header = HEADER.pack(MAGIC, KIND_FULL, event.pk, version, 0)
+    tickets = Ticket.objects.filter(event=event).exclude(status__in=Ticket.UNSOLD_STATUSES)
+    return version, _signed_stream(header, _rows(tickets))
+
+
+def delta_manifest(event, since):
+    """(version, byte chunks) of tickets that changed since the given version"""
+    version = current_version()
+    header = HEADER.pack(MAGIC, KIND_DELTA, event.pk, version, since)
+    changed_after = (
+        datetime.fromtimestamp(since / 1000, tz=dt_timezone.utc)
+        - timedelta(seconds=get_config()['DELTA_OVERLAP'])
+    )
+    tickets = Ticket.objects.filter(event=event, updated_at__gte=changed_after).exclude(status='unassigned')
+    return version, _signed_stream(header, _rows(tickets))
+
+
+def bloom_positions(token_bytes, bits, hashes):
+    digest = hashlib.sha256(token_bytes).digest()
+    h1, h2 = struct.unpack('>QQ', digest[:16])
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+def bloom_manifest(event):
+    """(version, bytes) of a Bloom filter over the event's admissible tokens"""
+    version = current_version()
+    tokens = [
+        token.bytes for token in
+        Ticket.objects.filter(event=event, status='paid', is_valid=True, scanned_at__isnull=True)
+        .values_list('validation_token', flat=True)
+        .iterator(chunk_size=get_config()['CHUNK_SIZE'])
+    ]
+    rate = get_config()['BLOOM_FALSE_POSITIVE_RATE']
+    count = max(len(tokens), 1)
+    bits = max(math.ceil(-count * math.log(rate) / math.log(2) ** 2), 8)
+    hashes = max(round(bits / count * math.log(2)), 1)
+
+    filter_bits = bytearray(math.ceil(bits / 8))
+    for token in tokens:
+        for position in bloom_positions(token, bits, hashes):
+            filter_bits[position // 8] |= 1 << (position % 8)
+
+    body = HEADER.pack(MAGIC, KIND_BLOOM, event.pk, version, 0) + struct.pack('>IB', bits, hashes) + filter_bits
+    return version, body + hmac.new(signing_key(), body, hashlib.sha256).digest()
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-17 07:22
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_tickets_sold(apps, schema_editor):
+    Event = apps.get_model('core', 'Event')
+    Ticket = apps.get_model('core', 'Ticket')
+    held = (
+        Ticket.objects.filter(event=OuterRef('pk'))
+        .exclude(status='cancelled')
+        .values('event')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    Event.objects.update(tickets_sold=Coalesce(Subquery(held), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_event_organizer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='tickets_sold',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_tickets_sold, migrations.RunPython.noop),
+    ]
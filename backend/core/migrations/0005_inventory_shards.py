@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-17 07:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_event_tickets_sold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='inventory_shards',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='InventoryShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField()),
+                ('remaining', models.PositiveIntegerField(default=0)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_shard_set', to='core.event')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('event', 'index'), name='unique_event_shard_index')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-17 07:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_inventory_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='hold_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['hold_expires_at'], name='ticket_pending_hold_idx'),
+        ),
+    ]
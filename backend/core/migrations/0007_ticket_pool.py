@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-17 07:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_ticket_hold_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='pre_minted',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('cancelled', 'Cancelled'), ('used', 'Used'), ('unassigned', 'Unassigned')], default='pending', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('status', 'unassigned')), fields=['event', 'id'], name='ticket_unassigned_pool_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-17 07:41
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_ticket_pool'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingIntent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('quantity', models.PositiveSmallIntegerField(default=1)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('confirmed', 'Confirmed'), ('rejected', 'Rejected'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_intents', to='core.event')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_intents', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='booking_intent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tickets', to='core.bookingintent'),
+        ),
+        migrations.AddIndex(
+            model_name='bookingintent',
+            index=models.Index(condition=models.Q(('status', 'queued')), fields=['id'], name='bookingintent_queued_idx'),
+        ),
+    ]
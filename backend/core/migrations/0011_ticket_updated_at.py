@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-17 07:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_broadcast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['event', 'updated_at'], name='ticket_event_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-17 08:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_ticket_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='scanned_device',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.CreateModel(
+            name='ScanConflict',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kept_device', models.CharField(blank=True, max_length=100)),
+                ('kept_scanned_at', models.DateTimeField()),
+                ('rejected_device', models.CharField(blank=True, max_length=100)),
+                ('rejected_scanned_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scan_conflicts', to='core.ticket')),
+            ],
+        ),
+    ]
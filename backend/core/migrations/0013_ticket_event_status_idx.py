@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 08:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_scan_sync'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['event', 'status'], name='ticket_event_status_idx'),
+        ),
+    ]
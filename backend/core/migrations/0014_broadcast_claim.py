@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-17 08:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_ticket_event_status_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='broadcast',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='broadcast',
+            name='claimed_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
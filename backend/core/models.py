@@ -1,6 +1,8 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
+from django.utils import timezone
 import uuid
 from django.urls import reverse
 
@@ -20,6 +22,17 @@ class Event(models.Model):
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
     capacity = models.IntegerField()
+    # Denormalized count of tickets holding a seat (see Ticket.UNSOLD_STATUSES).
+    # Only ever changed with conditional UPDATEs; see reserve_seats(). Not kept
+    # for pre-minted events, whose free seats are their unassigned tickets.
+    tickets_sold = models.PositiveIntegerField(default=0)
+    # Number of InventoryShard buckets seats are claimed from; 0 keeps the
+    # single tickets_sold counter. Change it with core.inventory.shard_inventory().
+    inventory_shards = models.PositiveSmallIntegerField(default=0)
+    # Set once the mint_tickets command has pre-minted unassigned tickets
+    # for this event; bookings then claim those rows instead of inserting
+    # and the pool, not tickets_sold, bounds capacity
+    pre_minted = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     # Event organizer relationship
@@ -35,16 +48,91 @@ class Event(models.Model):
     
     def can_be_scanned_by(self, user):
         """Check if user can scan tickets for this event"""
-        return (user == self.organizer or 
-                user.role in ['admin'] or 
+        # Scanner sessions were authorized when they were opened (see core.scanner_sessions)
+        session_events = getattr(user, 'scanner_event_ids', None)
+        if session_events is not None:
+            return self.pk in session_events
+        # Compare ids so the organizer row is never fetched
+        return (user.pk == self.organizer_id or
+                user.role in ['admin'] or
                 user.is_superuser)
 
+    @property
+    def available_capacity(self):
+        return max(self.capacity - self.tickets_sold, 0)
+
+    def reserve_seats(self, quantity=1):
+        """
+        Claim seats against capacity with a single conditional UPDATE.
+        Returns True if the seats were claimed. Call inside the same
+        transaction as the ticket insert so a failed insert rolls it back.
+        """
+        if self.inventory_shards:
+            from .inventory import claim_from_shards
+            return claim_from_shards(self, quantity)
+
+        claimed = Event.objects.filter(
+            pk=self.pk,
+            tickets_sold__lte=F('capacity') - quantity,
+        ).update(tickets_sold=F('tickets_sold') + quantity)
+        return claimed == 1
+
+    def release_seats(self, quantity=1):
+        """Give seats back to the event, never dropping below zero"""
+        from .inventory_engine import get_engine
+        engine = get_engine()
+        if engine:
+            engine.release(self.pk, quantity)
+
+        if self.pre_minted:
+            # The seat is re-minted by mint_pool once the pool runs dry
+            return
+
+        if self.inventory_shards:
+            from .inventory import release_to_shards
+            return release_to_shards(self, quantity)
+
+        Event.objects.filter(
+            pk=self.pk,
+            tickets_sold__gte=quantity,
+        ).update(tickets_sold=F('tickets_sold') - quantity)
+
+
+class InventoryShard(models.Model):
+    """
+    One bucket of an event's remaining seats. Sharded events spread their
+    remaining capacity over several rows so concurrent bookings lock
+    different rows instead of queueing on the Event row.
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='inventory_shard_set')
+    index = models.PositiveSmallIntegerField()
+    remaining = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'index'], name='unique_event_shard_index'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id}#{self.index} ({self.remaining} left)"
 
 
 class Ticket(models.Model):
     """Represents a ticket for an event reserved or bought by a user."""
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Statuses that do not take up a seat
+    UNSOLD_STATUSES = ('cancelled', 'unassigned')
+
+    # Null only for pre-minted tickets that have not been booked yet
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    # Set for tickets booked through the async pipeline
+    booking_intent = models.ForeignKey(
+        'BookingIntent',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='tickets'
+    )
     
     # Enhanced QR Code fields
     validation_token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
@@ -58,14 +146,23 @@ class Ticket(models.Model):
             ("paid", "Paid"),
             ("cancelled", "Cancelled"),
             ("used", "Used"),  # Added for scanned tickets
+            ("unassigned", "Unassigned"),  # Pre-minted, not booked yet
         ],
         default="pending"
     )
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped on every state change; queryset updates must set it explicitly.
+    # Scan manifest deltas are computed from it (see core.manifest)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Pending tickets hold their seat until this time; see core.holds
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
     scanned_at = models.DateTimeField(null=True, blank=True)  # When ticket was scanned/used
     
+    # Gate device that recorded the scan, when it came from an offline scan log
+    scanned_device = models.CharField(max_length=100, blank=True)
+
     # Additional validation fields
     is_valid = models.BooleanField(default=True)
     scanned_by = models.ForeignKey(
@@ -76,31 +173,99 @@ class Ticket(models.Model):
         related_name='scanned_tickets'
     )
 
+    class Meta:
+        indexes = [
+            # Lets the hold sweeper find expired holds without scanning the table
+            models.Index(
+                fields=['hold_expires_at'],
+                condition=models.Q(status='pending'),
+                name='ticket_pending_hold_idx',
+            ),
+            # Lets bookings pick the next pre-minted ticket of an event
+            models.Index(
+                fields=['event', 'id'],
+                condition=models.Q(status='unassigned'),
+                name='ticket_unassigned_pool_idx',
+            ),
+            models.Index(fields=['event', 'updated_at'], name='ticket_event_updated_idx'),
+            # Lets event_stats count an event's tickets per status from the index alone
+            models.Index(fields=['event', 'status'], name='ticket_event_status_idx'),
+        ]
+
+    @staticmethod
+    def build_qr_code(validation_token):
+        """QR code payload for a validation token"""
+        return f"https://yourdomain.com/api/validate-ticket/{validation_token}/"
+
+    @classmethod
+    def prepare(cls, **kwargs):
+        """Build an unsaved ticket with its token and QR code filled in, ready for bulk_create"""
+        ticket = cls(**kwargs)
+        ticket.qr_code = cls.build_qr_code(ticket.validation_token)
+        return ticket
+
     def save(self, *args, **kwargs):
         # Generate QR code URL when ticket is created
         if not self.qr_code:
-            self.qr_code = f"https://yourdomain.com/api/validate-ticket/{self.validation_token}/"
+            self.qr_code = self.build_qr_code(self.validation_token)
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        if not adding:
+            from . import recent_scans, validation_cache
+            validation_cache.invalidate([self.validation_token])
+            if self.status != 'used':
+                recent_scans.discard([self.validation_token])
 
     def mark_as_used(self, scanned_by_user=None):
-        """Mark ticket as used/scanned with permission check"""
+        """
+        Mark ticket as used/scanned with permission check. The scan is a
+        single compare-and-set UPDATE, so when two gates scan the same
+        ticket at once exactly one of them gets True.
+        """
         from django.utils import timezone
         
         # Check if user has permission to scan this ticket
         if scanned_by_user and not self.event.can_be_scanned_by(scanned_by_user):
             return False
         
-        # Check if ticket is already used
-        if self.status == 'used' or not self.is_valid:
+        # Mark as used, only if nobody else has since is_scannable() was checked
+        now = timezone.now()
+        changes = {
+            'status': 'used',
+            'is_valid': False,
+            'scanned_at': now,
+            'scanned_by': scanned_by_user or self.scanned_by,
+            'updated_at': now,
+        }
+        won = Ticket.objects.filter(
+            pk=self.pk, status='paid', is_valid=True, scanned_at__isnull=True
+        ).update(**changes)
+        if not won:
             return False
-        
-        # Mark as used
-        self.status = 'used'
-        self.is_valid = False
-        self.scanned_at = timezone.now()
-        if scanned_by_user:
-            self.scanned_by = scanned_by_user
-        self.save()
+
+        from . import live_feed, recent_scans, validation_cache
+        validation_cache.invalidate([self.validation_token])
+        recent_scans.record(self.event_id, self.event.organizer_id, [self.validation_token])
+        live_feed.publish(self.event_id, live_feed.CHECKED_IN)
+        for field, value in changes.items():
+            setattr(self, field, value)
+        return True
+
+    def cancel(self):
+        """Cancel the ticket and release its seat back to the event"""
+        from django.db import transaction
+
+        with transaction.atomic():
+            cancelled = Ticket.objects.filter(pk=self.pk).exclude(
+                status__in=self.UNSOLD_STATUSES
+            ).update(status='cancelled', updated_at=timezone.now())
+            if not cancelled:
+                return False
+            self.event.release_seats()
+        from . import live_feed, validation_cache
+        validation_cache.invalidate([self.validation_token])
+        live_feed.publish(self.event_id, live_feed.CANCELLED)
+        self.status = 'cancelled'
         return True
 
     def is_scannable(self):
@@ -114,18 +279,149 @@ class Ticket(models.Model):
     @property
     def validation_url(self):
         """Get the full validation URL for QR code"""
-        return f"https://yourdomain.com/api/validate-ticket/{self.validation_token}/"
+        return self.build_qr_code(self.validation_token)
+
+    @property
+    def signed_qr_code(self):
+        """
+        Signed QR payload (see core.signed_tickets), or None while SIGNED_TICKETS
+        is off or the ticket is still in the write-behind buffer
+        """
+        from . import signed_tickets
+        if not signed_tickets.get_config()['ENABLED'] or self.pk is None:
+            return None
+        # Issued at booking time so the code is the same every time it is shown
+        return signed_tickets.sign(self, issued_at=self.created_at.timestamp())
 
     def get_qr_code_data(self):
         """Get QR code data as JSON string"""
         import json
-        return json.dumps({
+        data = {
             'ticket_id': self.id,
             'validation_token': str(self.validation_token)
-        })
+        }
+        if self.signed_qr_code:
+            data['signed'] = self.signed_qr_code
+        return json.dumps(data)
+
+    def __str__(self):
+        holder = self.user.username if self.user_id else 'unassigned'
+        return f"{holder} - {self.event.name} [{self.status}]"
+
+
+class BookingIntent(models.Model):
+    """
+    A booking request queued for the async pipeline. Workers drain queued
+    intents in id order and record the outcome here.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('confirmed', 'Confirmed'),
+        ('rejected', 'Rejected'),
+        ('failed', 'Failed'),
+    ]
+
+    reference = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='booking_intents')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='booking_intents')
+    quantity = models.PositiveSmallIntegerField(default=1)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Lets workers find the oldest queued intents without scanning processed ones
+            models.Index(fields=['id'], condition=models.Q(status='queued'), name='bookingintent_queued_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.reference} ({self.status})"
+
+
+class ScanConflict(models.Model):
+    """
+    A ticket scanned at more than one gate, found while syncing offline scan
+    logs. The earliest scan is kept on the ticket; this records both for review.
+    """
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='scan_conflicts')
+    kept_device = models.CharField(max_length=100, blank=True)
+    kept_scanned_at = models.DateTimeField()
+    rejected_device = models.CharField(max_length=100, blank=True)
+    rejected_scanned_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Ticket {self.ticket_id}: {self.kept_device} vs {self.rejected_device}"
+
+
+class OutgoingEmail(models.Model):
+    """
+    Transactional outbox row. Written in the same transaction as the
+    booking and sent later by dispatch_outbox, so requests never wait on
+    the mail server.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Lets the dispatcher find due messages without scanning sent ones
+            models.Index(
+                fields=['next_attempt_at'],
+                condition=models.Q(status='pending'),
+                name='outgoingemail_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} [{self.status}]"
+
+
+class Broadcast(models.Model):
+    """
+    An email sent to every ticket holder of an event. last_recipient_id is
+    the checkpoint: recipients are streamed in user id order and everyone at
+    or below it has already been sent, so an interrupted run resumes after it.
+    claimed_by/claimed_until is the lease of the runner sending it (see
+    core.broadcast).
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('sending', 'Sending'),
+        ('completed', 'Completed'),
+    ]
+
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='broadcasts')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='broadcasts')
+    subject = models.CharField(max_length=255)
+    body = models.TextField(help_text='Django template; {{ event }} is available')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    last_recipient_id = models.PositiveBigIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    claimed_by = models.CharField(max_length=32, blank=True)
+    claimed_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
-        return f"{self.user.username} - {self.event.name} [{self.status}]"
+        return f"{self.event.name}: {self.subject} [{self.status}]"
 
 
 class User(AbstractUser):
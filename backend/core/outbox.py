@@ -0,0 +1,114 @@
+"""
+Transactional email outbox.
+
+queue_email() writes an OutgoingEmail row instead of talking to the mail
+server. Called inside the booking transaction, the email exists exactly
+when the booking does. dispatch_pending() sends due messages in batches
+over a single backend connection. A failed message is retried after an
+exponential backoff of BACKOFF_BASE * 2 ** (attempts - 1) seconds, capped
+at BACKOFF_MAX, so the first retry waits BACKOFF_BASE. After MAX_ATTEMPTS failures it is marked failed.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BATCH_SIZE': 100,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE': 30,  # seconds
+    'BACKOFF_MAX': 60 * 60,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'EMAIL_OUTBOX', {})}
+
+
+def build_email(subject, message, recipient_list, from_email=None):
+    """An unsaved outbox row, for callers that insert in bulk"""
+    return OutgoingEmail(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(recipient_list),
+    )
+
+
+def queue_email(subject, message, recipient_list, from_email=None):
+    """Record an email for the dispatcher; same arguments as send_mail"""
+    email = build_email(subject, message, recipient_list, from_email)
+    email.save()
+    return email
+
+
+def backoff(attempts, config=None):
+    """Delay before retrying a message that has failed `attempts` times"""
+    config = config or get_config()
+    return timedelta(seconds=min(config['BACKOFF_BASE'] * 2 ** (attempts - 1), config['BACKOFF_MAX']))
+
+
+def _record_failure(message, error, now, config):
+    message.attempts += 1
+    message.last_error = str(error)[:255]
+    if message.attempts >= config['MAX_ATTEMPTS']:
+        message.status = 'failed'
+    else:
+        message.next_attempt_at = now + backoff(message.attempts, config)
+
+
+def dispatch_pending(batch_size=None, now=None):
+    """Send one batch of due messages; returns (sent, failed) counts"""
+    config = get_config()
+    batch_size = batch_size or config['BATCH_SIZE']
+    now = now or timezone.now()
+
+    with transaction.atomic():
+        due = OutgoingEmail.objects.filter(status='pending', next_attempt_at__lte=now).order_by('next_attempt_at', 'pk')
+        if connection.features.has_select_for_update_skip_locked:
+            # Parallel dispatchers take different messages instead of sending twice
+            due = due.select_for_update(skip_locked=True)
+        messages = list(due[:batch_size])
+        if not messages:
+            return 0, 0
+
+        sent = failed = 0
+        mail_connection = get_connection()
+        try:
+            mail_connection.open()
+            for message in messages:
+                try:
+                    EmailMessage(
+                        subject=message.subject,
+                        body=message.body,
+                        from_email=message.from_email,
+                        to=message.to,
+                        connection=mail_connection,
+                    ).send()
+                except Exception as exc:
+                    logger.warning('Sending outbox email %s failed: %s', message.pk, exc)
+                    _record_failure(message, exc, now, config)
+                    failed += 1
+                else:
+                    message.status, message.sent_at = 'sent', timezone.now()
+                    sent += 1
+        except Exception as exc:
+            # Could not connect at all; the whole batch backs off
+            logger.exception('Mail connection failed during outbox dispatch')
+            for message in messages:
+                _record_failure(message, exc, now, config)
+            failed = len(messages)
+        finally:
+            mail_connection.close()
+
+        OutgoingEmail.objects.bulk_update(
+            messages, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at']
+        )
+    return sent, failed
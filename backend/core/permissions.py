@@ -1,5 +1,7 @@
 from rest_framework import permissions
+from rest_framework.exceptions import PermissionDenied, Throttled
 from .models import Event
+from . import idempotency, waiting_room
 
 class IsOrganizerOrAdmin(permissions.BasePermission):
     """
@@ -49,3 +51,41 @@ class IsEventOrganizer(permissions.BasePermission):
                    request.user.role == 'admin' or 
                    request.user.is_superuser)
         return False
+
+
+class HasWaitingRoomAdmission(permissions.BasePermission):
+    """
+    Permission class for booking during a waiting room on-sale - only requests
+    carrying an admitted X-Queue-Token get through, and each admission books once.
+    Does nothing while WAITING_ROOM['ENABLED'] is off.
+
+    The admission is only checked here. The view spends it with spend() once
+    its throttles have passed, so a 429 does not cost the client their place.
+    """
+    message = 'A valid waiting room token is required to book this event'
+
+    def has_permission(self, request, view):
+        if not waiting_room.get_config()['ENABLED']:
+            return True
+        if idempotency.has_result(request):
+            # A retry of a booking that already went through; the view replays it
+            return True
+
+        event_id = view.kwargs.get('event_id')
+        payload = waiting_room.read_token(request.headers.get('X-Queue-Token', ''), event_id)
+        if payload is None or payload['u'] != request.user.pk:
+            return False
+
+        admitted, ahead, wait = waiting_room.queue_status(event_id, payload['p'])
+        if not admitted:
+            raise Throttled(wait=wait, detail=f'Still in the waiting room, {ahead} ahead of you')
+
+        request.waiting_room_admission = (event_id, payload['p'])
+        return True
+
+    @staticmethod
+    def spend(request):
+        """Use up the admission has_permission found; call after the throttles"""
+        admission = getattr(request, 'waiting_room_admission', None)
+        if admission is not None and not waiting_room.admit(*admission):
+            raise PermissionDenied('This waiting room token has already been used')
@@ -0,0 +1,129 @@
+"""
+Recently-used tokens, so replayed QR codes are refused from memory.
+
+A screenshot of a QR code can reach a second gate within seconds of the
+first scan. The second gate's check may not yet see the first gate's
+write. Every committed scan therefore records its token here: through
+mark_as_used, bulk check-in and scan log sync. validate_ticket consults
+the set before touching the database and refuses a known token at once.
+
+Each process keeps a set per event. Entries are held in scan order,
+expire after TTL seconds, and a set holds at most MAX_PER_EVENT entries,
+dropping its oldest first. With SHARED on, each scan is also written to
+the cache, which serves as the fan-out between processes and gate
+servers. A process that has not seen a token locally asks the cache
+before falling back to the database. Neither tier is authoritative. A
+miss just means the usual database check, and the compare-and-set in
+mark_as_used still stops a double scan.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+DEFAULTS = {
+    'ENABLED': False,
+    'TTL': 5 * 60,
+    'MAX_PER_EVENT': 50000,
+    'SHARED': True,
+    'CACHE_ALIAS': 'default',
+}
+
+_lock = threading.Lock()
+# event id -> OrderedDict(validation token -> (organizer id, expires at)), oldest first
+_events = {}
+# validation token -> event id, to find a token's set from the token alone
+_index = {}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'RECENT_SCANS', {})}
+
+
+def cache_key(validation_token):
+    return f'recent-scan:{validation_token}'
+
+
+def _evict(entries, now, limit):
+    """Drop expired and surplus entries from the front of an event's set; caller holds _lock"""
+    while entries:
+        token, (_, expires_at) = next(iter(entries.items()))
+        if expires_at > now and len(entries) <= limit:
+            break
+        entries.popitem(last=False)
+        _index.pop(token, None)
+
+
+def _remember(event_id, organizer_id, validation_tokens, config):
+    now = time.monotonic()
+    expires_at = now + config['TTL']
+    with _lock:
+        entries = _events.setdefault(event_id, OrderedDict())
+        for token in validation_tokens:
+            entries.pop(token, None)
+            entries[token] = (organizer_id, expires_at)
+            _index[token] = event_id
+        _evict(entries, now, config['MAX_PER_EVENT'])
+    if config['SHARED']:
+        caches[config['CACHE_ALIAS']].set_many(
+            {cache_key(token): (event_id, organizer_id) for token in validation_tokens},
+            timeout=config['TTL']
+        )
+
+
+def record(event_id, organizer_id, validation_tokens):
+    """Remember tokens that were just scanned, once the current transaction commits"""
+    config = get_config()
+    if not config['ENABLED'] or not validation_tokens:
+        return
+    validation_tokens = list(validation_tokens)
+    transaction.on_commit(lambda: _remember(event_id, organizer_id, validation_tokens, config))
+
+
+def lookup(validation_token):
+    """(event id, organizer id) if the token was scanned within TTL, else None"""
+    config = get_config()
+    if not config['ENABLED']:
+        return None
+    now = time.monotonic()
+    with _lock:
+        event_id = _index.get(validation_token)
+        if event_id is not None:
+            organizer_id, expires_at = _events[event_id][validation_token]
+            if expires_at > now:
+                return event_id, organizer_id
+            _evict(_events[event_id], now, config['MAX_PER_EVENT'])
+    if config['SHARED']:
+        return caches[config['CACHE_ALIAS']].get(cache_key(validation_token))
+    return None
+
+
+def discard(validation_tokens):
+    """Forget tokens whose scan was undone"""
+    config = get_config()
+    if not config['ENABLED'] or not validation_tokens:
+        return
+    with _lock:
+        for token in validation_tokens:
+            event_id = _index.pop(token, None)
+            if event_id is not None:
+                _events[event_id].pop(token, None)
+    if config['SHARED']:
+        caches[config['CACHE_ALIAS']].delete_many([cache_key(token) for token in validation_tokens])
+
+
+def size(event_id=None):
+    """Entries held in this process, for one event or all of them"""
+    with _lock:
+        if event_id is not None:
+            return len(_events.get(event_id, ()))
+        return len(_index)
+
+
+def reset():
+    with _lock:
+        _events.clear()
+        _index.clear()
@@ -0,0 +1,202 @@
+"""
+Live scan metrics: throughput, accept/reject mix and gate latency.
+
+record() is called once per validate request. It only appends a tuple to
+a deque. deque.append is atomic, so the scan path takes no lock and makes
+no database write. Every FLUSH_INTERVAL seconds, the request that notices
+the interval has passed drains the deque into this process's rolling
+windows. The windows are per event, per BUCKET_SECONDS bucket and per
+scanner user, and each holds outcome counts plus a fixed-bucket latency
+histogram. The request then publishes its windows to the cache. Only one
+request drains at a time; the others skip the flush instead of waiting.
+
+Histograms with fixed boundaries merge by addition. snapshot() therefore
+sums the published windows of every process registered in the cache and
+reads p50/p95/p99 off the merged histogram. A percentile is reported as
+the upper bound of its histogram bucket.
+"""
+import functools
+import os
+import socket
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULTS = {
+    'ENABLED': True,
+    'BUCKET_SECONDS': 10,
+    'RETENTION': 15 * 60,  # seconds of buckets kept
+    'FLUSH_INTERVAL': 5,
+    'CACHE_ALIAS': 'default',
+}
+
+# Upper bounds (ms) of the latency histogram buckets; the last one is open-ended
+LATENCY_BOUNDS_MS = (1, 2, 3, 5, 8, 13, 20, 30, 50, 80, 130, 200, 300, 500, 800, 1300, 2000, 3000, 5000, float('inf'))
+ACCEPTED = ('scannable', 'scanned')
+
+REGISTRY_KEY = 'scan-metrics:processes'
+PROCESS_KEY = f'scan-metrics:{socket.gethostname()}:{os.getpid()}'
+
+_pending = deque()
+_flush_lock = threading.Lock()
+_last_flush = [0.0]
+# event id -> bucket start -> scanner id -> {'outcomes': {outcome: n}, 'hist': [n, ...]}
+_windows = defaultdict(lambda: defaultdict(dict))
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'SCAN_METRICS', {})}
+
+
+def _cache(config):
+    return caches[config['CACHE_ALIAS']]
+
+
+def record(event_id, scanner_id, outcome, latency, now=None):
+    """Note one scan; latency in seconds"""
+    config = get_config()
+    if not config['ENABLED'] or event_id is None:
+        return
+    now = time.time() if now is None else now
+    _pending.append((event_id, scanner_id, outcome, latency * 1000, now))
+    if now - _last_flush[0] >= config['FLUSH_INTERVAL']:
+        flush(now=now)
+
+
+def instrumented(view_func):
+    """
+    Time a validate view and record its outcome. The view tags the request
+    with scan_event_id once it knows the ticket's event; untagged requests
+    (unknown tokens, replays) are not attributed to any event.
+    """
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        started = time.perf_counter()
+        response = view_func(request, *args, **kwargs)
+        data = getattr(response, 'data', None)
+        outcome = data.get('status', 'unknown') if isinstance(data, dict) else 'unknown'
+        record(getattr(request, 'scan_event_id', None), request.user.pk, outcome, time.perf_counter() - started)
+        return response
+    return wrapper
+
+
+def _histogram_index(latency_ms):
+    for index, bound in enumerate(LATENCY_BOUNDS_MS):
+        if latency_ms <= bound:
+            return index
+    return len(LATENCY_BOUNDS_MS) - 1
+
+
+def flush(now=None, wait=False):
+    """Fold pending scans into the windows and publish them; skipped if another flush is running"""
+    if not _flush_lock.acquire(blocking=wait):
+        return False
+    try:
+        config = get_config()
+        now = time.time() if now is None else now
+        _last_flush[0] = now
+        bucket_seconds = config['BUCKET_SECONDS']
+
+        while True:
+            try:
+                event_id, scanner_id, outcome, latency_ms, at = _pending.popleft()
+            except IndexError:
+                break
+            bucket = int(at // bucket_seconds * bucket_seconds)
+            cell = _windows[event_id][bucket].setdefault(
+                scanner_id, {'outcomes': {}, 'hist': [0] * len(LATENCY_BOUNDS_MS)}
+            )
+            cell['outcomes'][outcome] = cell['outcomes'].get(outcome, 0) + 1
+            cell['hist'][_histogram_index(latency_ms)] += 1
+
+        oldest = now - config['RETENTION']
+        for event_id in list(_windows):
+            for bucket in [b for b in _windows[event_id] if b < oldest]:
+                del _windows[event_id][bucket]
+            if not _windows[event_id]:
+                del _windows[event_id]
+
+        cache = _cache(config)
+        published = {event_id: dict(buckets) for event_id, buckets in _windows.items()}
+        cache.set(PROCESS_KEY, published, timeout=config['RETENTION'])
+        registry = cache.get(REGISTRY_KEY) or set()
+        if PROCESS_KEY not in registry:
+            # A registration lost to a concurrent writer is redone on the next flush
+            cache.set(REGISTRY_KEY, registry | {PROCESS_KEY}, timeout=None)
+        return True
+    finally:
+        _flush_lock.release()
+
+
+def reset():
+    """Forget everything this process has recorded"""
+    with _flush_lock:
+        _pending.clear()
+        _windows.clear()
+        _last_flush[0] = 0.0
+
+
+def _percentile(hist, fraction):
+    total = sum(hist)
+    if not total:
+        return None
+    threshold = fraction * total
+    running = 0
+    for index, count in enumerate(hist):
+        running += count
+        if running >= threshold:
+            bound = LATENCY_BOUNDS_MS[index]
+            return None if bound == float('inf') else bound
+    return None
+
+
+def _summary(outcomes, hist, window):
+    scans = sum(outcomes.values())
+    accepted = sum(n for outcome, n in outcomes.items() if outcome in ACCEPTED)
+    return {
+        'scans': scans,
+        'scans_per_second': round(scans / window, 3),
+        'accepted': accepted,
+        'rejected': scans - accepted,
+        'outcomes': outcomes,
+        'latency_ms': {
+            'p50': _percentile(hist, 0.50),
+            'p95': _percentile(hist, 0.95),
+            'p99': _percentile(hist, 0.99),
+        },
+    }
+
+
+def snapshot(event_id, window=60, now=None):
+    """Metrics for the last `window` seconds of an event, merged across processes"""
+    config = get_config()
+    flush(now=now, wait=True)
+    now = time.time() if now is None else now
+    since = now - window
+
+    cache = _cache(config)
+    processes = cache.get_many(list(cache.get(REGISTRY_KEY) or ()))
+
+    totals = {'outcomes': defaultdict(int), 'hist': [0] * len(LATENCY_BOUNDS_MS)}
+    scanners = defaultdict(lambda: {'outcomes': defaultdict(int), 'hist': [0] * len(LATENCY_BOUNDS_MS)})
+    for published in processes.values():
+        for bucket, cells in published.get(event_id, {}).items():
+            if bucket + config['BUCKET_SECONDS'] <= since:
+                continue
+            for scanner_id, cell in cells.items():
+                for target in (totals, scanners[scanner_id]):
+                    for outcome, count in cell['outcomes'].items():
+                        target['outcomes'][outcome] += count
+                    target['hist'] = [a + b for a, b in zip(target['hist'], cell['hist'])]
+
+    return {
+        'window': window,
+        **_summary(dict(totals['outcomes']), totals['hist'], window),
+        'scanners': [
+            {'scanner': scanner_id, **_summary(dict(data['outcomes']), data['hist'], window)}
+            for scanner_id, data in sorted(scanners.items(), key=lambda item: str(item[0]))
+        ],
+    }
@@ -0,0 +1,180 @@
+"""
+Offline scan log ingestion.
+
+Gate devices that scanned while offline upload their log as NDJSON, one
+{"token", "device", "scanned_at"} record per line. ingest_scan_log()
+reads the lines as they arrive and handles CHUNK_SIZE records at a time,
+so memory use does not grow with the upload. Each chunk costs one joined
+SELECT and one UPDATE, plus one INSERT when it produced conflicts.
+
+The earliest scan of a ticket wins. The UPDATE is conditional per row:
+it stamps a ticket that is still scannable, or moves an existing scan
+earlier, and leaves everything else alone. When two different scans of
+the same ticket meet, the loser is written to ScanConflict for review.
+A record identical to the stored scan (a re-upload) is a duplicate and
+is ignored.
+"""
+import json
+from uuid import UUID
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import live_feed, recent_scans, validation_cache
+from .models import ScanConflict, Ticket
+
+DEFAULTS = {
+    'CHUNK_SIZE': 1000,
+    'MAX_ERRORS': 100,  # per-line errors echoed back in the summary
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'SCAN_SYNC', {})}
+
+
+def _parse(line):
+    """(validation token, device, scanned_at) from one NDJSON line; raises ValueError"""
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError('record must be an object')
+    scanned_at = parse_datetime(str(record.get('scanned_at', '')))
+    if scanned_at is None:
+        raise ValueError('scanned_at must be an ISO 8601 datetime')
+    if timezone.is_naive(scanned_at):
+        scanned_at = timezone.make_aware(scanned_at)
+    return UUID(str(record.get('token'))), str(record.get('device') or '')[:100], scanned_at
+
+
+def _apply_chunk(event, records, user, summary):
+    """Apply one chunk of parsed records; the earliest scan per ticket wins"""
+    # Earliest record per token within the chunk; later ones are conflicts
+    # (or duplicates) against it
+    earliest = {}
+    losers = []
+    for token, device, scanned_at in records:
+        current = earliest.get(token)
+        if current is None:
+            earliest[token] = (device, scanned_at)
+        elif (device, scanned_at) == current:
+            summary['duplicates'] += 1
+        elif scanned_at < current[1]:
+            losers.append((token, current))
+            earliest[token] = (device, scanned_at)
+        else:
+            losers.append((token, (device, scanned_at)))
+
+    with transaction.atomic():
+        tickets = Ticket.objects.filter(event=event, validation_token__in=earliest)
+        if connection.features.has_select_for_update:
+            tickets = tickets.select_for_update()
+        tickets = {ticket.validation_token: ticket for ticket in tickets}
+
+        fresh, earlier, conflicts = [], [], []
+        for token, (device, scanned_at) in earliest.items():
+            ticket = tickets.get(token)
+            if ticket is None:
+                summary['not_found'] += 1
+            elif ticket.scanned_at is None:
+                if ticket.is_scannable():
+                    fresh.append((ticket, device, scanned_at))
+                else:
+                    summary['not_scannable'] += 1
+            elif (device, scanned_at) == (ticket.scanned_device, ticket.scanned_at):
+                summary['duplicates'] += 1
+            elif scanned_at < ticket.scanned_at:
+                earlier.append((ticket, device, scanned_at))
+                conflicts.append(ScanConflict(
+                    ticket=ticket, kept_device=device, kept_scanned_at=scanned_at,
+                    rejected_device=ticket.scanned_device, rejected_scanned_at=ticket.scanned_at,
+                ))
+            else:
+                conflicts.append(ScanConflict(
+                    ticket=ticket, kept_device=ticket.scanned_device, kept_scanned_at=ticket.scanned_at,
+                    rejected_device=device, rejected_scanned_at=scanned_at,
+                ))
+
+        for token, (device, scanned_at) in losers:
+            ticket = tickets.get(token)
+            if ticket is None or (ticket.scanned_at is None and not ticket.is_scannable()):
+                continue
+            kept_device, kept_at = earliest[token]
+            if ticket.scanned_at is not None and ticket.scanned_at < kept_at:
+                kept_device, kept_at = ticket.scanned_device, ticket.scanned_at
+            if (device, scanned_at) in ((kept_device, kept_at), (ticket.scanned_device, ticket.scanned_at)):
+                # Already stored, or already logged as the loser of the conflict above
+                summary['duplicates'] += 1
+                continue
+            conflicts.append(ScanConflict(
+                ticket=ticket, kept_device=kept_device, kept_scanned_at=kept_at,
+                rejected_device=device, rejected_scanned_at=scanned_at,
+            ))
+
+        if fresh or earlier:
+            # Per-row conditions repeat the checks above, so a scan that
+            # landed since the SELECT is never overwritten by a later one
+            whens = [
+                (Q(pk=ticket.pk, status='paid', is_valid=True, scanned_at__isnull=True), ticket, device, scanned_at)
+                for ticket, device, scanned_at in fresh
+            ] + [
+                (Q(pk=ticket.pk, scanned_at__gt=scanned_at), ticket, device, scanned_at)
+                for ticket, device, scanned_at in earlier
+            ]
+
+            def pick(field, values):
+                return Case(
+                    *[When(q, then=Value(value)) for (q, *_), value in zip(whens, values)],
+                    default=F(field),
+                    output_field=Ticket._meta.get_field(field),
+                )
+
+            Ticket.objects.filter(pk__in=[ticket.pk for _, ticket, _, _ in whens]).update(
+                scanned_at=pick('scanned_at', [at for *_, at in whens]),
+                scanned_device=pick('scanned_device', [device for _, _, device, _ in whens]),
+                status=pick('status', ['used'] * len(whens)),
+                is_valid=pick('is_valid', [False] * len(whens)),
+                scanned_by=pick('scanned_by', [user.pk] * len(whens)),
+                updated_at=timezone.now(),
+            )
+            validation_cache.invalidate([ticket.validation_token for _, ticket, _, _ in whens])
+            recent_scans.record(event.pk, event.organizer_id, [ticket.validation_token for _, ticket, _, _ in whens])
+        if conflicts:
+            ScanConflict.objects.bulk_create(conflicts)
+        live_feed.publish(event.pk, live_feed.CHECKED_IN, len(fresh))
+
+    summary['applied'] += len(fresh)
+    summary['superseded'] += len(earlier)
+    summary['conflicts'] += len(conflicts)
+
+
+def ingest_scan_log(event, lines, user, chunk_size=None):
+    """Apply an iterable of NDJSON lines to the event's tickets; returns a summary"""
+    config = get_config()
+    chunk_size = chunk_size or config['CHUNK_SIZE']
+    summary = {
+        'received': 0, 'applied': 0, 'superseded': 0, 'conflicts': 0,
+        'duplicates': 0, 'not_found': 0, 'not_scannable': 0, 'rejected': 0,
+        'errors': [],
+    }
+
+    chunk = []
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        summary['received'] += 1
+        try:
+            chunk.append(_parse(line))
+        except ValueError as exc:
+            summary['rejected'] += 1
+            if len(summary['errors']) < config['MAX_ERRORS']:
+                summary['errors'].append({'line': number, 'error': str(exc)})
+            continue
+        if len(chunk) >= chunk_size:
+            _apply_chunk(event, chunk, user, summary)
+            chunk = []
+    if chunk:
+        _apply_chunk(event, chunk, user, summary)
+    return summary
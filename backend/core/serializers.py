@@ -1,28 +1,32 @@
+from django.conf import settings
+from django.template import TemplateSyntaxError
 from rest_framework import serializers
-from .models import Event, Ticket
+from .broadcast import compile_template
+from .models import Broadcast, Event, Ticket
 
 class EventSerializer(serializers.ModelSerializer):
     class Meta:
         model = Event
         fields = '__all__'
-        read_only_fields = ['organizer', 'created_at']
+        read_only_fields = ['organizer', 'created_at', 'tickets_sold', 'inventory_shards', 'pre_minted']
 
 
 class TicketSerializer(serializers.ModelSerializer):
     event = EventSerializer(read_only=True)
     validation_url = serializers.ReadOnlyField()
     is_scannable = serializers.ReadOnlyField()
+    signed_qr_code = serializers.ReadOnlyField()
 
     class Meta:
         model = Ticket
         fields = [
             'id', 'user', 'event', 'validation_token', 'qr_code', 
-            'status', 'created_at', 'scanned_at', 'is_valid', 
-            'scanned_by', 'validation_url', 'is_scannable'
+            'status', 'created_at', 'hold_expires_at', 'scanned_at', 'is_valid', 
+            'scanned_by', 'validation_url', 'is_scannable', 'signed_qr_code'
         ]
         read_only_fields = [
-            'user', 'validation_token', 'qr_code', 'created_at', 
-            'scanned_at', 'scanned_by', 'validation_url', 'is_scannable'
+            'user', 'validation_token', 'qr_code', 'created_at', 'hold_expires_at', 
+            'scanned_at', 'scanned_by', 'validation_url', 'is_scannable', 'signed_qr_code'
         ]
 
 
@@ -38,6 +42,43 @@ class TicketValidationSerializer(serializers.ModelSerializer):
             'id', 'validation_token', 'status', 'is_valid', 
             'scanned_at', 'event_name', 'event_date', 'user_name'
         ]
-        read_only_fields = '__all__'
+        read_only_fields = fields
 
         
+
+
+
+class TicketBookingSerializer(serializers.Serializer):
+    """Serializer for booking requests"""
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+    def validate_quantity(self, value):
+        limit = getattr(settings, 'MAX_TICKETS_PER_ORDER', 10)
+        if value > limit:
+            raise serializers.ValidationError(f"You can book at most {limit} tickets per order.")
+        return value
+
+
+class BroadcastSerializer(serializers.ModelSerializer):
+    """
+    Serializer for attendee broadcasts; subject and body are Django templates
+    over {{ event.name }}, {{ event.location }}, {{ event.start_time }} and
+    {{ event.end_time }} (see core.broadcast.template_context)
+    """
+    class Meta:
+        model = Broadcast
+        fields = [
+            'id', 'event', 'subject', 'body', 'status', 'sent_count',
+            'failed_count', 'created_at', 'completed_at'
+        ]
+        read_only_fields = [
+            'event', 'status', 'sent_count', 'failed_count', 'created_at', 'completed_at'
+        ]
+
+    def validate(self, attrs):
+        for field in ('subject', 'body'):
+            try:
+                compile_template(attrs[field])
+            except TemplateSyntaxError as exc:
+                raise serializers.ValidationError({field: f'Invalid template: {exc}'})
+        return attrs
@@ -0,0 +1,981 @@
+"""
+Test cases for the booking path - seat counters, capacity and cancellation
+"""
+import threading
+from io import StringIO
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from django.core import mail
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, IntegrityError
+from django.test import override_settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import idempotency, inventory_engine, outbox, waiting_room
+from .throttling import TokenBucketThrottle
+from .ticket_pool import claim_pooled_tickets, mint_pool
+from .serializers import EventSerializer
+from .holds import release_expired_batch, release_expired_holds
+from .inventory import rebalance_shards, shard_inventory, sharded_remaining
+from .booking import process_booking_intents
+from .models import BookingIntent, Event, InventoryShard, OutgoingEmail, Ticket
+
+User = get_user_model()
+
+
+class BookingTestMixin:
+    """Shared fixtures for booking tests"""
+
+    def create_fixtures(self, capacity=2):
+        cache.clear()
+        self.organizer = User.objects.create_user(
+            username='organizer@test.com',
+            email='organizer@test.com',
+            password='testpass123',
+            role='organizer'
+        )
+        self.user = User.objects.create_user(
+            username='user@test.com',
+            email='user@test.com',
+            password='testpass123'
+        )
+        self.event = Event.objects.create(
+            name='Test Event',
+            description='Test description',
+            start_time=timezone.now() + timedelta(days=30),
+            end_time=timezone.now() + timedelta(days=30, hours=3),
+            location='Test Venue',
+            capacity=capacity,
+            organizer=self.organizer
+        )
+        self.book_url = reverse('book-ticket', kwargs={'event_id': self.event.id})
+
+    def get_auth_header(self, user):
+        """Get authentication header for user"""
+        refresh = RefreshToken.for_user(user)
+        return {'HTTP_AUTHORIZATION': f'Bearer {refresh.access_token}'}
+
+    def book(self, user=None, data=None, **extra):
+        return self.client.post(
+            self.book_url, data or {}, format='json',
+            **self.get_auth_header(user or self.user), **extra
+        )
+
+
+class SeatCounterBookingTest(BookingTestMixin, APITestCase):
+    """Test the counter-based capacity check on TicketCreateView"""
+
+    def setUp(self):
+        self.create_fixtures(capacity=2)
+
+    def test_booking_claims_seat(self):
+        """Test that a booking increments the event counter"""
+        response = self.book()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.tickets_sold, 1)
+        self.assertEqual(Ticket.objects.filter(event=self.event).count(), 1)
+
+    def test_booking_rejected_when_full(self):
+        """Test that the counter stops bookings at capacity"""
+        self.book()
+        self.book()
+        response = self.book()
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fully booked', response.data['error'])
+        self.assertEqual(Ticket.objects.filter(event=self.event).count(), 2)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.tickets_sold, 2)
+
+    def test_booking_does_not_count_tickets(self):
+        """Test that the capacity check does not scale with tickets sold"""
+        self.book()
+        with self.assertNumQueries(7):
+            # auth user, event, savepoint, claim, ticket insert, outbox insert, release savepoint
+            self.book()
+
+    def test_cancel_releases_seat(self):
+        """Test that cancelling a ticket frees its seat exactly once"""
+        self.book()
+        self.book()
+        ticket = Ticket.objects.filter(event=self.event).first()
+
+        self.assertTrue(ticket.cancel())
+        self.assertFalse(ticket.cancel())
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.tickets_sold, 1)
+
+        response = self.book()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_reserve_seats_is_conditional(self):
+        """Test that reserve_seats never exceeds capacity"""
+        self.assertTrue(self.event.reserve_seats(2))
+        self.assertFalse(self.event.reserve_seats(1))
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.tickets_sold, 2)
+
+
+@override_settings(MAX_TICKETS_PER_ORDER=4)
+class MultiTicketBookingTest(BookingTestMixin, APITestCase):
+    """Test booking several tickets in one request"""
+
+    def setUp(self):
+        self.create_fixtures(capacity=5)
+
+    def test_book_several_tickets(self):
+        """Test that one request reserves and returns every ticket"""
+        response = self.book(data={'quantity': 3})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['tickets']), 3)
+        tickets = Ticket.objects.filter(event=self.event)
+        self.assertEqual(tickets.count(), 3)
+        self.assertEqual(len({t.validation_token for t in tickets}), 3)
+        for ticket in tickets:
+            self.assertEqual(ticket.qr_code, ticket.validation_url)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.tickets_sold, 3)
+
+    def test_one_confirmation_per_order(self):
+        """Test that a multi-ticket order queues a single email"""
+        self.book(data={'quantity': 3})
+        self.assertEqual(OutgoingEmail.objects.count(), 1)
+        self.assertIn('3 tickets', OutgoingEmail.objects.get().body)
+
+    def test_quantity_over_order_limit(self):
+        """Test that per-order limits are enforced"""
+        response = self.book(data={'quantity': 5})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('quantity', response.data)
+        self.assertFalse(Ticket.objects.exists())
+
+    def test_quantity_over_remaining_capacity(self):
+        """Test that an order larger than what is left books nothing"""
+        self.book(data={'quantity': 3})
+        response = self.book(data={'quantity': 3})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Not enough tickets available', response.data['error'])
+        self.assertEqual(Ticket.objects.count(), 3)
+
+    def test_failed_insert_leaves_nothing_behind(self):
+        """Test that a failing bulk insert rolls back the seat claim"""
+        with mock.patch.object(Ticket.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.book(data={'quantity': 2})
+
+        self.assertFalse(Ticket.objects.exists())
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.tickets_sold, 0)
+
+
+class SeatHoldExpiryTest(BookingTestMixin, APITestCase):
+    """Test expiring holds on pending tickets"""
+
+    def setUp(self):
+        self.create_fixtures(capacity=10)
+
+    def test_booking_sets_hold_expiry(self):
+        """Test that new pending tickets carry a hold expiry"""
+        with self.settings(SEAT_HOLD_SECONDS=60):
+            response = self.book()
+
+        self.assertIsNotNone(response.data['hold_expires_at'])
+        ticket = Ticket.objects.get()
+        self.assertAlmostEqual(
+            (ticket.hold_expires_at - ticket.created_at).total_seconds(), 60, delta=5
+        )
+
+    def test_sweeper_releases_only_expired_pending(self):
+        """Test that expired holds are cancelled and their seats returned"""
+        for _ in range(4):
+            self.book()
+        past = timezone.now() - timedelta(minutes=1)
+        tickets = list(Ticket.objects.order_by('pk'))
+        Ticket.objects.filter(pk__in=[tickets[0].pk, tickets[1].pk]).update(hold_expires_at=past)
+        Ticket.objects.filter(pk=tickets[2].pk).update(hold_expires_at=past, status='paid')
+
+        self.assertEqual(release_expired_holds(), 2)
+
+        self.assertEqual(Ticket.objects.filter(status='cancelled').count(), 2)
+        self.assertEqual(Ticket.objects.get(pk=tickets[2].pk).status, 'paid')
+        self.assertEqual(Ticket.objects.get(pk=tickets[3].pk).status, 'pending')
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.tickets_sold, 2)
+
+    def test_sweeper_batches_are_bounded(self):
+        """Test that one batch touches at most batch_size holds with set-based queries"""
+        for _ in range(5):
+            self.book()
+        Ticket.objects.update(hold_expires_at=timezone.now() - timedelta(minutes=1))
+
+        with self.assertNumQueries(6):
+            # savepoint, select batch, load event, update batch, release seats, release savepoint
+            self.assertEqual(release_expired_batch(batch_size=3), 3)
+        self.assertEqual(release_expired_holds(batch_size=3), 2)
+        self.assertEqual(release_expired_holds(batch_size=3), 0)
+
+    def test_sweeper_skips_holds_paid_after_the_read(self):
+        """Test that a hold paid between the sweeper's read and its UPDATE keeps its seat"""
+        self.book()
+        self.book()
+        Ticket.objects.update(hold_expires_at=timezone.now() - timedelta(minutes=1))
+        paid = Ticket.objects.first()
+
+        def pay(tokens):
+            Ticket.objects.filter(pk=paid.pk).update(status='paid')
+
+        with mock.patch('core.validation_cache.invalidate', side_effect=pay):
+            self.assertEqual(release_expired_batch(), 1)
+
+        paid.refresh_from_db()
+        self.assertEqual(paid.status, 'paid')
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.tickets_sold, 1)
+
+    def test_sweep_continues_past_a_batch_with_paid_holds(self):
+        """Test that a full batch keeps the sweep going even if some of it was paid meanwhile"""
+        for _ in range(4):
+            self.book()
+        Ticket.objects.update(hold_expires_at=timezone.now() - timedelta(minutes=1))
+        first = Ticket.objects.order_by('pk').first()
+        batches = []
+
+        def pay_first_hold(tokens):
+            if not batches:
+                Ticket.objects.filter(pk=first.pk).update(status='paid')
+            batches.append(tokens)
+
+        with mock.patch('core.validation_cache.invalidate', side_effect=pay_first_hold):
+            self.assertEqual(release_expired_holds(batch_size=2), 3)
+        self.assertFalse(Ticket.objects.filter(status='pending').exists())
+
+
+class IdempotentBookingTest(BookingTestMixin, APITestCase):
+    """Test Idempotency-Key handling on the booking endpoint"""
+
+    def setUp(self):
+        self.create_fixtures(capacity=10)
+        cache.clear()
+        self.result_key = idempotency.cache_key(self.user.pk, self.book_url, 'order-1')
+
+    def test_retry_replays_first_response(self):
+        """Test that a retried booking returns the stored ticket"""
+        first = self.book(HTTP_IDEMPOTENCY_KEY='order-1')
+        with self.assertNumQueries(1):
+            # Only the JWT user lookup; no ticket or event queries
+            retry = self.book(HTTP_IDEMPOTENCY_KEY='order-1')
+
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Ticket.objects.count(), 1)
+        self.assertEqual(OutgoingEmail.objects.count(), 1)
+
+    def test_different_keys_book_separately(self):
+        """Test that distinct keys are distinct bookings"""
+        self.book(HTTP_IDEMPOTENCY_KEY='order-1')
+        self.book(HTTP_IDEMPOTENCY_KEY='order-2')
+        self.assertEqual(Ticket.objects.count(), 2)
+
+    def test_key_reused_with_other_body(self):
+        """Test that reusing a key for a different request is rejected"""
+        self.book(HTTP_IDEMPOTENCY_KEY='order-1')
+        response = self.book(data={'quantity': 2}, HTTP_IDEMPOTENCY_KEY='order-1')
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Ticket.objects.count(), 1)
+
+    def test_concurrent_duplicate_waits_for_first(self):
+        """Test that a duplicate arriving mid-flight gets the first result"""
+        first = self.book(HTTP_IDEMPOTENCY_KEY='order-1')
+        stored = cache.get(self.result_key)
+        cache.delete(self.result_key)
+        cache.add(f'{self.result_key}:lock', 'busy')
+
+        def first_request_finishes(_):
+            cache.set(self.result_key, stored)
+            cache.delete(f'{self.result_key}:lock')
+
+        with mock.patch.object(idempotency.time, 'sleep', side_effect=first_request_finishes) as sleep:
+            response = self.book(HTTP_IDEMPOTENCY_KEY='order-1')
+
+        sleep.assert_called_once()
+        self.assertEqual(response.data['id'], first.data['id'])
+        self.assertEqual(Ticket.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY={'WAIT_TIMEOUT': 0})
+    def test_duplicate_gives_up_while_first_running(self):
+        """Test that a duplicate stops waiting after WAIT_TIMEOUT"""
+        cache.add(f'{self.result_key}:lock', 'busy')
+        response = self.book(HTTP_IDEMPOTENCY_KEY='order-1')
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Ticket.objects.exists())
+
+
+@override_settings(INVENTORY_ENGINE={'ENABLED': True, 'SINGLE_PROCESS': True, 'FLUSH_SIZE': 3, 'FLUSH_INTERVAL': None})
+class InventoryEngineTest(BookingTestMixin, APITestCase):
+    """Test the write-behind inventory engine"""
+
+    def setUp(self):
+        self.create_fixtures(capacity=4)
+        inventory_engine._build_engine.cache_clear()
+        self.engine = inventory_engine.get_engine()
+        # Flushes are run by hand below instead of on a background thread
+        flusher = mock.patch.object(inventory_engine.InventoryEngine, '_start_flusher')
+        self.start_flusher = flusher.start()
+        self.addCleanup(flusher.stop)
+
+    def test_booking_is_written_behind(self):
+        """Test that tickets reach the database on flush"""
+        response = self.book()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Ticket.objects.exists())
+        self.assertFalse(OutgoingEmail.objects.exists())
+        self.assertEqual(self.engine.flush(), 1)
+
+        ticket = Ticket.objects.get()
+        self.assertEqual(OutgoingEmail.objects.count(), 1)
+        self.assertEqual(str(ticket.validation_token), response.data['validation_token'])
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.tickets_sold, 1)
+
+    def test_admission_stays_off_the_database(self):
+        """Test that a loaded event books with no inventory queries"""
+        self.book()
+        with self.assertNumQueries(2):
+            # auth user, event
+            self.book()
+
+    def test_full_buffer_wakes_flusher(self):
+        """Test that reaching FLUSH_SIZE hands the batch to the flusher, not the request"""
+        self.book(data={'quantity': 2})
+        self.start_flusher.assert_not_called()
+
+        with mock.patch.object(self.engine, '_write', side_effect=DatabaseError('down')) as write:
+            response = self.book()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        write.assert_not_called()
+        self.start_flusher.assert_called_once()
+
+        self.assertEqual(self.engine.flush(), 3)
+        self.assertEqual(self.engine.pending(), 0)
+
+    def test_failing_order_is_dead_lettered(self):
+        """Test that an order that cannot be written stops blocking the rest and returns its seat"""
+        Event.objects.filter(pk=self.event.pk).update(capacity=10)
+        doomed = User.objects.create_user(username='doomed@test.com', email='doomed@test.com', password='x')
+        write = self.engine._write
+
+        def write_unless_doomed(orders):
+            if any(order.tickets[0].user_id == doomed.pk for order in orders):
+                raise IntegrityError('user is gone')
+            return write(orders)
+
+        self.book(user=doomed)
+        with mock.patch.object(self.engine, '_write', side_effect=write_unless_doomed), \
+                self.assertLogs('core.inventory_engine', 'ERROR') as logs:
+            for _ in range(3):
+                self.book()
+                self.assertEqual(self.engine.flush(), 1)
+
+        self.assertIn('Dropping 1 ticket(s)', logs.output[-1])
+        self.assertEqual(Ticket.objects.count(), 3)
+        self.assertEqual([order.tickets[0].user_id for order in self.engine.dead_letters], [doomed.pk])
+        self.assertEqual(self.engine.pending(), 0)
+        self.assertEqual(self.engine.store.snapshot(self.event.pk), (7, 0))
+
+    def test_outage_does_not_dead_letter(self):
+        """Test that a flush writing nothing at all keeps every order for later"""
+        self.book()
+        with mock.patch.object(self.engine, '_write', side_effect=DatabaseError('down')), \
+                self.assertLogs('core.inventory_engine', 'ERROR'):
+            for _ in range(5):
+                self.assertEqual(self.engine.flush(), 0)
+
+        self.assertEqual(self.engine.dead_letters, [])
+        self.assertEqual(self.engine.flush(), 1)
+
+    def test_sells_exactly_to_capacity(self):
+        """Test that memory admission stops at capacity"""
+        self.book(data={'quantity': 3})
+        self.assertEqual(self.book().status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.book().status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.engine.flush()
+        self.assertEqual(Ticket.objects.count(), 4)
+
+    def test_recovery_rebuilds_from_tickets(self):
+        """Test that a fresh engine picks up where the database is"""
+        self.book(data={'quantity': 3})
+        self.engine.flush()
+        inventory_engine._build_engine.cache_clear()
+        engine = inventory_engine.get_engine()
+
+        self.assertTrue(engine.claim(self.event.pk))
+        self.assertFalse(engine.claim(self.event.pk))
+
+    def test_cancel_returns_seat_to_memory(self):
+        """Test that cancelling a flushed ticket frees a seat in the engine"""
+        self.book(data={'quantity': 3})
+        self.book()
+        self.engine.flush()
+        Ticket.objects.first().cancel()
+        self.assertEqual(self.book().status_code, status.HTTP_201_CREATED)
+
+    def test_private_store_is_refused(self):
+        """Test that a store only one process can see is refused outside SINGLE_PROCESS"""
+        inventory_engine._build_engine.cache_clear()
+        for store in ('InMemoryInventoryStore', 'CacheInventoryStore'):
+            config = {'ENABLED': True, 'STORE': f'core.inventory_engine.{store}'}
+            with override_settings(INVENTORY_ENGINE=config), self.assertRaisesMessage(ImproperlyConfigured, store):
+                inventory_engine.get_engine()
+
+    def test_shared_store_sells_each_seat_once(self):
+        """Test that engines in different processes draw from the same counters"""
+        self.event.capacity = 1
+        self.event.save()
+        engines = [inventory_engine.InventoryEngine(inventory_engine.CacheInventoryStore()) for _ in range(2)]
+
+        self.assertEqual([engine.claim(self.event.pk) for engine in engines], [True, False])
+
+    @mock.patch.object(inventory_engine.CacheInventoryStore, 'shared', True)
+    def test_reconcile_command(self):
+        """Test that reconcile_inventory proves a shared store and the database agree"""
+        shared = {'ENABLED': True, 'FLUSH_SIZE': 3, 'FLUSH_INTERVAL': None}
+        inventory_engine._build_engine.cache_clear()
+        with override_settings(INVENTORY_ENGINE=shared):
+            engine = inventory_engine.get_engine()
+            self.book()
+            out = StringIO()
+            call_command('reconcile_inventory', stdout=out, stderr=StringIO())
+            self.assertIn('matches the database for 1 event(s)', out.getvalue())
+
+            Ticket.objects.create(event=self.event, user=self.user)
+            with self.assertRaises(CommandError):
+                call_command('reconcile_inventory', stdout=StringIO(), stderr=StringIO())
+
+            err = StringIO()
+            call_command('reconcile_inventory', recover=True, stdout=StringIO(), stderr=err)
+            self.assertIn(f'Event {self.event.pk}: 3 seat(s) left in memory, 2 in the database', err.getvalue())
+            self.assertEqual(engine.store.snapshot(self.event.pk), (2, 0))
+
+    @mock.patch.object(inventory_engine.CacheInventoryStore, 'shared', True)
+    def test_reconcile_reports_unloaded_events(self):
+        """Test that events the store never loaded are reported, not passed"""
+        inventory_engine._build_engine.cache_clear()
+        with override_settings(INVENTORY_ENGINE={'ENABLED': True}):
+            err = StringIO()
+            with self.assertRaisesMessage(CommandError, 'nothing was checked'):
+                call_command('reconcile_inventory', stdout=StringIO(), stderr=err)
+        self.assertIn(f'unchecked: {self.event.pk}', err.getvalue())
+
+    def test_reconcile_refuses_in_process_store(self):
+        """Test that the command will not vouch for counters only the web workers can see"""
+        with self.assertRaisesMessage(CommandError, 'CacheInventoryStore is private to each process'):
+            call_command('reconcile_inventory', stdout=StringIO(), stderr=StringIO())
+
+
+@override_settings(TOKEN_BUCKETS={'RATES': {
+    'booking_user': {'burst': 2, 'refill': 1},
+    'booking_event': {'burst': 3, 'refill': 1},
+    'login_account': {'burst': 2, 'refill': 0.1},
+}})
+class TokenBucketThrottleTest(BookingTestMixin, APITestCase):
+    """Test token-bucket throttling on booking and login"""
+
+    def setUp(self):
+        self.create_fixtures(capacity=50)
+        self.clock = mock.patch.object(TokenBucketThrottle, 'timer', mock.Mock(return_value=1000.0))
+        self.clock.start()
+        self.addCleanup(self.clock.stop)
+
+    def tick(self, seconds):
+        TokenBucketThrottle.timer.return_value += seconds
+
+    def test_user_bucket_allows_burst_then_refills(self):
+        """Test that a user gets burst requests, then one per refill"""
+        self.assertEqual(self.book().status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.book().status_code, status.HTTP_201_CREATED)
+
+        response = self.book()
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '1')
+
+        self.tick(1)
+        self.assertEqual(self.book().status_code, status.HTTP_201_CREATED)
+
+    def test_event_bucket_is_shared(self):
+        """Test that the per-event bucket limits all users together"""
+        other = User.objects.create_user(username='other@test.com', email='other@test.com', password='x')
+        self.book()
+        self.book()
+        self.book(user=other)
+
+        response = self.book(user=other)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(Ticket.objects.count(), 3)
+
+    def test_login_throttled_per_account(self):
+        """Test that repeated logins for one account are cut off without DB work"""
+        credentials = {'email': 'user@test.com', 'password': 'wrong'}
+        for _ in range(2):
+            self.client.post('/api/token/', credentials, format='json')
+
+        with self.assertNumQueries(0):
+            response = self.client.post('/api/token/', credentials, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_concurrent_requests_cannot_share_a_token(self):
+        """Test that simultaneous requests spend exactly burst tokens between them"""
+        class Throttle(TokenBucketThrottle):
+            scope = 'booking_event'
+
+            def get_bucket_ident(self, request, view):
+                return 'shared'
+
+        # Every request reads the bucket before any of them takes a token
+        barrier = threading.Barrier(12)
+        get = LocMemCache.get
+
+        def racing_get(*args, **kwargs):
+            value = get(*args, **kwargs)
+            barrier.wait(timeout=5)
+            return value
+
+        with mock.patch.object(LocMemCache, 'get', racing_get), ThreadPoolExecutor(12) as pool:
+            allowed = list(pool.map(lambda _: Throttle().allow_request(None, None), range(12)))
+
+        self.assertEqual(allowed.count(True), 3)
+
+
+class PreMintedPoolTest(BookingTestMixin, APITestCase):
+    """Test booking from pre-minted ticket pools"""
+
+    def setUp(self):
+        self.create_fixtures(capacity=3)
+
+    def test_mint_command_fills_capacity(self):
+        """Test that mint_tickets creates unassigned tickets up to capacity"""
+        call_command('mint_tickets', str(self.event.id), stdout=StringIO())
+        call_command('mint_tickets', str(self.event.id), stdout=StringIO())
+
+        pool = Ticket.objects.filter(event=self.event)
+        self.assertEqual(pool.count(), 3)
+        self.assertTrue(all(t.status == 'unassigned' and t.user_id is None for t in pool))
+        self.assertTrue(all(t.qr_code == t.validation_url for t in pool))
+        self.event.refresh_from_db()
+        self.assertTrue(self.event.pre_minted)
+        self.assertEqual(self.event.tickets_sold, 0)
+
+    def test_booking_claims_minted_ticket(self):
+        """Test that a booking assigns a pooled row instead of inserting"""
+        mint_pool(self.event)
+        response = self.book(data={'quantity': 2})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Ticket.objects.filter(event=self.event).count(), 3)
+        claimed = Ticket.objects.filter(user=self.user)
+        self.assertEqual(
+            {str(t.validation_token) for t in claimed},
+            {t['validation_token'] for t in response.data['tickets']}
+        )
+        self.assertTrue(all(t.status == 'pending' for t in claimed))
+        self.event.refresh_from_db()
+        # The pool bounds capacity; the counter is not kept for pre-minted events
+        self.assertEqual(self.event.tickets_sold, 0)
+
+    def test_claim_is_one_statement(self):
+        """Test that claiming from a pool that covers the order is a single UPDATE"""
+        mint_pool(self.event)
+        with self.assertNumQueries(3):
+            # savepoint, UPDATE ... RETURNING, release savepoint
+            tickets = claim_pooled_tickets(self.event, self.user, 2)
+
+        self.assertEqual(
+            {t.validation_token for t in tickets},
+            set(Ticket.objects.filter(user=self.user).values_list('validation_token', flat=True))
+        )
+
+    def test_sold_out_pool_claims_nothing(self):
+        """Test that an order the pool cannot cover is refused whole"""
+        mint_pool(self.event)
+        self.book(data={'quantity': 2})
+
+        response = self.book(data={'quantity': 2})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Ticket.objects.filter(status='unassigned').count(), 1)
+
+    def test_cancelled_seat_is_minted_again(self):
+        """Test that a cancelled pooled ticket's seat goes back on sale"""
+        mint_pool(self.event)
+        self.book(data={'quantity': 3})
+        Ticket.objects.filter(user=self.user).first().cancel()
+
+        self.assertEqual(self.book().status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.book().status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_pre_minted_is_read_only(self):
+        """Test that organizers cannot mark an event pre-minted without a pool"""
+        serializer = EventSerializer(self.event, data={'pre_minted': True}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+
+        self.event.refresh_from_db()
+        self.assertFalse(self.event.pre_minted)
+
+    def test_short_pool_falls_back_to_insert(self):
+        """Test that bookings still work when the pool runs out early"""
+        mint_pool(self.event)
+        Event.objects.filter(pk=self.event.pk).update(capacity=4)
+
+        self.book(data={'quantity': 3})
+        response = self.book()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Ticket.objects.filter(user=self.user).count(), 4)
+        self.assertFalse(Ticket.objects.filter(status='unassigned').exists())
+
+    def test_unassigned_tickets_do_not_count_as_sold(self):
+        """Test that counter rebuilds ignore the unclaimed pool"""
+        mint_pool(self.event)
+        self.book()
+        call_command('rebuild_event_counters', stdout=StringIO())
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.tickets_sold, 1)
+
+
+@override_settings(ASYNC_BOOKING={'ENABLED': True, 'BATCH_SIZE': 10})
+class AsyncBookingTest(BookingTestMixin, APITestCase):
+    """Test the 202 Accepted booking pipeline"""
+
+    def setUp(self):
+        self.create_fixtures(capacity=2)
+
+    def book_async(self, user=None, data=None):
+        return self.book(user=user, data=data, HTTP_PREFER='respond-async')
+
+    def test_async_booking_is_queued(self):
+        """Test that an async booking returns 202 without creating tickets"""
+        response = self.book_async()
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response['Location'], response.data['status_url'])
+        self.assertFalse(Ticket.objects.exists())
+
+        poll = self.client.get(response.data['status_url'], **self.get_auth_header(self.user))
+        self.assertEqual(poll.data['status'], 'queued')
+
+    def test_worker_confirms_and_status_returns_tickets(self):
+        """Test that a drained intent reports its tickets"""
+        status_url = self.book_async(data={'quantity': 2}).data['status_url']
+
+        self.assertEqual(process_booking_intents(), 1)
+
+        poll = self.client.get(status_url, **self.get_auth_header(self.user))
+        self.assertEqual(poll.data['status'], 'confirmed')
+        self.assertEqual(len(poll.data['tickets']), 2)
+        self.assertEqual(OutgoingEmail.objects.count(), 1)
+
+    def test_intents_assigned_in_order(self):
+        """Test that the worker books intents first come, first served"""
+        other = User.objects.create_user(username='other@test.com', email='other@test.com', password='x')
+        self.book_async()
+        self.book_async(user=other)
+        self.book_async(user=other)
+
+        call_command('process_booking_intents', stdout=StringIO())
+
+        statuses = list(BookingIntent.objects.order_by('pk').values_list('status', flat=True))
+        self.assertEqual(statuses, ['confirmed', 'confirmed', 'rejected'])
+        self.assertEqual(Ticket.objects.count(), 2)
+
+    def test_sync_without_prefer_header(self):
+        """Test that clients not asking for async keep the 201 path"""
+        self.assertEqual(self.book().status_code, status.HTTP_201_CREATED)
+
+    def test_status_is_private(self):
+        """Test that users cannot poll someone else's booking"""
+        other = User.objects.create_user(username='other@test.com', email='other@test.com', password='x')
+        status_url = self.book_async().data['status_url']
+
+        poll = self.client.get(status_url, **self.get_auth_header(other))
+        self.assertEqual(poll.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(EMAIL_OUTBOX={'BATCH_SIZE': 10, 'MAX_ATTEMPTS': 2, 'BACKOFF_BASE': 30, 'BACKOFF_MAX': 3600})
+class EmailOutboxTest(BookingTestMixin, APITestCase):
+    """Test confirmation emails going through the outbox"""
+
+    def setUp(self):
+        self.create_fixtures(capacity=3)
+
+    def test_booking_does_not_send_mail(self):
+        """Test that the request only records the email"""
+        self.book()
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutgoingEmail.objects.get().to, [self.user.email])
+
+    def test_sold_out_booking_queues_nothing(self):
+        """Test that the email row rolls back with a failed booking"""
+        self.book(data={'quantity': 3})
+        self.book()
+
+        self.assertEqual(OutgoingEmail.objects.count(), 1)
+
+    def test_dispatch_batch_shares_one_connection(self):
+        """Test that a batch is sent over a single mail connection"""
+        for _ in range(3):
+            self.book()
+
+        with mock.patch.object(outbox, 'get_connection', wraps=outbox.get_connection) as get_connection:
+            call_command('dispatch_outbox', stdout=StringIO())
+
+        get_connection.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(OutgoingEmail.objects.filter(status='pending').exists())
+
+    def test_failed_send_backs_off_then_gives_up(self):
+        """Test that failures are retried after the backoff and then marked failed"""
+        self.book()
+        now = timezone.now()
+
+        with mock.patch.object(outbox.EmailMessage, 'send', side_effect=OSError('connection reset')):
+            self.assertEqual(outbox.dispatch_pending(now=now), (0, 1))
+            message = OutgoingEmail.objects.get()
+            self.assertEqual(message.next_attempt_at, now + timedelta(seconds=30))
+
+            # Not due yet
+            self.assertEqual(outbox.dispatch_pending(now=now + timedelta(seconds=10)), (0, 0))
+            self.assertEqual(outbox.dispatch_pending(now=now + timedelta(seconds=30)), (0, 1))
+
+        message.refresh_from_db()
+        self.assertEqual(message.status, 'failed')
+        self.assertEqual(message.attempts, 2)
+        self.assertEqual(message.last_error, 'connection reset')
+
+
+class RebuildEventCountersCommandTest(BookingTestMixin, APITestCase):
+    """Test the rebuild_event_counters management command"""
+
+    def setUp(self):
+        self.create_fixtures(capacity=10)
+
+    def test_rebuild_from_ticket_table(self):
+        """Test that drifted counters are recomputed from tickets"""
+        Ticket.objects.create(event=self.event, user=self.user)
+        Ticket.objects.create(event=self.event, user=self.user, status='paid')
+        Ticket.objects.create(event=self.event, user=self.user, status='cancelled')
+        Event.objects.filter(pk=self.event.pk).update(tickets_sold=7)
+
+        out = StringIO()
+        call_command('rebuild_event_counters', stdout=out)
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.tickets_sold, 2)
+        self.assertIn('1 had drifted', out.getvalue())
+
+
+class ShardedInventoryTest(BookingTestMixin, APITestCase):
+    """Test booking against sharded inventory buckets"""
+
+    def setUp(self):
+        self.create_fixtures(capacity=5)
+        self.event = shard_inventory(self.event, 3)
+
+    def test_shard_inventory_splits_remaining(self):
+        """Test that capacity is spread over the buckets"""
+        remaining = list(
+            InventoryShard.objects.filter(event=self.event)
+            .order_by('index').values_list('remaining', flat=True)
+        )
+        self.assertEqual(remaining, [2, 2, 1])
+
+    def test_sells_exactly_to_capacity(self):
+        """Test that bookings fall back across buckets until sold out"""
+        for _ in range(5):
+            self.assertEqual(self.book().status_code, status.HTTP_201_CREATED)
+
+        response = self.book()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(sharded_remaining(self.event), 0)
+        self.assertEqual(Ticket.objects.filter(event=self.event).count(), 5)
+
+    def test_multi_seat_claim_uses_rebalance(self):
+        """Test that scattered leftovers are pooled for a larger claim"""
+        self.assertTrue(self.event.reserve_seats(3))
+        self.assertEqual(sharded_remaining(self.event), 2)
+        self.assertFalse(self.event.reserve_seats(3))
+
+    def test_rebalance_concentrates_leftovers(self):
+        """Test that rebalancing moves seats into fewer buckets"""
+        InventoryShard.objects.filter(event=self.event).update(remaining=1)
+
+        self.assertEqual(rebalance_shards(self.event, min_bucket=2), 3)
+        remaining = sorted(
+            InventoryShard.objects.filter(event=self.event).values_list('remaining', flat=True)
+        )
+        self.assertEqual(remaining, [0, 0, 3])
+
+    def test_cancel_returns_seat_to_a_bucket(self):
+        """Test that a cancelled ticket goes back into the buckets"""
+        self.book()
+        Ticket.objects.get(event=self.event).cancel()
+        self.assertEqual(sharded_remaining(self.event), 5)
+
+    def test_rebalance_command_syncs_counter(self):
+        """Test that rebalance_inventory rolls buckets up into tickets_sold"""
+        self.book()
+        self.book()
+        call_command('rebalance_inventory', stdout=StringIO())
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.tickets_sold, 2)
+
+    def test_unshard_folds_back_into_counter(self):
+        """Test that turning sharding off keeps the sold count"""
+        self.book()
+        call_command('rebalance_inventory', event=[self.event.id], shards=0, stdout=StringIO())
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.inventory_shards, 0)
+        self.assertEqual(self.event.tickets_sold, 1)
+        self.assertFalse(InventoryShard.objects.filter(event=self.event).exists())
+
+
+@override_settings(WAITING_ROOM={
+    'ENABLED': True,
+    'ADMIT_PER_SECOND': 1,
+    'STORE': 'core.waiting_room.InMemoryQueueStore',
+})
+class WaitingRoomTest(BookingTestMixin, APITestCase):
+    """Test the waiting room in front of the booking endpoint"""
+
+    def setUp(self):
+        self.create_fixtures(capacity=10)
+        waiting_room._load_store.cache_clear()
+        self.join_url = reverse('waiting-room-join', kwargs={'event_id': self.event.id})
+        self.status_url = reverse('waiting-room-status', kwargs={'event_id': self.event.id})
+        self.clock = mock.patch.object(waiting_room, 'time', mock.Mock(**{'time.return_value': 1000.0}))
+        self.clock.start()
+        self.addCleanup(self.clock.stop)
+
+    def tick(self, seconds):
+        waiting_room.time.time.return_value += seconds
+
+    def join(self, user=None):
+        return self.client.post(self.join_url, {}, format='json', **self.get_auth_header(user or self.user))
+
+    def test_booking_requires_queue_token(self):
+        """Test that booking without a token is refused"""
+        response = self.book()
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Ticket.objects.exists())
+
+    def test_positions_are_admitted_at_configured_rate(self):
+        """Test that the cursor admits one position per second"""
+        first = self.join().data
+        second = self.join().data
+        self.assertEqual((first['position'], second['position']), (0, 1))
+
+        response = self.client.get(self.status_url, {'token': second['token']})
+        self.assertFalse(response.data['admitted'])
+        self.assertEqual(response.data['ahead'], 2)
+
+        self.tick(1)
+        self.assertEqual(self.book(HTTP_X_QUEUE_TOKEN=first['token']).status_code, status.HTTP_201_CREATED)
+        response = self.book(HTTP_X_QUEUE_TOKEN=second['token'])
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        self.tick(1)
+        self.assertEqual(self.book(HTTP_X_QUEUE_TOKEN=second['token']).status_code, status.HTTP_201_CREATED)
+
+    def test_admission_books_once(self):
+        """Test that an admitted token cannot be reused"""
+        token = self.join().data['token']
+        self.tick(1)
+        self.book(HTTP_X_QUEUE_TOKEN=token)
+
+        response = self.book(HTTP_X_QUEUE_TOKEN=token)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(Ticket.objects.count(), 1)
+
+    @override_settings(TOKEN_BUCKETS={'RATES': {'booking_user': {'burst': 1, 'refill': 1}}})
+    @mock.patch.object(TokenBucketThrottle, 'timer', mock.Mock(return_value=1000.0))
+    def test_throttled_booking_keeps_admission(self):
+        """Test that a 429 from the booking throttle does not spend the waiting room admission"""
+        first, second = self.join().data['token'], self.join().data['token']
+        self.tick(2)
+        self.assertEqual(self.book(HTTP_X_QUEUE_TOKEN=first).status_code, status.HTTP_201_CREATED)
+
+        response = self.book(HTTP_X_QUEUE_TOKEN=second)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        TokenBucketThrottle.timer.return_value += 1
+        self.assertEqual(self.book(HTTP_X_QUEUE_TOKEN=second).status_code, status.HTTP_201_CREATED)
+
+    def test_retried_booking_replays_instead_of_reusing_admission(self):
+        """Test that a retry with the same Idempotency-Key gets the stored 201, not a used-token 403"""
+        token = self.join().data['token']
+        self.tick(1)
+        first = self.book(HTTP_X_QUEUE_TOKEN=token, HTTP_IDEMPOTENCY_KEY='order-1')
+        retry = self.book(HTTP_X_QUEUE_TOKEN=token, HTTP_IDEMPOTENCY_KEY='order-1')
+
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Ticket.objects.count(), 1)
+
+        # A new key is a new booking and still needs a fresh admission
+        response = self.book(HTTP_X_QUEUE_TOKEN=token, HTTP_IDEMPOTENCY_KEY='order-2')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_idle_queue_does_not_bank_admissions(self):
+        """Test that time with nobody queued is not saved up for a surge"""
+        self.join()
+        self.tick(60)
+        tokens = [self.join().data['token'] for _ in range(5)]
+
+        admitted = [
+            self.client.get(self.status_url, {'token': token}).data['admitted']
+            for token in tokens
+        ]
+        self.assertEqual(admitted, [True, False, False, False, False])
+
+    def test_token_bound_to_user(self):
+        """Test that another user cannot book with someone's token"""
+        other = User.objects.create_user(username='other@test.com', email='other@test.com', password='x')
+        token = self.join().data['token']
+        self.tick(1)
+
+        response = self.book(user=other, HTTP_X_QUEUE_TOKEN=token)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_status_rejects_forged_token(self):
+        """Test that the status endpoint rejects tampered tokens"""
+        token = self.join().data['token']
+        response = self.client.get(self.status_url, {'token': token[:-2] + 'xx'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_status_does_not_query_database(self):
+        """Test that polling stays off the database"""
+        token = self.join().data['token']
+        with self.assertNumQueries(0):
+            self.client.get(self.status_url, {'token': token})
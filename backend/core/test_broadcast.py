@@ -0,0 +1,186 @@
+"""
+Test cases for attendee broadcasts
+"""
+from io import StringIO
+from datetime import timedelta
+from unittest import mock
+from django.core import mail
+from django.core.management import call_command
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import broadcast
+from .broadcast import send_broadcast
+from .models import Broadcast, Event, OutgoingEmail, Ticket
+
+User = get_user_model()
+
+
+@override_settings(BROADCASTS={'CHUNK_SIZE': 2, 'RATE': 0})
+class BroadcastTest(APITestCase):
+    """Test emailing every ticket holder of an event"""
+
+    def setUp(self):
+        self.organizer = User.objects.create_user(
+            username='organizer@test.com',
+            email='organizer@test.com',
+            password='testpass123',
+            role='organizer'
+        )
+        self.event = Event.objects.create(
+            name='Test Event',
+            description='Test description',
+            start_time=timezone.now() + timedelta(days=30),
+            end_time=timezone.now() + timedelta(days=30, hours=3),
+            location='Test Venue',
+            capacity=50,
+            organizer=self.organizer
+        )
+        self.holders = []
+        for i in range(5):
+            user = User.objects.create_user(username=f'user{i}@test.com', email=f'user{i}@test.com', password='x')
+            Ticket.objects.create(event=self.event, user=user, status='paid')
+            self.holders.append(user)
+        # A second ticket for the same holder, and a cancelled one
+        Ticket.objects.create(event=self.event, user=self.holders[0], status='paid')
+        cancelled = User.objects.create_user(username='gone@test.com', email='gone@test.com', password='x')
+        Ticket.objects.create(event=self.event, user=cancelled, status='cancelled')
+
+    def create_broadcast(self, **fields):
+        return Broadcast.objects.create(
+            event=self.event, created_by=self.organizer,
+            subject=fields.get('subject', '{{ event.name }} has moved'),
+            body=fields.get('body', 'New venue: {{ event.location }}'),
+        )
+
+    def test_endpoint_queues_broadcast(self):
+        """Test that organizers queue a broadcast and see its progress"""
+        url = reverse('event-broadcasts', kwargs={'event_id': self.event.pk})
+        refresh = RefreshToken.for_user(self.organizer)
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {refresh.access_token}'}
+
+        response = self.client.post(url, {'subject': 'Moved', 'body': 'See {{ event.name }}'}, format='json', **auth)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'queued')
+        self.assertEqual(len(mail.outbox), 0)
+
+        bad = self.client.post(url, {'subject': 'Moved', 'body': '{% if %}'}, format='json', **auth)
+        self.assertEqual(bad.status_code, status.HTTP_400_BAD_REQUEST)
+
+        call_command('send_broadcasts', stdout=StringIO())
+        listed = self.client.get(url, **auth)
+        self.assertEqual(listed.data[0]['status'], 'completed')
+        self.assertEqual(listed.data[0]['sent_count'], 5)
+
+    def test_each_holder_gets_one_email(self):
+        """Test that holders are deduplicated and cancelled tickets skipped"""
+        sent = send_broadcast(self.create_broadcast())
+
+        self.assertEqual(sent.sent_count, 5)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), sorted(u.email for u in self.holders))
+        self.assertEqual(mail.outbox[0].subject, 'Test Event has moved')
+        self.assertEqual(mail.outbox[0].body, 'New venue: Test Venue')
+
+    def test_resume_after_crash_skips_sent_recipients(self):
+        """Test that an interrupted broadcast resumes from its checkpoint"""
+        pending = self.create_broadcast()
+        original_send = broadcast.EmailMessage.send
+        calls = []
+
+        def crash_on_third(message, *args, **kwargs):
+            calls.append(message.to[0])
+            if len(calls) == 3:
+                raise KeyboardInterrupt
+            return original_send(message, *args, **kwargs)
+
+        with mock.patch.object(broadcast.EmailMessage, 'send', crash_on_third):
+            with self.assertRaises(KeyboardInterrupt):
+                send_broadcast(pending)
+
+        pending.refresh_from_db()
+        self.assertEqual((pending.status, pending.sent_count), ('sending', 2))
+
+        call_command('send_broadcasts', stdout=StringIO())
+        pending.refresh_from_db()
+        self.assertEqual((pending.status, pending.sent_count), ('completed', 5))
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(len({m.to[0] for m in mail.outbox}), 5)
+
+    def test_refused_messages_go_to_outbox(self):
+        """Test that a failed send is handed to the outbox for retry"""
+        with mock.patch.object(broadcast.EmailMessage, 'send', side_effect=OSError('refused')):
+            sent = send_broadcast(self.create_broadcast())
+
+        self.assertEqual((sent.sent_count, sent.failed_count), (0, 5))
+        self.assertEqual(OutgoingEmail.objects.filter(status='pending').count(), 5)
+
+    def test_send_rate_is_paced(self):
+        """Test that the configured rate spaces messages out"""
+        clock = [100.0]
+        fake_time = mock.Mock()
+        fake_time.monotonic.side_effect = lambda: clock[0]
+        fake_time.sleep.side_effect = lambda seconds: clock.__setitem__(0, clock[0] + seconds)
+
+        with mock.patch.object(broadcast, 'time', fake_time):
+            send_broadcast(self.create_broadcast(), rate=2)
+
+        # Five messages at two per second: the first goes straight out
+        self.assertEqual([call.args[0] for call in fake_time.sleep.call_args_list], [0.5] * 4)
+        self.assertEqual(clock[0], 102.0)
+
+    def test_templates_only_see_public_event_fields(self):
+        """Test that a template cannot walk from the event to other attendees"""
+        sent = send_broadcast(self.create_broadcast(
+            body='{% for t in event.ticket_set.all %}{{ t.user.email }}{% endfor %}'
+                 '{{ event.organizer.password }}|{{ event.name }}, {{ event.location }}'
+        ))
+
+        self.assertEqual(sent.sent_count, 5)
+        self.assertEqual(mail.outbox[0].body, '|Test Event, Test Venue')
+
+    def test_tags_reaching_outside_the_template_are_refused(self):
+        """Test that load, include, extends and debug are rejected on create"""
+        url = reverse('event-broadcasts', kwargs={'event_id': self.event.pk})
+        refresh = RefreshToken.for_user(self.organizer)
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {refresh.access_token}'}
+
+        for body in ('{% load static %}', '{% debug %}', '{% include "admin/base.html" %}', '{% extends "admin/base.html" %}'):
+            response = self.client.post(url, {'subject': 'Moved', 'body': body}, format='json', **auth)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, body)
+        self.assertFalse(Broadcast.objects.exists())
+
+    def test_overlapping_runner_skips_claimed_broadcast(self):
+        """Test that a broadcast another runner holds is not sent twice"""
+        pending = self.create_broadcast()
+        self.assertTrue(broadcast.claim(pending, 'other-runner', lease=60))
+
+        self.assertIsNone(send_broadcast(pending))
+        out = StringIO()
+        call_command('send_broadcasts', stdout=out)
+        self.assertIn('being sent by another runner', out.getvalue())
+        self.assertEqual(len(mail.outbox), 0)
+
+        # The other runner died; once its lease lapses the broadcast is picked up
+        Broadcast.objects.filter(pk=pending.pk).update(claimed_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(send_broadcast(pending).sent_count, 5)
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_run_stops_when_its_lease_is_taken_over(self):
+        """Test that a runner whose lease was taken over stops at its next checkpoint"""
+        pending = self.create_broadcast()
+        original_send = broadcast.EmailMessage.send
+
+        def lose_lease_after_first(message, *args, **kwargs):
+            Broadcast.objects.filter(pk=pending.pk).update(claimed_by='other-runner')
+            return original_send(message, *args, **kwargs)
+
+        with mock.patch.object(broadcast.EmailMessage, 'send', lose_lease_after_first):
+            stopped = send_broadcast(pending)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual((stopped.status, stopped.claimed_by), ('sending', 'other-runner'))
@@ -0,0 +1,124 @@
+"""
+Test cases for the live check-in feed
+"""
+import asyncio
+import json
+from datetime import timedelta
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import live_feed
+from .booking import book_tickets
+from .models import Event, Ticket
+
+User = get_user_model()
+
+
+class LiveFeedTest(TestCase):
+    """Test the Server-Sent Events feed behind organizer/events/<id>/live/"""
+
+    def setUp(self):
+        cache.clear()
+        self.organizer = User.objects.create_user(
+            username='organizer@test.com',
+            email='organizer@test.com',
+            password='testpass123',
+            role='organizer'
+        )
+        self.other_organizer = User.objects.create_user(
+            username='other@test.com',
+            email='other@test.com',
+            password='testpass123',
+            role='organizer'
+        )
+        self.user = User.objects.create_user(username='user@test.com', email='user@test.com', password='x')
+        self.event = Event.objects.create(
+            name='Test Event',
+            description='Test description',
+            start_time=timezone.now() + timedelta(days=30),
+            end_time=timezone.now() + timedelta(days=30, hours=3),
+            location='Test Venue',
+            capacity=50,
+            organizer=self.organizer
+        )
+        self.ticket = Ticket.objects.create(event=self.event, user=self.user, status='paid')
+        self.url = reverse('event-live-feed', kwargs={'event_id': self.event.pk})
+
+    def get_auth_header(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {'AUTHORIZATION': f'Bearer {refresh.access_token}'}
+
+    def scan(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ticket.mark_as_used(self.organizer)
+
+    async def next_event(self, chunks):
+        chunk = await asyncio.wait_for(anext(chunks), timeout=5)
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        kind, data = chunk.strip().split('\n')
+        return kind.removeprefix('event: '), json.loads(data.removeprefix('data: '))
+
+    async def test_snapshot_then_deltas(self):
+        """Test that a dashboard gets the counts once, then each scan as it happens"""
+        response = await self.async_client.get(self.url, headers=self.get_auth_header(self.organizer))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+        kind, data = await self.next_event(chunks)
+        self.assertEqual(kind, 'snapshot')
+        self.assertEqual((data['booked'], data['checked_in'], data['capacity']), (1, 0, 50))
+
+        await sync_to_async(self.scan)()
+        self.assertEqual(await self.next_event(chunks), ('delta', {'type': 'checked_in', 'count': 1}))
+
+    async def test_disconnect_unsubscribes(self):
+        """Test that closing a stream releases its subscription"""
+        chunks = live_feed.stream(self.event)
+        await anext(chunks)
+        self.assertEqual(live_feed.get_broker().subscriber_count(self.event.pk), 1)
+
+        await chunks.aclose()
+        self.assertEqual(live_feed.get_broker().subscriber_count(self.event.pk), 0)
+
+    async def test_access(self):
+        """Test that only the event's organizers can watch"""
+        anonymous = await self.async_client.get(self.url)
+        forbidden = await self.async_client.get(self.url, headers=self.get_auth_header(self.other_organizer))
+        self.assertEqual(anonymous.status_code, 401)
+        self.assertEqual(forbidden.status_code, 403)
+
+    def test_wsgi_is_refused(self):
+        """Test that a WSGI request gets 501 instead of a stream that never sends"""
+        response = self.client.get(self.url, headers=self.get_auth_header(self.organizer))
+        self.assertEqual(response.status_code, 501)
+
+    async def test_slow_subscriber_is_cut_off(self):
+        """Test that a subscriber that falls behind gets OVERFLOW instead of an unbounded backlog"""
+        broker = live_feed.InProcessBroker()
+        subscription = broker.subscribe(self.event.pk, maxsize=2)
+        for _ in range(3):
+            broker.publish(self.event.pk, {'type': 'checked_in', 'count': 1})
+        await asyncio.sleep(0)
+
+        self.assertIs(await subscription.get(timeout=1), live_feed.OVERFLOW)
+        broker.unsubscribe(subscription)
+        self.assertEqual(broker.subscriber_count(self.event.pk), 0)
+
+    def test_deltas_wait_for_commit(self):
+        """Test that bookings are announced only once their transaction commits"""
+        with mock.patch.object(live_feed.InProcessBroker, 'publish') as publish:
+            with self.captureOnCommitCallbacks() as callbacks:
+                book_tickets(self.event, self.user, quantity=2)
+            publish.assert_not_called()
+
+            for callback in callbacks:
+                callback()
+        publish.assert_called_once_with(self.event.pk, {'type': 'booked', 'count': 2})
@@ -0,0 +1,783 @@
+"""
+Test cases for the ticket scanning path - validate_ticket and bulk scanning
+"""
+import hashlib
+import hmac
+import json
+import struct
+from datetime import timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import manifest, recent_scans, scan_metrics, signed_tickets, validation_cache
+from .models import Event, ScanConflict, Ticket
+
+User = get_user_model()
+
+
+class ScanTestMixin:
+    """Shared fixtures for scanning tests"""
+
+    def create_fixtures(self):
+        cache.clear()
+        self.organizer = User.objects.create_user(
+            username='organizer@test.com',
+            email='organizer@test.com',
+            password='testpass123',
+            role='organizer'
+        )
+        self.other_organizer = User.objects.create_user(
+            username='other@test.com',
+            email='other@test.com',
+            password='testpass123',
+            role='organizer'
+        )
+        self.user = User.objects.create_user(
+            username='user@test.com',
+            email='user@test.com',
+            password='testpass123'
+        )
+        self.event = Event.objects.create(
+            name='Test Event',
+            description='Test description',
+            start_time=timezone.now() + timedelta(days=30),
+            end_time=timezone.now() + timedelta(days=30, hours=3),
+            location='Test Venue',
+            capacity=50,
+            organizer=self.organizer
+        )
+        self.ticket = Ticket.objects.create(event=self.event, user=self.user, status='paid')
+
+    def get_auth_header(self, user):
+        """Get authentication header for user"""
+        refresh = RefreshToken.for_user(user)
+        return {'HTTP_AUTHORIZATION': f'Bearer {refresh.access_token}'}
+
+    def validate_url(self, ticket=None):
+        return reverse('validate-ticket', kwargs={
+            'validation_token': (ticket or self.ticket).validation_token
+        })
+
+    def scan(self, ticket=None, user=None, **extra):
+        return self.client.post(
+            self.validate_url(ticket), {}, format='json',
+            **self.get_auth_header(user or self.organizer), **extra
+        )
+
+
+class IdempotentScanTest(ScanTestMixin, APITestCase):
+    """Test Idempotency-Key handling on validate_ticket"""
+
+    def setUp(self):
+        self.create_fixtures()
+
+    def test_retried_scan_replays_success(self):
+        """Test that a retried scan gets the original success back"""
+        first = self.scan(HTTP_IDEMPOTENCY_KEY='scan-1')
+        retry = self.scan(HTTP_IDEMPOTENCY_KEY='scan-1')
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.data['status'], 'scanned')
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+
+    def test_scan_without_key_is_not_replayed(self):
+        """Test that a second plain scan reports the ticket as used"""
+        self.scan()
+        response = self.scan()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ScanQueryCountTest(ScanTestMixin, APITestCase):
+    """Test that the scan path stays at one read (plus one write for POST)"""
+
+    def setUp(self):
+        self.create_fixtures()
+
+    def test_check_is_one_query(self):
+        """Test that GET resolves ticket, event, organizer and holder together"""
+        with self.assertNumQueries(2):
+            # auth user, joined ticket lookup
+            response = self.client.get(self.validate_url(), **self.get_auth_header(self.organizer))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['event']['organizer'], self.organizer.username)
+        self.assertEqual(response.data['ticket']['user_name'], self.user.username)
+
+    def test_scan_is_one_query_and_one_write(self):
+        """Test that POST adds only the status update"""
+        with self.assertNumQueries(3):
+            # auth user, joined ticket lookup, update
+            response = self.scan()
+
+        self.assertEqual(response.data['status'], 'scanned')
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, 'used')
+        self.assertEqual(self.ticket.scanned_by, self.organizer)
+
+    def test_rejections_are_one_query(self):
+        """Test that refused and already-used scans do not fetch more"""
+        with self.assertNumQueries(2):
+            response = self.scan(user=self.other_organizer)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.scan()
+        with self.assertNumQueries(2):
+            response = self.scan()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ScanManifestTest(ScanTestMixin, APITestCase):
+    """Test the offline scan manifest and its deltas"""
+
+    def setUp(self):
+        self.create_fixtures()
+        self.pending = Ticket.objects.create(event=self.event, user=self.user, status='pending')
+        self.used = Ticket.objects.create(event=self.event, user=self.user, status='used')
+        self.cancelled = Ticket.objects.create(event=self.event, user=self.user, status='cancelled')
+
+    def fetch(self, name='event-manifest', user=None, **params):
+        url = reverse(name, kwargs={'event_id': self.event.pk})
+        return self.client.get(url, params, **self.get_auth_header(user or self.organizer))
+
+    def read(self, response):
+        """Check the signature and split a manifest into header and entries"""
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        body, signature = content[:-32], content[-32:]
+        expected = hmac.new(manifest.signing_key(), body, hashlib.sha256).digest()
+        self.assertTrue(hmac.compare_digest(signature, expected))
+
+        header = manifest.HEADER.unpack(body[:manifest.HEADER.size])
+        rest = body[manifest.HEADER.size:]
+        if header[1] == manifest.KIND_BLOOM:
+            return header, rest
+        return header, [(rest[i:i + 16], rest[i + 16]) for i in range(0, len(rest), 17)]
+
+    def test_full_manifest_is_sorted_and_signed(self):
+        """Test that every booked ticket is listed once, sorted, with its status bits"""
+        response = self.fetch()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        (magic, kind, event_id, version, since), entries = self.read(response)
+        self.assertEqual((magic, kind, event_id), (manifest.MAGIC, manifest.KIND_FULL, self.event.pk))
+        self.assertEqual(response['X-Manifest-Version'], str(version))
+
+        tokens = [token for token, _ in entries]
+        self.assertEqual(tokens, sorted(tokens))
+        self.assertEqual(dict(entries), {
+            self.ticket.validation_token.bytes: manifest.STATUS_ADMIT,
+            self.pending.validation_token.bytes: manifest.STATUS_PENDING,
+            self.used.validation_token.bytes: manifest.STATUS_USED,
+        })
+
+    def test_delta_carries_only_changes(self):
+        """Test that a delta lists changed tickets, with cancellations as status 0"""
+        Ticket.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        base = int(self.fetch()['X-Manifest-Version'])
+
+        self.scan()
+        self.pending.cancel()
+
+        (_, kind, _, _, since), entries = self.read(self.fetch('event-manifest-delta', since=base))
+        self.assertEqual((kind, since), (manifest.KIND_DELTA, base))
+        self.assertEqual(dict(entries), {
+            self.ticket.validation_token.bytes: manifest.STATUS_USED,
+            self.pending.validation_token.bytes: 0,
+        })
+
+    def test_bloom_variant_holds_admissible_tokens(self):
+        """Test that the Bloom filter contains every admissible token"""
+        _, rest = self.read(self.fetch(variant='bloom'))
+        bits, hashes = struct.unpack('>IB', rest[:5])
+        filter_bits = rest[5:]
+
+        def contains(token):
+            return all(
+                filter_bits[p // 8] & (1 << (p % 8))
+                for p in manifest.bloom_positions(token.bytes, bits, hashes)
+            )
+        self.assertTrue(contains(self.ticket.validation_token))
+
+    def test_manifest_requires_event_organizer(self):
+        """Test that other organizers cannot download the manifest"""
+        self.assertEqual(self.fetch(user=self.other_organizer).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.fetch('event-manifest-delta', since='x').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(SIGNED_TICKETS={'ENABLED': True, 'KEYS': {'2025a': 'old-secret', '2026a': 'new-secret'}, 'ACTIVE_KEY': '2026a'})
+class SignedTicketTest(ScanTestMixin, APITestCase):
+    """Test signed QR payloads"""
+
+    def setUp(self):
+        self.create_fixtures()
+        self.payload = self.ticket.signed_qr_code
+
+    def signed_url(self, payload, **params):
+        url = reverse('validate-signed-ticket', kwargs={'payload': payload})
+        return f"{url}?{'&'.join(f'{k}={v}' for k, v in params.items())}" if params else url
+
+    def test_payload_round_trip(self):
+        """Test that a signed payload verifies and names its ticket"""
+        signed = signed_tickets.verify(self.payload, event_id=self.event.pk)
+
+        self.assertEqual((signed.key_id, signed.event_id, signed.ticket_id), ('2026a', self.event.pk, self.ticket.pk))
+        self.assertEqual(self.payload, self.ticket.signed_qr_code)
+        self.assertIn(self.payload, self.ticket.get_qr_code_data())
+
+    def test_rotated_key_still_verifies(self):
+        """Test that payloads signed with a retired-but-listed key verify"""
+        with override_settings(SIGNED_TICKETS={'ENABLED': True, 'KEYS': {'2025a': 'old-secret'}}):
+            old_payload = signed_tickets.sign(self.ticket)
+        self.assertEqual(signed_tickets.verify(old_payload).key_id, '2025a')
+
+        with override_settings(SIGNED_TICKETS={'ENABLED': True, 'KEYS': {'2026a': 'new-secret'}}):
+            with self.assertRaises(signed_tickets.InvalidSignedTicket) as raised:
+                signed_tickets.verify(old_payload)
+        self.assertEqual(raised.exception.reason, 'unknown_key')
+
+    def test_forged_and_wrong_event_rejected_without_queries(self):
+        """Test that bad codes never reach the database"""
+        forged = self.payload.replace(f'.{self.ticket.pk}.', f'.{self.ticket.pk + 1}.')
+        auth = self.get_auth_header(self.organizer)
+
+        with self.assertNumQueries(1):
+            # auth user only
+            response = self.client.get(self.signed_url(forged), **auth)
+        self.assertEqual(response.data['status'], 'bad_signature')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.signed_url(self.payload, event=self.event.pk + 1), **auth)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data['status'], 'wrong_event')
+
+        response = self.client.get(self.signed_url('not-a-ticket'), **auth)
+        self.assertEqual(response.data['status'], 'malformed')
+
+    def test_signed_scan_marks_ticket_used(self):
+        """Test that a genuine code goes on to the usual scan"""
+        response = self.client.post(
+            self.signed_url(self.payload, event=self.event.pk), {}, format='json',
+            **self.get_auth_header(self.organizer)
+        )
+        self.assertEqual(response.data['status'], 'scanned')
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, 'used')
+
+    def test_expired_payload(self):
+        """Test that MAX_AGE bounds a payload's lifetime"""
+        with override_settings(SIGNED_TICKETS={'ENABLED': True, 'KEYS': {'k': 's'}, 'MAX_AGE': 60}):
+            payload = signed_tickets.sign(self.ticket, issued_at=1000)
+            with self.assertRaises(signed_tickets.InvalidSignedTicket) as raised:
+                signed_tickets.verify(payload, now=1061)
+        self.assertEqual(raised.exception.reason, 'expired')
+
+
+class BulkValidateTest(ScanTestMixin, APITestCase):
+    """Test the set-based bulk status check"""
+
+    def setUp(self):
+        self.create_fixtures()
+        self.url = reverse('bulk-validate-tickets')
+        self.other_event = Event.objects.create(
+            name='Other Event',
+            description='Other description',
+            start_time=timezone.now() + timedelta(days=30),
+            end_time=timezone.now() + timedelta(days=30, hours=3),
+            location='Other Venue',
+            capacity=50,
+            organizer=self.other_organizer
+        )
+
+    def check(self, tokens):
+        return self.client.post(self.url, {'tokens': tokens}, format='json', **self.get_auth_header(self.organizer))
+
+    def test_results_follow_input_order(self):
+        """Test that every kind of token is answered in the order it was sent"""
+        used = Ticket.objects.create(event=self.event, user=self.user, status='used')
+        foreign = Ticket.objects.create(event=self.other_event, user=self.user, status='paid')
+        tokens = [
+            str(used.validation_token), 'not-a-uuid', str(foreign.validation_token),
+            str(self.ticket.validation_token), '00000000-0000-0000-0000-000000000000',
+            str(self.ticket.validation_token),
+        ]
+
+        response = self.check(tokens)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['token'] for r in response.data['results']], tokens)
+        self.assertEqual(
+            [r['status'] for r in response.data['results']],
+            ['used', 'invalid', 'forbidden', 'paid', 'not_found', 'paid']
+        )
+        self.assertEqual(response.data['valid_count'], 2)
+
+    def test_query_count_is_constant(self):
+        """Test that the batch costs one lookup however many tokens it holds"""
+        tickets = [Ticket.objects.create(event=self.event, user=self.user, status='paid') for _ in range(20)]
+        tokens = [str(t.validation_token) for t in tickets]
+
+        with self.assertNumQueries(2):
+            # auth user, one joined ticket lookup
+            response = self.check(tokens)
+        self.assertEqual(response.data['valid_count'], 20)
+
+    @override_settings(MAX_BULK_VALIDATE_TOKENS=2)
+    def test_batch_size_is_capped(self):
+        """Test that oversized batches are refused outright"""
+        response = self.check([str(self.ticket.validation_token)] * 3)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bare_list_body_is_refused(self):
+        """Test that a JSON list instead of an object is a 400, not a server error"""
+        response = self.client.post(
+            self.url, [str(self.ticket.validation_token)], format='json', **self.get_auth_header(self.organizer)
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkCheckInTest(ScanTestMixin, APITestCase):
+    """Test marking a batch of tickets used at once"""
+
+    def setUp(self):
+        self.create_fixtures()
+        self.url = reverse('bulk-check-in')
+
+    def check_in(self, tokens, user=None):
+        return self.client.post(
+            self.url, {'tokens': [str(t) for t in tokens]}, format='json',
+            **self.get_auth_header(user or self.organizer)
+        )
+
+    def test_batch_is_two_queries(self):
+        """Test that a batch costs one lookup and one UPDATE"""
+        tickets = [Ticket.objects.create(event=self.event, user=self.user, status='paid') for _ in range(20)]
+
+        with self.assertNumQueries(5):
+            # auth user, lookup, savepoint, update, release savepoint
+            response = self.check_in([t.validation_token for t in tickets])
+
+        self.assertEqual(response.data['checked_in'], 20)
+        self.assertEqual(Ticket.objects.filter(status='used', scanned_by=self.organizer, is_valid=False).count(), 20)
+
+    def test_outcomes_per_token(self):
+        """Test that each token reports what happened to it"""
+        used = Ticket.objects.create(event=self.event, user=self.user, status='used')
+        pending = Ticket.objects.create(event=self.event, user=self.user, status='pending')
+        tokens = [
+            self.ticket.validation_token, used.validation_token, pending.validation_token,
+            '00000000-0000-0000-0000-000000000000', 'garbage', self.ticket.validation_token,
+        ]
+
+        response = self.check_in(tokens)
+
+        self.assertEqual(
+            [r['outcome'] for r in response.data['results']],
+            ['checked_in', 'already_used', 'not_scannable', 'not_found', 'invalid', 'already_used']
+        )
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'pending')
+
+    def test_other_organizer_is_forbidden(self):
+        """Test that tickets of someone else's event are left alone"""
+        response = self.check_in([self.ticket.validation_token], user=self.other_organizer)
+
+        self.assertEqual(response.data['results'][0]['outcome'], 'forbidden')
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, 'paid')
+
+    def test_bare_list_body_is_refused(self):
+        """Test that a JSON list instead of an object is a 400 and checks nothing in"""
+        response = self.client.post(
+            self.url, [str(self.ticket.validation_token)], format='json', **self.get_auth_header(self.organizer)
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, 'paid')
+
+
+class ScanLogSyncTest(ScanTestMixin, APITestCase):
+    """Test uploading offline scan logs"""
+
+    def setUp(self):
+        self.create_fixtures()
+        self.url = reverse('scan-sync', kwargs={'event_id': self.event.pk})
+        self.t0 = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+
+    def record(self, ticket, device, minutes):
+        return json.dumps({
+            'token': str(ticket.validation_token),
+            'device': device,
+            'scanned_at': (self.t0 + timedelta(minutes=minutes)).isoformat(),
+        })
+
+    def upload(self, lines, user=None):
+        return self.client.generic(
+            'POST', self.url, '\n'.join(lines), content_type='application/x-ndjson',
+            **self.get_auth_header(user or self.organizer)
+        )
+
+    def test_offline_scan_is_applied(self):
+        """Test that an unscanned ticket takes the device's scan"""
+        response = self.upload([self.record(self.ticket, 'gate-1', 5)])
+
+        self.assertEqual(response.data['applied'], 1)
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, 'used')
+        self.assertFalse(self.ticket.is_valid)
+        self.assertEqual(self.ticket.scanned_device, 'gate-1')
+        self.assertEqual(self.ticket.scanned_at, self.t0 + timedelta(minutes=5))
+        self.assertEqual(self.ticket.scanned_by, self.organizer)
+
+    def test_earliest_scan_wins_and_conflicts_are_kept(self):
+        """Test that two gates scanning one ticket leave the earliest scan and a conflict row"""
+        self.upload([self.record(self.ticket, 'gate-1', 10)])
+        response = self.upload([
+            self.record(self.ticket, 'gate-2', 3),
+            self.record(self.ticket, 'gate-3', 20),
+        ])
+
+        self.assertEqual((response.data['superseded'], response.data['conflicts']), (1, 2))
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.scanned_device, 'gate-2')
+        self.assertEqual(
+            set(ScanConflict.objects.values_list('kept_device', 'rejected_device')),
+            {('gate-2', 'gate-1'), ('gate-2', 'gate-3')}
+        )
+
+    def test_reupload_is_a_duplicate(self):
+        """Test that uploading the same log twice changes nothing"""
+        lines = [self.record(self.ticket, 'gate-1', 5)]
+        self.upload(lines)
+        response = self.upload(lines)
+
+        self.assertEqual((response.data['applied'], response.data['duplicates']), (0, 1))
+        self.assertFalse(ScanConflict.objects.exists())
+
+    @override_settings(SCAN_SYNC={'CHUNK_SIZE': 2})
+    def test_streams_in_chunks_and_reports_bad_lines(self):
+        """Test that chunked ingestion gives the same answer and bad lines are reported"""
+        tickets = [Ticket.objects.create(event=self.event, user=self.user, status='paid') for _ in range(4)]
+        pending = Ticket.objects.create(event=self.event, user=self.user, status='pending')
+        lines = [self.record(ticket, 'gate-1', i) for i, ticket in enumerate(tickets)] + [
+            'not json',
+            self.record(pending, 'gate-1', 1),
+            json.dumps({'token': '00000000-0000-0000-0000-000000000000', 'scanned_at': self.t0.isoformat()}),
+            self.record(tickets[0], 'gate-2', -1),
+        ]
+
+        response = self.upload(lines)
+
+        self.assertEqual(response.data['received'], 8)
+        self.assertEqual(response.data['applied'], 4)
+        self.assertEqual(response.data['superseded'], 1)
+        self.assertEqual(response.data['not_scannable'], 1)
+        self.assertEqual(response.data['not_found'], 1)
+        self.assertEqual(response.data['errors'], [{'line': 5, 'error': response.data['errors'][0]['error']}])
+        tickets[0].refresh_from_db()
+        self.assertEqual(tickets[0].scanned_device, 'gate-2')
+
+    def test_other_organizer_is_forbidden(self):
+        """Test that only the event's organizer can sync its scans"""
+        response = self.upload([self.record(self.ticket, 'gate-1', 5)], user=self.other_organizer)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CompareAndSetScanTest(ScanTestMixin, APITestCase):
+    """Test that scans commit with a single conditional UPDATE"""
+
+    def setUp(self):
+        self.create_fixtures()
+
+    def test_only_one_of_two_stale_copies_wins(self):
+        """Test that two gates holding the same unscanned ticket cannot both admit it"""
+        gate_a = Ticket.objects.select_related('event').get(pk=self.ticket.pk)
+        gate_b = Ticket.objects.select_related('event').get(pk=self.ticket.pk)
+
+        self.assertTrue(gate_a.mark_as_used(self.organizer))
+        self.assertFalse(gate_b.mark_as_used(self.organizer))
+        self.assertEqual(gate_b.status, 'paid')
+
+    def test_scan_writes_only_scan_columns(self):
+        """Test that the commit is one UPDATE of the changed columns"""
+        ticket = Ticket.objects.select_related('event').get(pk=self.ticket.pk)
+        with self.assertNumQueries(1) as queries:
+            self.assertTrue(ticket.mark_as_used(self.organizer))
+
+        sql = queries.captured_queries[0]['sql']
+        self.assertTrue(sql.startswith('UPDATE'))
+        self.assertNotIn('qr_code', sql)
+        self.assertIn('"scanned_at" IS NULL', sql)
+
+    def test_lost_race_is_reported_to_the_gate(self):
+        """Test that the losing gate gets a refusal rather than a second admission"""
+        original = Ticket.mark_as_used
+
+        def scanned_elsewhere_first(ticket, user=None):
+            Ticket.objects.filter(pk=ticket.pk).update(status='used', is_valid=False, scanned_at=timezone.now())
+            return original(ticket, user)
+
+        with mock.patch.object(Ticket, 'mark_as_used', scanned_elsewhere_first):
+            response = self.scan()
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['status'], 'used')
+
+
+@override_settings(VALIDATION_CACHE={'ENABLED': True, 'TTL': 600, 'TOMBSTONE_TTL': 10})
+class ValidationCacheTest(ScanTestMixin, APITestCase):
+    """Test the read-through cache behind GET validate-ticket/"""
+
+    def setUp(self):
+        self.create_fixtures()
+        self.auth = self.get_auth_header(self.organizer)
+
+    def check(self, ticket=None):
+        return self.client.get(self.validate_url(ticket), **self.auth)
+
+    def test_repeat_checks_stay_off_the_database(self):
+        """Test that a cached token is answered without a ticket query"""
+        first = self.check()
+        with self.assertNumQueries(1):
+            # auth user only
+            second = self.check()
+
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(validation_cache.stats()['hits'], 1)
+        self.assertEqual(validation_cache.stats()['misses'], 1)
+
+    def test_scan_invalidates(self):
+        """Test that a used ticket is never reported scannable from the cache"""
+        self.check()
+        self.scan()
+
+        response = self.check()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['status'], 'used')
+
+    def test_cancel_and_bulk_check_in_invalidate(self):
+        """Test that set-based writes drop cached projections too"""
+        other = Ticket.objects.create(event=self.event, user=self.user, status='paid')
+        self.check()
+        self.check(other)
+
+        self.ticket.cancel()
+        self.client.post(reverse('bulk-check-in'), {'tokens': [str(other.validation_token)]}, format='json', **self.auth)
+
+        self.assertEqual(self.check().data['status'], 'cancelled')
+        self.assertEqual(self.check(other).data['status'], 'used')
+
+    def test_stale_read_cannot_repopulate(self):
+        """Test that a lookup racing a scan cannot cache the pre-scan state"""
+        stale = validation_cache.project(Ticket.objects.select_related('event__organizer', 'user').get(pk=self.ticket.pk))
+        self.ticket.mark_as_used(self.organizer)
+
+        # The racing lookup finishing after the scan's invalidation
+        self.assertFalse(cache.add(validation_cache.cache_key(self.ticket.validation_token), stale))
+        self.assertEqual(self.check().data['status'], 'used')
+
+    def test_warm_and_stats_endpoints(self):
+        """Test pre-warming an event and reading the counters"""
+        Ticket.objects.create(event=self.event, user=self.user, status='paid')
+        warm_url = reverse('validation-cache-warm', kwargs={'event_id': self.event.pk})
+
+        self.assertEqual(self.client.post(warm_url, **self.auth).data['warmed'], 2)
+        with self.assertNumQueries(1):
+            self.check()
+
+        stats = self.client.get(reverse('validation-cache-stats'), **self.auth).data
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_rate']), (1, 0, 1.0))
+
+
+class ScanMetricsTest(ScanTestMixin, APITestCase):
+    """Test live scan metrics and the organizer endpoint"""
+
+    def setUp(self):
+        self.create_fixtures()
+        scan_metrics.reset()
+        self.auth = self.get_auth_header(self.organizer)
+        self.url = reverse('event-scan-metrics', kwargs={'event_id': self.event.pk})
+
+    def test_scans_are_counted_per_outcome_and_scanner(self):
+        """Test the accept/reject mix, rate and percentiles over the window"""
+        other = Ticket.objects.create(event=self.event, user=self.user, status='paid')
+        self.client.get(self.validate_url(), **self.auth)
+        self.scan()
+        self.scan()  # already used
+        self.scan(other, user=self.other_organizer)  # forbidden
+
+        data = self.client.get(self.url, {'window': 10}, **self.auth).data
+        self.assertEqual(data['scans'], 4)
+        self.assertEqual((data['accepted'], data['rejected']), (2, 2))
+        self.assertEqual(data['outcomes'], {'scannable': 1, 'scanned': 1, 'used': 1, 'forbidden': 1})
+        self.assertEqual(data['scans_per_second'], 0.4)
+        self.assertIsNotNone(data['latency_ms']['p99'])
+        by_scanner = {row['scanner']: row['scans'] for row in data['scanners']}
+        self.assertEqual(by_scanner, {self.organizer.pk: 3, self.other_organizer.pk: 1})
+
+    def test_recording_is_buffered_between_flushes(self):
+        """Test that scans are appended in process and published on the flush interval"""
+        scan_metrics.record(self.event.pk, self.organizer.pk, 'scanned', 0.004, now=1000)
+        scan_metrics.record(self.event.pk, self.organizer.pk, 'used', 0.040, now=1001)
+        self.assertEqual(len(scan_metrics._pending), 1)
+
+        data = scan_metrics.snapshot(self.event.pk, window=60, now=1002)
+        self.assertEqual((data['accepted'], data['rejected']), (1, 1))
+        self.assertEqual(data['latency_ms'], {'p50': 5, 'p95': 50, 'p99': 50})
+        self.assertEqual(scan_metrics.snapshot(self.event.pk, window=60, now=2000)['scans'], 0)
+
+    def test_scan_path_makes_no_extra_queries(self):
+        """Test that recording a scan adds no database work"""
+        with self.assertNumQueries(2):
+            # auth user, joined ticket lookup
+            self.client.get(self.validate_url(), **self.auth)
+
+    def test_other_organizer_is_forbidden(self):
+        """Test that only the event's scanners can read its metrics"""
+        response = self.client.get(self.url, **self.get_auth_header(self.other_organizer))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(self.url, {'window': 0}, **self.auth).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(RECENT_SCANS={'ENABLED': True, 'TTL': 60, 'MAX_PER_EVENT': 2, 'SHARED': False})
+class RecentScansTest(ScanTestMixin, APITestCase):
+    """Test refusing just-scanned tokens from memory"""
+
+    def setUp(self):
+        self.create_fixtures()
+        recent_scans.reset()
+        self.auth = self.get_auth_header(self.organizer)
+
+    def committed_scan(self, ticket=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.scan(ticket)
+
+    def test_replay_is_refused_without_queries(self):
+        """Test that a screenshot at a second gate never reaches the database"""
+        self.assertEqual(self.committed_scan().status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(2):
+            # auth user for each request, no ticket queries
+            check = self.client.get(self.validate_url(), **self.auth)
+            replay = self.scan()
+        self.assertEqual((check.data['status'], replay.data['status']), ('used', 'used'))
+        self.assertEqual(replay.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_organizer_gets_the_usual_refusal(self):
+        """Test that a memory hit does not bypass the event permission check"""
+        self.committed_scan()
+        response = self.client.get(self.validate_url(), **self.get_auth_header(self.other_organizer))
+        self.assertEqual(response.data['status'], 'forbidden')
+
+    def test_bounded_and_expiring(self):
+        """Test that each event keeps its newest MAX_PER_EVENT tokens for TTL seconds"""
+        tickets = [self.ticket] + [Ticket.objects.create(event=self.event, user=self.user, status='paid') for _ in range(2)]
+        for ticket in tickets:
+            self.committed_scan(ticket)
+
+        self.assertEqual(recent_scans.size(self.event.pk), 2)
+        self.assertIsNone(recent_scans.lookup(self.ticket.validation_token))
+        self.assertIsNotNone(recent_scans.lookup(tickets[2].validation_token))
+        with mock.patch('core.recent_scans.time.monotonic', return_value=recent_scans.time.monotonic() + 61):
+            self.assertIsNone(recent_scans.lookup(tickets[2].validation_token))
+
+    def test_shared_tier_and_undo(self):
+        """Test that other processes see scans through the cache, and an undone scan is forgotten"""
+        with override_settings(RECENT_SCANS={'ENABLED': True, 'SHARED': True}):
+            self.committed_scan()
+            recent_scans.reset()  # as seen from another process
+            self.assertEqual(
+                recent_scans.lookup(self.ticket.validation_token), (self.event.pk, self.organizer.pk)
+            )
+
+            self.ticket.refresh_from_db()
+            self.ticket.status, self.ticket.is_valid, self.ticket.scanned_at = 'paid', True, None
+            self.ticket.save()
+            self.assertIsNone(recent_scans.lookup(self.ticket.validation_token))
+
+
+class ScannerSessionTest(ScanTestMixin, APITestCase):
+    """Test scanner sessions carrying pre-authorized event ids"""
+
+    def setUp(self):
+        self.create_fixtures()
+        self.second_event = Event.objects.create(
+            name='Second Event',
+            description='Test description',
+            start_time=timezone.now() + timedelta(days=31),
+            end_time=timezone.now() + timedelta(days=31, hours=3),
+            location='Test Venue',
+            capacity=50,
+            organizer=self.organizer
+        )
+
+    def open_session(self, events, user=None):
+        return self.client.post(
+            reverse('scanner-sessions'), {'events': events}, format='json',
+            **self.get_auth_header(user or self.organizer)
+        )
+
+    def session_header(self, events=None):
+        token = self.open_session(events or [self.event.pk]).data['token']
+        return {'HTTP_AUTHORIZATION': f'Scanner {token}'}
+
+    def test_scan_with_session_skips_user_lookup(self):
+        """Test that a session scan is authorized without loading the user"""
+        header = self.session_header()
+        with self.assertNumQueries(1):
+            # joined ticket lookup only
+            response = self.client.get(self.validate_url(), **header)
+        self.assertEqual(response.data['status'], 'scannable')
+
+        response = self.client.post(self.validate_url(), {}, format='json', **header)
+        self.assertEqual(response.data['status'], 'scanned')
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.scanned_by, self.organizer)
+
+    @override_settings(TOKEN_BUCKETS={'RATES': {'scan_user': {'burst': 1, 'refill': 0.001}}})
+    def test_each_session_has_its_own_scan_bucket(self):
+        """Test that gates scanning as the same organizer do not share one throttle bucket"""
+        first, second = self.session_header(), self.session_header()
+
+        self.assertEqual(self.client.get(self.validate_url(), **first).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(self.validate_url(), **second).status_code, status.HTTP_200_OK)
+        response = self.client.get(self.validate_url(), **first)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_session_covers_only_its_events(self):
+        """Test that a session cannot scan the organizer's other events"""
+        other = Ticket.objects.create(event=self.second_event, user=self.user, status='paid')
+        response = self.client.post(self.validate_url(other), {}, format='json', **self.session_header())
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        results = self.client.post(
+            reverse('bulk-check-in'), {'tokens': [str(self.ticket.validation_token), str(other.validation_token)]},
+            format='json', **self.session_header()
+        ).data['results']
+        self.assertEqual([r['outcome'] for r in results], ['checked_in', 'forbidden'])
+
+    def test_opening_a_session_checks_every_event(self):
+        """Test that sessions are only opened for events the organizer may scan"""
+        self.assertEqual(self.open_session([self.event.pk], user=self.other_organizer).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.open_session([self.event.pk, 999999]).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.open_session('all').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.open_session([2 ** 70]).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.open_session([0]).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.open_session([self.event.pk, self.second_event.pk]).status_code, status.HTTP_201_CREATED)
+
+    def test_expired_or_forged_session_is_rejected(self):
+        """Test that a stale or tampered token is refused"""
+        header = self.session_header()
+        with override_settings(SCANNER_SESSIONS={'MAX_AGE': -1}):
+            response = self.client.get(self.validate_url(), **header)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.client.get(self.validate_url(), HTTP_AUTHORIZATION=header['HTTP_AUTHORIZATION'] + 'x')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -728,3 +728,55 @@ class OrganizerDashboardAPITest(APITestCase):
         )
         
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class EventStatsAPITest(APITestCase):
+    """Test organizer/events/<id>/stats/"""
+
+    def setUp(self):
+        self.organizer = User.objects.create_user(
+            username='organizer@test.com',
+            email='organizer@test.com',
+            password='testpass123',
+            role='organizer'
+        )
+        self.user = User.objects.create_user(
+            username='user@test.com',
+            email='user@test.com',
+            password='testpass123'
+        )
+        self.event = Event.objects.create(
+            name='Test Event',
+            description='Test description',
+            start_time=timezone.now() + timedelta(days=30),
+            end_time=timezone.now() + timedelta(days=30, hours=3),
+            location='Test Venue',
+            capacity=20,
+            organizer=self.organizer
+        )
+        for ticket_status, count in (('pending', 2), ('paid', 3), ('used', 1), ('cancelled', 1), ('unassigned', 4)):
+            for _ in range(count):
+                Ticket.objects.create(event=self.event, user=self.user, status=ticket_status)
+        self.url = reverse('event-stats', kwargs={'event_id': self.event.pk})
+
+    def get_auth_header(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {'HTTP_AUTHORIZATION': f'Bearer {refresh.access_token}'}
+
+    def test_stats_are_one_query(self):
+        """Test that all counts come from a single grouped query"""
+        with self.assertNumQueries(3):
+            # auth user, event, grouped ticket counts
+            response = self.client.get(self.url, **self.get_auth_header(self.organizer))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_tickets'], 7)
+        self.assertEqual(response.data['available_capacity'], 14)
+        self.assertEqual(response.data['scan_rate'], '33.3%')
+        self.assertEqual(response.data['revenue_breakdown'], {'sold': 4, 'awaiting_payment': 2, 'cancelled': 1})
+        self.assertEqual(response.data['attendance'], {'checked_in': 1, 'remaining': 3, 'checked_in_rate': 0.25})
+
+    def test_attendee_is_forbidden(self):
+        """Test that regular users cannot read event stats"""
+        response = self.client.get(self.url, **self.get_auth_header(self.user))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,160 @@
+"""
+Token-bucket throttles for the booking, login and scan endpoints.
+
+Each scope in TOKEN_BUCKETS['RATES'] has a burst (bucket size) and a refill
+rate in tokens per second. A request takes one token from its bucket and is
+refused with 429 when the bucket is empty. The check is O(1) and never
+touches the database.
+
+A bucket is two cache entries, updated only with atomic primitives so
+concurrent requests cannot spend the same token:
+
+- `start`, written once with cache.add, is when the bucket was last full;
+- a counter keyed on that start time holds the tokens taken since then.
+
+A request incr()s the counter. It is refused, and decr()s its token back,
+when more tokens were taken than the burst plus what has refilled since
+start. Both entries expire once the bucket would have refilled completely,
+so the next request starts a new bucket. Any cache with atomic add and
+incr/decr works (Memcached, Redis, or LocMem within one process).
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+DEFAULTS = {
+    'CACHE_ALIAS': 'default',
+    'RATES': {},
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'TOKEN_BUCKETS', {})}
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Base class; subclasses set scope and say what the bucket is keyed on"""
+    scope = None
+    timer = time.time
+
+    def get_bucket_ident(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        config = get_config()
+        rate = config['RATES'].get(self.scope)
+        if not rate:
+            return True
+        ident = self.get_bucket_ident(request, view)
+        if ident is None:
+            return True
+
+        burst, refill = rate['burst'], rate['refill']
+        cache = caches[config['CACHE_ALIAS']]
+        key = f'throttle:{self.scope}:{ident}'
+        now = self.timer()
+        refill_time = math.ceil(burst / refill) + 1
+
+        cache.add(f'{key}:start', now, timeout=refill_time)
+        start = cache.get(f'{key}:start', now)
+        # A new start time means a new counter, so a stale one is never reused
+        taken_key = f'{key}:{start}'
+        cache.add(taken_key, 0, timeout=2 * refill_time)
+        try:
+            taken = cache.incr(taken_key)
+        except ValueError:
+            # Expired in between; the bucket is full again
+            return True
+
+        refilled = math.floor(max(now - start, 0) * refill)
+        if taken - refilled > burst:
+            cache.decr(taken_key)
+            self.wait_time = start + (taken - burst) / refill - now
+            return False
+
+        # Expire both entries once the bucket would be full again; the counter
+        # outlives the start time so a live start never meets a fresh counter
+        full_in = max(math.ceil(start + taken / refill - now), 1)
+        cache.touch(f'{key}:start', full_in)
+        cache.touch(taken_key, full_in + refill_time)
+        return True
+
+    def wait(self):
+        return getattr(self, 'wait_time', None)
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """One bucket per authenticated user, per client IP for anonymous requests"""
+
+    def get_bucket_ident(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """One bucket per client IP"""
+
+    def get_bucket_ident(self, request, view):
+        return self.get_ident(request)
+
+
+class EventTokenBucketThrottle(TokenBucketThrottle):
+    """One bucket per event, shared by everyone booking it"""
+
+    def get_bucket_ident(self, request, view):
+        return view.kwargs.get('event_id')
+
+
+class AccountTokenBucketThrottle(TokenBucketThrottle):
+    """One bucket per account named in a login request"""
+
+    def get_bucket_ident(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        return email.strip().lower() if isinstance(email, str) and email else None
+
+
+class BookingUserThrottle(UserTokenBucketThrottle):
+    scope = 'booking_user'
+
+
+class BookingIPThrottle(IPTokenBucketThrottle):
+    scope = 'booking_ip'
+
+
+class BookingEventThrottle(EventTokenBucketThrottle):
+    scope = 'booking_event'
+
+
+class LoginIPThrottle(IPTokenBucketThrottle):
+    scope = 'login_ip'
+
+
+class LoginAccountThrottle(AccountTokenBucketThrottle):
+    scope = 'login_account'
+
+
+class ScanUserThrottle(UserTokenBucketThrottle):
+    """
+    One bucket per scanner session, so each gate device is limited on its
+    own; per user for scans made with the organizer's own credentials
+    """
+    scope = 'scan_user'
+
+    def get_bucket_ident(self, request, view):
+        session_id = getattr(request.user, 'scanner_session_id', None)
+        if session_id:
+            return f'session:{session_id}'
+        return super().get_bucket_ident(request, view)
+
+
+class ScanIPThrottle(IPTokenBucketThrottle):
+    scope = 'scan_ip'
+
+
+BOOKING_THROTTLES = [BookingUserThrottle, BookingIPThrottle, BookingEventThrottle]
+LOGIN_THROTTLES = [LoginIPThrottle, LoginAccountThrottle]
+SCAN_THROTTLES = [ScanUserThrottle, ScanIPThrottle]
@@ -0,0 +1,145 @@
+"""
+Pre-minted ticket pools for announced on-sales.
+
+mint_pool() inserts an event's capacity as unassigned tickets (user NULL,
+status 'unassigned') with their validation tokens and QR codes already
+generated. Bookings then claim rows from the pool with one UPDATE ...
+RETURNING statement (PostgreSQL, SQLite 3.35+; other databases SELECT the
+ids first). No UUIDs are generated, no QR strings are formatted, nothing
+is inserted and the event row is not touched at booking time. The pool
+bounds capacity by itself, so pre-minted events do not maintain
+tickets_sold. The ticket_unassigned_pool_idx partial index keeps the pick
+cheap.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import validation_cache
+from .models import Event, Ticket
+
+
+def mint_pool(event, batch_size=5000):
+    """Top the event's pool up to its capacity; returns how many tickets were minted"""
+    with transaction.atomic():
+        event = Event.objects.select_for_update().get(pk=event.pk)
+        existing = Ticket.objects.filter(event=event).exclude(status='cancelled').count()
+        missing = max(event.capacity - existing, 0)
+
+        for start in range(0, missing, batch_size):
+            Ticket.objects.bulk_create([
+                Ticket.prepare(event=event, status='unassigned')
+                for _ in range(min(batch_size, missing - start))
+            ])
+
+        if not event.pre_minted:
+            event.pre_minted = True
+            event.save(update_fields=['pre_minted'])
+    return missing
+
+
+# What claim_pooled_tickets writes besides the caller's fields
+CLAIM_FIELDS = ('user', 'status', 'created_at', 'updated_at')
+
+
+def _claim_returning(event, user, quantity, fields):
+    """
+    Assign up to `quantity` pool rows in one UPDATE ... RETURNING statement:
+
+        UPDATE core_ticket SET user_id = ..., status = 'pending', ...
+        WHERE id IN (SELECT id FROM core_ticket
+                     WHERE event_id = ... AND status = 'unassigned'
+                     ORDER BY id LIMIT n FOR UPDATE SKIP LOCKED)
+          AND status = 'unassigned'
+        RETURNING id, validation_token, qr_code
+    """
+    qn = connection.ops.quote_name
+    meta = Ticket._meta
+    claimed = Ticket(user=user, status='pending', **fields)
+    assignments, params = [], []
+    for name in (*CLAIM_FIELDS, *fields):
+        field = meta.get_field(name)
+        assignments.append(f'{qn(field.column)} = %s')
+        params.append(field.get_db_prep_save(getattr(claimed, field.attname), connection))
+
+    table, pk, status = qn(meta.db_table), qn(meta.pk.column), qn(meta.get_field('status').column)
+    # Concurrent bookings take different rows instead of queueing on one
+    skip_locked = ' FOR UPDATE SKIP LOCKED' if connection.features.has_select_for_update_skip_locked else ''
+    sql = (
+        f"UPDATE {table} SET {', '.join(assignments)} "
+        f"WHERE {pk} IN (SELECT {pk} FROM {table} WHERE {qn(meta.get_field('event').column)} = %s "
+        f"AND {status} = 'unassigned' ORDER BY {pk} LIMIT %s{skip_locked}) "
+        f"AND {status} = 'unassigned' "
+        f"RETURNING {pk}, {qn(meta.get_field('validation_token').column)}, {qn(meta.get_field('qr_code').column)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, event.pk, quantity])
+        rows = cursor.fetchall()
+    to_uuid = meta.get_field('validation_token').to_python
+    return [(pk, to_uuid(token), qr_code) for pk, token, qr_code in rows]
+
+
+def _claim_in_two_steps(event, user, quantity, fields):
+    """SELECT the next free ids, then UPDATE them; for databases without UPDATE ... RETURNING"""
+    pool = Ticket.objects.filter(event_id=event.pk, status='unassigned').order_by('pk')
+    if connection.features.has_select_for_update_skip_locked:
+        pool = pool.select_for_update(skip_locked=True)
+    rows = list(pool.values_list('pk', 'validation_token', 'qr_code')[:quantity])
+    ids = [pk for pk, _, _ in rows]
+    updated = Ticket.objects.filter(pk__in=ids, status='unassigned').update(user=user, status='pending', **fields)
+    if updated == len(ids):
+        return rows
+    # Lost a race for some rows (no SKIP LOCKED); re-read which are ours
+    return list(
+        Ticket.objects.filter(pk__in=ids, user=user, status='pending')
+        .values_list('pk', 'validation_token', 'qr_code')
+    )
+
+
+def _claim(event, user, quantity, fields):
+    # MariaDB returns rows from INSERT but not from UPDATE
+    returning = connection.vendor == 'postgresql' or (
+        connection.vendor == 'sqlite' and connection.features.can_return_rows_from_bulk_insert
+    )
+    if returning:
+        return _claim_returning(event, user, quantity, fields)
+    return _claim_in_two_steps(event, user, quantity, fields)
+
+
+class _PoolExhausted(Exception):
+    pass
+
+
+def claim_pooled_tickets(event, user, quantity=1, **fields):
+    """
+    Assign `quantity` pre-minted tickets of the event to the user and return
+    them, or None when the event is sold out.
+
+    The pool is the event's inventory: a booking the pool covers is a single
+    UPDATE, and tickets_sold is left alone. When the pool runs short (say,
+    capacity was raised or tickets were cancelled since minting) it is
+    topped up by mint_pool(), which counts against capacity under the
+    event's row lock, and the rest of the order is claimed from that.
+    """
+    # Booked tickets report when they were booked, not when they were minted
+    fields.setdefault('created_at', timezone.now())
+    fields.setdefault('updated_at', fields['created_at'])
+    try:
+        with transaction.atomic():
+            claimed = _claim(event, user, quantity, fields)
+            if len(claimed) < quantity:
+                mint_pool(event)
+                claimed += _claim(event, user, quantity - len(claimed), fields)
+            if len(claimed) < quantity:
+                # Roll back the part of the order that did fit
+                raise _PoolExhausted
+    except _PoolExhausted:
+        return None
+
+    validation_cache.invalidate([token for _, token, _ in claimed])
+    return [
+        Ticket(
+            pk=pk, event=event, user=user, status='pending',
+            validation_token=token, qr_code=qr_code, **fields
+        )
+        for pk, token, qr_code in claimed
+    ]
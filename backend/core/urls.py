@@ -6,23 +6,41 @@
 from django.urls import path, include
 from .views import (
     EventListCreateView, TicketCreateView, MyTicketsView,
-    validate_ticket, bulk_validate_tickets,
-    OrganizerEventListView, EventTicketsView, event_stats
+    join_waiting_room, waiting_room_status, booking_status,
+    validate_ticket, validate_signed_ticket, bulk_validate_tickets, bulk_check_in,
+    OrganizerEventListView, EventTicketsView, event_stats, event_broadcasts,
+    event_manifest, event_manifest_delta, sync_scan_log,
+    warm_validation_cache, validation_cache_stats, event_scan_metrics, event_live_feed,
+    open_scanner_session
 )
 
 urlpatterns = [
     # Public/User endpoints
     path('events/', EventListCreateView.as_view(), name='event-list-create'),
     path('events/<int:event_id>/book/', TicketCreateView.as_view(), name='book-ticket'),
+    path('events/<int:event_id>/queue/', join_waiting_room, name='waiting-room-join'),
+    path('events/<int:event_id>/queue/status/', waiting_room_status, name='waiting-room-status'),
+    path('bookings/<uuid:reference>/', booking_status, name='booking-status'),
     path('my-tickets/', MyTicketsView.as_view(), name='my-tickets'),
     path('api/auth/', include('accounts.urls')),
     
     # 🎫 QR Code Validation Endpoints (Organizer only)
     path('validate-ticket/<uuid:validation_token>/', validate_ticket, name='validate-ticket'),
+    path('validate-ticket/signed/<str:payload>/', validate_signed_ticket, name='validate-signed-ticket'),
     path('bulk-validate/', bulk_validate_tickets, name='bulk-validate-tickets'),
+    path('bulk-check-in/', bulk_check_in, name='bulk-check-in'),
+    path('organizer/scanner-sessions/', open_scanner_session, name='scanner-sessions'),
     
     # 📊 Organizer Dashboard Endpoints
     path('organizer/events/', OrganizerEventListView.as_view(), name='organizer-events'),
     path('organizer/events/<int:event_id>/tickets/', EventTicketsView.as_view(), name='event-tickets'),
     path('organizer/events/<int:event_id>/stats/', event_stats, name='event-stats'),
+    path('organizer/events/<int:event_id>/broadcasts/', event_broadcasts, name='event-broadcasts'),
+    path('organizer/events/<int:event_id>/manifest/', event_manifest, name='event-manifest'),
+    path('organizer/events/<int:event_id>/manifest/delta/', event_manifest_delta, name='event-manifest-delta'),
+    path('organizer/events/<int:event_id>/scan-sync/', sync_scan_log, name='scan-sync'),
+    path('organizer/events/<int:event_id>/validation-cache/warm/', warm_validation_cache, name='validation-cache-warm'),
+    path('organizer/validation-cache/', validation_cache_stats, name='validation-cache-stats'),
+    path('organizer/events/<int:event_id>/scan-metrics/', event_scan_metrics, name='event-scan-metrics'),
+    path('organizer/events/<int:event_id>/live/', event_live_feed, name='event-live-feed'),
 ]
@@ -0,0 +1,129 @@
+"""
+Read-through cache of ticket validation projections for GET validate-ticket/.
+
+A projection is the little a gate check needs: status, validity, scan
+time, event and organizer, and the serialized ticket. It is keyed by
+validation token and held in a Django cache for TTL seconds.
+
+Every write that changes a ticket's scan state calls invalidate(). That
+covers mark_as_used, cancel, save, the hold sweeper, pool claims, bulk
+check-in and scan log sync. invalidate() does not simply delete the entry.
+It writes a tombstone that lives for TOMBSTONE_TTL seconds, and entries
+are only ever stored with cache.add(), which a tombstone blocks. So a
+lookup that read the row just before a scan cannot put the stale "paid"
+projection back after the scan's invalidation. A used ticket is never
+reported as scannable, provided a lookup's read-and-store takes less than
+TOMBSTONE_TTL.
+
+POSTs never use the cache; the scan itself is the compare-and-set in
+Ticket.mark_as_used.
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULTS = {
+    'ENABLED': False,
+    'TTL': 30 * 60,
+    'TOMBSTONE_TTL': 10,
+    'CACHE_ALIAS': 'default',
+}
+
+TOMBSTONE = 'invalidated'
+HITS_KEY = 'validation-cache:hits'
+MISSES_KEY = 'validation-cache:misses'
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'VALIDATION_CACHE', {})}
+
+
+def _cache(config=None):
+    return caches[(config or get_config())['CACHE_ALIAS']]
+
+
+def cache_key(validation_token):
+    return f'validation-cache:{validation_token}'
+
+
+def _bump(cache, key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def project(ticket):
+    """The validation projection of a ticket loaded with event__organizer and user"""
+    from .serializers import TicketValidationSerializer
+    return {
+        'event_id': ticket.event_id,
+        'event_name': ticket.event.name,
+        'event_start': ticket.event.start_time,
+        'organizer_id': ticket.event.organizer_id,
+        'organizer': ticket.event.organizer.username,
+        'status': ticket.status,
+        'is_valid': ticket.is_valid,
+        'scanned_at': ticket.scanned_at,
+        'scannable': ticket.is_scannable(),
+        'ticket': TicketValidationSerializer(ticket).data,
+    }
+
+
+def _queryset():
+    from .models import Ticket
+    return Ticket.objects.select_related('event__organizer', 'user')
+
+
+def lookup(validation_token):
+    """Projection for a token from the cache, loading it on a miss; None for unknown tokens"""
+    config = get_config()
+    cache = _cache(config)
+    key = cache_key(validation_token)
+
+    cached = cache.get(key)
+    if cached is not None and cached != TOMBSTONE:
+        _bump(cache, HITS_KEY)
+        return cached
+    _bump(cache, MISSES_KEY)
+
+    ticket = _queryset().filter(validation_token=validation_token).first()
+    if ticket is None:
+        return None
+    projection = project(ticket)
+    # add() rather than set(): a tombstone written since our read wins
+    cache.add(key, projection, timeout=config['TTL'])
+    return projection
+
+
+def invalidate(validation_tokens):
+    """Drop cached projections after their tickets changed"""
+    config = get_config()
+    if not config['ENABLED'] or not validation_tokens:
+        return
+    _cache(config).set_many(
+        {cache_key(token): TOMBSTONE for token in validation_tokens},
+        timeout=config['TOMBSTONE_TTL']
+    )
+
+
+def warm(event, chunk_size=2000):
+    """Load the projections of every booked ticket of the event; returns how many were stored"""
+    from .models import Ticket
+    config = get_config()
+    cache = _cache(config)
+    tickets = _queryset().filter(event=event).exclude(status__in=Ticket.UNSOLD_STATUSES)
+    stored = 0
+    for ticket in tickets.iterator(chunk_size=chunk_size):
+        stored += cache.add(cache_key(ticket.validation_token), project(ticket), timeout=config['TTL'])
+    return stored
+
+
+def stats():
+    values = _cache().get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = values.get(HITS_KEY, 0), values.get(MISSES_KEY, 0)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+    }
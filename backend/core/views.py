@@ -1,19 +1,35 @@
+import uuid
+from datetime import timedelta
+from collections import Counter
+
+from django.conf import settings
 from rest_framework import generics, permissions, filters
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, authentication_classes, throttle_classes
 from rest_framework.permissions import AllowAny
-from .models import Event, Ticket
-from .serializers import EventSerializer, TicketSerializer, TicketValidationSerializer
-from .permissions import IsOrganizerOrAdmin, CanScanEventTickets, IsEventOrganizer
+from .models import Event, Ticket, BookingIntent
+from .serializers import EventSerializer, TicketSerializer, TicketValidationSerializer, TicketBookingSerializer, BroadcastSerializer
+from .permissions import IsOrganizerOrAdmin, CanScanEventTickets, IsEventOrganizer, HasWaitingRoomAdmission
+from . import live_feed, manifest, recent_scans, scan_metrics, scan_sync, scanner_sessions, signed_tickets, validation_cache, waiting_room
+from .booking import book_tickets, async_requested
+from .idempotency import idempotent
+from .scanner_sessions import SCAN_AUTHENTICATION
+from .throttling import BOOKING_THROTTLES, SCAN_THROTTLES
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from asgiref.sync import sync_to_async
 from rest_framework import status
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db import connection, transaction
+from django.db.models import Count
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
 
-from django.core.mail import send_mail
-from django.conf import settings
-
 # 📅 List and Create Events
 
 class EventListCreateView(generics.ListCreateAPIView):
@@ -43,30 +59,117 @@ class EventListCreateView(generics.ListCreateAPIView):
 # 🎟️ Book a Ticket for an Event
 class TicketCreateView(generics.CreateAPIView):
     serializer_class = TicketSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, HasWaitingRoomAdmission]
+    throttle_classes = BOOKING_THROTTLES
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # DRF throttles after the permission checks; spend the waiting room
+        # admission only once the throttles have let the request through
+        HasWaitingRoomAdmission.spend(request)
 
+    @method_decorator(idempotent)
     def post(self, request, *args, **kwargs):
         event_id = self.kwargs.get('event_id')
         event = get_object_or_404(Event, id=event_id)
 
-        # Check if event still has capacity
-        current_tickets = Ticket.objects.filter(event=event).count()
-        if current_tickets >= event.capacity:
-            return Response({"error": "Event is fully booked."}, status=status.HTTP_400_BAD_REQUEST)
+        booking = TicketBookingSerializer(data=request.data)
+        booking.is_valid(raise_exception=True)
+        quantity = booking.validated_data['quantity']
+
+        if async_requested(request):
+            intent = BookingIntent.objects.create(user=request.user, event=event, quantity=quantity)
+            status_url = reverse('booking-status', kwargs={'reference': intent.reference})
+            return Response({
+                'reference': intent.reference,
+                'status': intent.status,
+                'status_url': status_url,
+            }, status=status.HTTP_202_ACCEPTED, headers={'Location': status_url})
+
+        tickets = book_tickets(event, request.user, quantity)
+        if tickets is None:
+            if quantity == 1:
+                return Response({"error": "Event is fully booked."}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({"error": f"Not enough tickets available for {quantity} seats."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if quantity == 1:
+            serializer = self.get_serializer(tickets[0])
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        serializer = self.get_serializer(tickets, many=True)
+        return Response({
+            'quantity': quantity,
+            'tickets': serializer.data
+        }, status=status.HTTP_201_CREATED)
 
-        ticket = Ticket.objects.create(user=request.user, event=event)
 
-        # Send confirmation email after ticket is created
-        send_mail(
-            subject='Your Ticket Confirmation',
-            message=f"Hi {request.user.username}, your ticket for {event.name} has been reserved. See you there!",
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[request.user.email],
-            fail_silently=True
-        )
+# 📬 Async Booking Status
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def booking_status(request, reference):
+    """
+    Outcome of an async booking: queued, confirmed (with tickets),
+    rejected or failed
+    """
+    intent = get_object_or_404(BookingIntent, reference=reference, user=request.user)
+    data = {
+        'reference': intent.reference,
+        'status': intent.status,
+        'quantity': intent.quantity,
+        'created_at': intent.created_at,
+        'processed_at': intent.processed_at,
+    }
+    if intent.status == 'confirmed':
+        data['tickets'] = TicketSerializer(intent.tickets.select_related('event'), many=True).data
+    elif intent.error:
+        data['error'] = intent.error
+    return Response(data)
+
+
+# ⏳ Virtual Waiting Room
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def join_waiting_room(request, event_id):
+    """
+    Take a place in the event's booking queue
+    Returns a signed token to poll the status endpoint with and to send as
+    the X-Queue-Token header once admitted
+    """
+    get_object_or_404(Event, id=event_id)
+    position, token = waiting_room.join_queue(event_id, request.user.pk)
+    admitted, ahead, wait = waiting_room.queue_status(event_id, position)
 
-        serializer = self.get_serializer(ticket)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    return Response({
+        'position': position,
+        'token': token,
+        'admitted': admitted,
+        'ahead': ahead,
+        'retry_after': round(wait, 2) if wait is not None else None,
+        'status_url': reverse('waiting-room-status', kwargs={'event_id': event_id}),
+    }, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def waiting_room_status(request, event_id):
+    """
+    Poll a queue position: GET ?token=<queue token>
+    The token is signed, so this never touches the database
+    """
+    payload = waiting_room.read_token(request.query_params.get('token', ''), event_id)
+    if payload is None:
+        return Response({
+            'error': 'Invalid or expired queue token'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    admitted, ahead, wait = waiting_room.queue_status(event_id, payload['p'])
+    return Response({
+        'position': payload['p'],
+        'admitted': admitted,
+        'ahead': ahead,
+        'retry_after': round(wait, 2) if wait is not None else None,
+    })
 
 
 # 🙋 View My Tickets
@@ -80,15 +183,46 @@ class MyTicketsView(generics.ListAPIView):
 
 # 🎫 QR Code Ticket Validation API
 @api_view(['GET', 'POST'])
+@authentication_classes(SCAN_AUTHENTICATION)
 @permission_classes([IsOrganizerOrAdmin])  # Only organizers/admins can scan
+@throttle_classes(SCAN_THROTTLES)
+@scan_metrics.instrumented
+@idempotent
 def validate_ticket(request, validation_token):
     """
     Validate a ticket using its validation token from QR code
     GET: Check ticket status without marking as used
     POST: Mark ticket as used/scanned (only by event organizer)
     """
+    recent = recent_scans.lookup(validation_token)
+    if recent is not None:
+        event_id, organizer_id = recent
+        if Event(pk=event_id, organizer_id=organizer_id).can_be_scanned_by(request.user):
+            # A replay of a code that just got someone in; refused before any query
+            request.scan_event_id = event_id
+            return Response({
+                'valid': False,
+                'status': 'used',
+                'message': 'Ticket cannot be scanned',
+                'reasons': ['Ticket was scanned moments ago']
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    if request.method == 'GET' and validation_cache.get_config()['ENABLED']:
+        projection = validation_cache.lookup(validation_token)
+        if projection is None:
+            return Response({
+                'valid': False,
+                'status': 'invalid',
+                'message': 'Invalid ticket token'
+            }, status=status.HTTP_404_NOT_FOUND)
+        return _check_projection(request, projection)
+
     try:
-        ticket = get_object_or_404(Ticket, validation_token=validation_token)
+        # Event, organizer and holder come back in the same query
+        ticket = get_object_or_404(
+            Ticket.objects.select_related('event__organizer', 'user'),
+            validation_token=validation_token
+        )
     except:
         return Response({
             'valid': False,
@@ -96,32 +230,112 @@ def validate_ticket(request, validation_token):
             'message': 'Invalid ticket token'
         }, status=status.HTTP_404_NOT_FOUND)
 
+    return _scan_ticket(request, ticket)
+
+
+@api_view(['GET', 'POST'])
+@authentication_classes(SCAN_AUTHENTICATION)
+@permission_classes([IsOrganizerOrAdmin])
+@throttle_classes(SCAN_THROTTLES)
+@scan_metrics.instrumented
+@idempotent
+def validate_signed_ticket(request, payload):
+    """
+    Validate a signed QR payload (see core/signed_tickets.py)
+    Forged, expired or wrong-event codes are refused before any database
+    query; pass ?event=<id> to have the scanner's event enforced
+    GET/POST: as validate_ticket
+    """
+    try:
+        signed = signed_tickets.verify(payload, event_id=request.query_params.get('event') or None)
+    except signed_tickets.InvalidSignedTicket as exc:
+        return Response({
+            'valid': False,
+            'status': exc.reason,
+            'message': 'Invalid ticket code'
+        }, status=status.HTTP_403_FORBIDDEN if exc.reason == 'wrong_event' else status.HTTP_400_BAD_REQUEST)
+    except ValueError:
+        return Response({
+            'valid': False,
+            'status': 'invalid',
+            'message': 'event must be an event id'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    ticket = Ticket.objects.select_related('event__organizer', 'user').filter(
+        pk=signed.ticket_id, event_id=signed.event_id
+    ).first()
+    if ticket is None:
+        return Response({
+            'valid': False,
+            'status': 'invalid',
+            'message': 'Invalid ticket token'
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    return _scan_ticket(request, ticket)
+
+
+def _scan_ticket(request, ticket):
+    """Permission, scannability and (for POST) the scan itself, shared by both validate views"""
+    refusal = _check_projection(request, validation_cache.project(ticket))
+    if refusal is not None or request.method == 'GET':
+        return refusal
+
+    # POST request: Mark ticket as used
+    # False means another gate won the race since the check above
+    if not ticket.mark_as_used(request.user):
+        return Response({
+            'valid': False,
+            'status': 'used',
+            'message': 'Ticket cannot be scanned',
+            'reasons': ['Ticket was scanned at another gate a moment ago'],
+            'ticket': TicketValidationSerializer(ticket).data
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'valid': True,
+        'status': 'scanned',
+        'message': f'Ticket successfully scanned by {request.user.username}',
+        'scanned_at': ticket.scanned_at,
+        'scanned_by': request.user.username,
+        'event': ticket.event.name,
+        'ticket': TicketValidationSerializer(ticket).data
+    })
+
+
+def _check_projection(request, projection):
+    """
+    Refusal response for a ticket's validation projection, or for GET the
+    'scannable' response; None when a POST may go ahead
+    """
+    request.scan_event_id = projection['event_id']
+
     # Check if user can scan this event's tickets
-    if not ticket.event.can_be_scanned_by(request.user):
+    event = Event(pk=projection['event_id'], organizer_id=projection['organizer_id'])
+    if not event.can_be_scanned_by(request.user):
         return Response({
             'valid': False,
             'status': 'forbidden',
-            'message': f'You are not authorized to scan tickets for event: {ticket.event.name}',
-            'event': ticket.event.name,
-            'event_organizer': ticket.event.organizer.username
+            'message': f"You are not authorized to scan tickets for event: {projection['event_name']}",
+            'event': projection['event_name'],
+            'event_organizer': projection['organizer']
         }, status=status.HTTP_403_FORBIDDEN)
 
     # Check if ticket is scannable
-    if not ticket.is_scannable():
+    if not projection['scannable']:
         reasons = []
-        if ticket.status != 'paid':
-            reasons.append(f"Ticket status is '{ticket.status}', not 'paid'")
-        if not ticket.is_valid:
+        if projection['status'] != 'paid':
+            reasons.append(f"Ticket status is '{projection['status']}', not 'paid'")
+        if not projection['is_valid']:
             reasons.append("Ticket has been invalidated")
-        if ticket.scanned_at:
-            reasons.append(f"Ticket already scanned at {ticket.scanned_at}")
+        if projection['scanned_at']:
+            reasons.append(f"Ticket already scanned at {projection['scanned_at']}")
             
         return Response({
             'valid': False,
-            'status': ticket.status,
+            'status': projection['status'],
             'message': 'Ticket cannot be scanned',
             'reasons': reasons,
-            'ticket': TicketValidationSerializer(ticket).data
+            'ticket': projection['ticket']
         }, status=status.HTTP_400_BAD_REQUEST)
 
     # GET request: Just validate without marking as used
@@ -131,70 +345,97 @@ def validate_ticket(request, validation_token):
             'status': 'scannable',
             'message': 'Ticket is valid and ready to scan',
             'event': {
-                'name': ticket.event.name,
-                'organizer': ticket.event.organizer.username,
-                'start_time': ticket.event.start_time
+                'name': projection['event_name'],
+                'organizer': projection['organizer'],
+                'start_time': projection['event_start']
             },
-            'ticket': TicketValidationSerializer(ticket).data
+            'ticket': projection['ticket']
         })
+    return None
 
-    # POST request: Mark ticket as used
-    if request.method == 'POST':
-        # Mark ticket as used
-        ticket.mark_as_used(request.user)
 
-        return Response({
-            'valid': True,
-            'status': 'scanned',
-            'message': f'Ticket successfully scanned by {request.user.username}',
-            'scanned_at': ticket.scanned_at,
-            'scanned_by': request.user.username,
-            'event': ticket.event.name,
-            'ticket': TicketValidationSerializer(ticket).data
-        })
+def _parse_token_batch(request):
+    """
+    (tokens, parsed UUIDs, error response) for the bulk scan endpoints
+    Malformed tokens parse to None instead of raising per item
+    """
+    if not hasattr(request.data, 'get'):
+        return None, None, Response({
+            'error': 'Expected an object with a tokens list'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    tokens = request.data.get('tokens', [])
+    if not tokens:
+        return None, None, Response({
+            'error': 'No tokens provided'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    limit = getattr(settings, 'MAX_BULK_VALIDATE_TOKENS', 1000)
+    if not isinstance(tokens, list) or len(tokens) > limit:
+        return None, None, Response({
+            'error': f'tokens must be a list of at most {limit} validation tokens'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    parsed = []
+    for token in tokens:
+        try:
+            parsed.append(uuid.UUID(str(token)))
+        except ValueError:
+            parsed.append(None)
+    return tokens, parsed, None
 
 
 # 🔍 Bulk Ticket Status Check (for event organizers)
 @api_view(['POST'])
+@authentication_classes(SCAN_AUTHENTICATION)
 @permission_classes([IsOrganizerOrAdmin])
 def bulk_validate_tickets(request):
     """
     Check status of multiple tickets at once
     POST body: {"tokens": ["token1", "token2", "token3"]}
+    All tickets come back in one query; permissions are checked once per event
     """
-    tokens = request.data.get('tokens', [])
-    if not tokens:
-        return Response({
-            'error': 'No tokens provided'
-        }, status=status.HTTP_400_BAD_REQUEST)
+    tokens, parsed, error = _parse_token_batch(request)
+    if error:
+        return error
+
+    tickets = {
+        ticket.validation_token: ticket
+        for ticket in Ticket.objects.select_related('event', 'user').filter(
+            validation_token__in={token for token in parsed if token}
+        )
+    }
+    can_scan = {}
 
     results = []
-    for token in tokens:
-        try:
-            ticket = Ticket.objects.get(validation_token=token)
-            # Check if user can access this ticket's event
-            if not ticket.event.can_be_scanned_by(request.user):
-                results.append({
-                    'token': token,
-                    'valid': False,
-                    'status': 'forbidden',
-                    'ticket': None
-                })
-                continue
-                
+    for token, validation_token in zip(tokens, parsed):
+        ticket = tickets.get(validation_token)
+        if ticket is None:
             results.append({
                 'token': token,
-                'valid': ticket.is_scannable(),
-                'status': ticket.status,
-                'ticket': TicketValidationSerializer(ticket).data
+                'valid': False,
+                'status': 'not_found' if validation_token else 'invalid',
+                'ticket': None
             })
-        except Ticket.DoesNotExist:
+            continue
+
+        # Check if user can access this ticket's event
+        if ticket.event_id not in can_scan:
+            can_scan[ticket.event_id] = ticket.event.can_be_scanned_by(request.user)
+        if not can_scan[ticket.event_id]:
             results.append({
                 'token': token,
                 'valid': False,
-                'status': 'not_found',
+                'status': 'forbidden',
                 'ticket': None
             })
+            continue
+
+        results.append({
+            'token': token,
+            'valid': ticket.is_scannable(),
+            'status': ticket.status,
+            'ticket': TicketValidationSerializer(ticket).data
+        })
 
     return Response({
         'results': results,
@@ -203,6 +444,99 @@ def bulk_validate_tickets(request):
     })
 
 
+# ✅ Bulk Check-in (batch scanners at the gate)
+@api_view(['POST'])
+@authentication_classes(SCAN_AUTHENTICATION)
+@permission_classes([IsOrganizerOrAdmin])
+@throttle_classes(SCAN_THROTTLES)
+@idempotent
+def bulk_check_in(request):
+    """
+    Mark many tickets used at once
+    POST body: {"tokens": ["token1", "token2", "token3"]}
+    Outcome per token: checked_in, already_used, not_scannable, forbidden,
+    not_found or invalid (malformed token)
+    """
+    tokens, parsed, error = _parse_token_batch(request)
+    if error:
+        return error
+
+    tickets = {
+        ticket.validation_token: ticket
+        for ticket in Ticket.objects.select_related('event').filter(
+            validation_token__in={token for token in parsed if token}
+        )
+    }
+
+    can_scan = {}
+    outcomes = {}
+    for validation_token, ticket in tickets.items():
+        if ticket.event_id not in can_scan:
+            can_scan[ticket.event_id] = ticket.event.can_be_scanned_by(request.user)
+        if not can_scan[ticket.event_id]:
+            outcomes[validation_token] = 'forbidden'
+        elif ticket.status == 'used' or ticket.scanned_at:
+            outcomes[validation_token] = 'already_used'
+        elif not ticket.is_scannable():
+            outcomes[validation_token] = 'not_scannable'
+        else:
+            outcomes[validation_token] = 'checked_in'
+
+    eligible = [tickets[token].pk for token, outcome in outcomes.items() if outcome == 'checked_in']
+    now = timezone.now()
+    if eligible:
+        with transaction.atomic():
+            # Same conditions as is_scannable, so a concurrent scan cannot be overwritten
+            updated = Ticket.objects.filter(
+                pk__in=eligible, status='paid', is_valid=True, scanned_at__isnull=True
+            ).update(status='used', is_valid=False, scanned_at=now, scanned_by=request.user, updated_at=now)
+            validation_cache.invalidate([token for token, outcome in outcomes.items() if outcome == 'checked_in'])
+            if updated != len(eligible):
+                # Lost some to another scanner; only rows stamped by this request are ours
+                ours = set(Ticket.objects.filter(
+                    pk__in=eligible, scanned_at=now, scanned_by=request.user
+                ).values_list('pk', flat=True))
+                for token, ticket in tickets.items():
+                    if outcomes[token] == 'checked_in' and ticket.pk not in ours:
+                        outcomes[token] = 'already_used'
+            checked_in = Counter(
+                tickets[token].event_id for token, outcome in outcomes.items() if outcome == 'checked_in'
+            )
+            for event_id, count in checked_in.items():
+                live_feed.publish(event_id, live_feed.CHECKED_IN, count)
+            for event_id, organizer_id in {(t.event_id, t.event.organizer_id) for t in tickets.values()}:
+                recent_scans.record(event_id, organizer_id, [
+                    token for token, outcome in outcomes.items()
+                    if outcome == 'checked_in' and tickets[token].event_id == event_id
+                ])
+
+    results = []
+    seen = set()
+    for token, validation_token in zip(tokens, parsed):
+        if validation_token is None:
+            outcome = 'invalid'
+        elif validation_token not in outcomes:
+            outcome = 'not_found'
+        elif outcomes[validation_token] == 'checked_in' and validation_token in seen:
+            # The same code twice in one batch only gets in once
+            outcome = 'already_used'
+        else:
+            outcome = outcomes[validation_token]
+        seen.add(validation_token)
+        results.append({
+            'token': token,
+            'outcome': outcome,
+            'ticket_id': tickets[validation_token].pk if validation_token in tickets else None
+        })
+
+    return Response({
+        'results': results,
+        'total_checked': len(tokens),
+        'checked_in': sum(1 for r in results if r['outcome'] == 'checked_in'),
+        'scanned_at': now
+    })
+
+
 # 📊 Organizer Dashboard Views
 class OrganizerEventListView(generics.ListAPIView):
     """List events for the current organizer"""
@@ -229,7 +563,7 @@ class EventTicketsView(generics.ListAPIView):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("You don't have permission to view tickets for this event")
         
-        return Ticket.objects.filter(event=event).order_by('-created_at')
+        return Ticket.objects.filter(event=event).exclude(status='unassigned').order_by('-created_at')
 
 
 @api_view(['GET'])
@@ -244,18 +578,288 @@ def event_stats(request, event_id):
             'error': 'You don\'t have permission to view stats for this event'
         }, status=status.HTTP_403_FORBIDDEN)
     
-    tickets = Ticket.objects.filter(event=event)
-    
+    # One grouped query, answered from ticket_event_status_idx
+    by_status = dict(
+        Ticket.objects.filter(event=event).exclude(status='unassigned')
+        .values_list('status').annotate(count=Count('pk')).order_by()
+    )
+    pending, paid, cancelled, used = (by_status.get(s, 0) for s in ('pending', 'paid', 'cancelled', 'used'))
+    total = pending + paid + cancelled + used
+    sold = paid + used
+
     stats = {
         'event_name': event.name,
         'event_capacity': event.capacity,
-        'total_tickets': tickets.count(),
-        'pending_tickets': tickets.filter(status='pending').count(),
-        'paid_tickets': tickets.filter(status='paid').count(),
-        'cancelled_tickets': tickets.filter(status='cancelled').count(),
-        'scanned_tickets': tickets.filter(status='used').count(),
-        'available_capacity': event.capacity - tickets.count(),
-        'scan_rate': f"{(tickets.filter(status='used').count() / max(tickets.filter(status='paid').count(), 1)) * 100:.1f}%"
+        'total_tickets': total,
+        'pending_tickets': pending,
+        'paid_tickets': paid,
+        'cancelled_tickets': cancelled,
+        'scanned_tickets': used,
+        'available_capacity': event.capacity - (total - cancelled),  # cancelled seats are free again
+        'scan_rate': f"{(used / max(paid, 1)) * 100:.1f}%",
+        # Ticket counts to multiply by the ticket price
+        'revenue_breakdown': {
+            'sold': sold,  # paid, whether or not checked in yet
+            'awaiting_payment': pending,
+            'cancelled': cancelled,
+        },
+        'attendance': {
+            'checked_in': used,
+            'remaining': paid,  # sold but not through the gate yet
+            'checked_in_rate': round(used / sold, 4) if sold else None,
+        },
     }
-    
+
     return Response(stats)
+
+
+# 📣 Attendee Broadcasts
+@api_view(['GET', 'POST'])
+@permission_classes([IsOrganizerOrAdmin])
+def event_broadcasts(request, event_id):
+    """
+    GET: List the event's broadcasts with their progress
+    POST: Queue an email to every ticket holder; send_broadcasts delivers it
+    POST body: {"subject": "...", "body": "... {{ event.start_time }} ..."}
+    """
+    event = get_object_or_404(Event, id=event_id)
+
+    if not event.can_be_scanned_by(request.user):
+        return Response({
+            'error': 'You don\'t have permission to message this event\'s attendees'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    if request.method == 'GET':
+        broadcasts = event.broadcasts.order_by('-created_at')
+        return Response(BroadcastSerializer(broadcasts, many=True).data)
+
+    serializer = BroadcastSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    serializer.save(event=event, created_by=request.user)
+    return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+# 📦 Offline Scan Manifests
+def _manifest_response(response, event, version):
+    response['Content-Disposition'] = f'attachment; filename="event-{event.pk}-{version}.manifest"'
+    response['X-Manifest-Version'] = str(version)
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsOrganizerOrAdmin])
+def event_manifest(request, event_id):
+    """
+    Signed binary manifest of the event's tickets for offline gate scanning
+    GET ?variant=bloom for the Bloom filter variant (admissible tokens only)
+    Layout is documented in core/manifest.py
+    """
+    event = get_object_or_404(Event, id=event_id)
+
+    if not event.can_be_scanned_by(request.user):
+        return Response({
+            'error': 'You don\'t have permission to scan tickets for this event'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    if request.query_params.get('variant') == 'bloom':
+        version, body = manifest.bloom_manifest(event)
+        return _manifest_response(HttpResponse(body, content_type='application/octet-stream'), event, version)
+
+    version, chunks = manifest.full_manifest(event)
+    return _manifest_response(StreamingHttpResponse(chunks, content_type='application/octet-stream'), event, version)
+
+
+@api_view(['GET'])
+@permission_classes([IsOrganizerOrAdmin])
+def event_manifest_delta(request, event_id):
+    """
+    Tickets that changed since a manifest version: GET ?since=<version>
+    Cancelled tickets come through with status 0 so devices drop them
+    """
+    event = get_object_or_404(Event, id=event_id)
+
+    if not event.can_be_scanned_by(request.user):
+        return Response({
+            'error': 'You don\'t have permission to scan tickets for this event'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        since = int(request.query_params['since'])
+        if since < 0:
+            raise ValueError
+    except (KeyError, ValueError):
+        return Response({
+            'error': 'since must be a manifest version'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    version, chunks = manifest.delta_manifest(event, since)
+    return _manifest_response(StreamingHttpResponse(chunks, content_type='application/octet-stream'), event, version)
+
+
+# 🔄 Offline Scan Log Sync
+@api_view(['POST'])
+@authentication_classes(SCAN_AUTHENTICATION)
+@permission_classes([IsOrganizerOrAdmin])
+@throttle_classes(SCAN_THROTTLES)
+def sync_scan_log(request, event_id):
+    """
+    Upload a gate device's offline scan log as NDJSON, one record per line:
+    {"token": "<validation token>", "device": "gate-3", "scanned_at": "<ISO 8601>"}
+    The body is read line by line; the earliest scan of each ticket wins and
+    clashes between gates are kept as ScanConflict rows
+    """
+    event = get_object_or_404(Event, id=event_id)
+
+    if not event.can_be_scanned_by(request.user):
+        return Response({
+            'error': 'You don\'t have permission to scan tickets for this event'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    summary = scan_sync.ingest_scan_log(event, request.stream or [], request.user)
+    return Response(summary)
+
+
+# 🔥 Validation Cache
+@api_view(['POST'])
+@permission_classes([IsOrganizerOrAdmin])
+def warm_validation_cache(request, event_id):
+    """Pre-load the event's ticket projections before doors open"""
+    event = get_object_or_404(Event, id=event_id)
+
+    if not event.can_be_scanned_by(request.user):
+        return Response({
+            'error': 'You don\'t have permission to scan tickets for this event'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    if not validation_cache.get_config()['ENABLED']:
+        return Response({
+            'error': 'The validation cache is disabled'
+        }, status=status.HTTP_409_CONFLICT)
+
+    return Response({'warmed': validation_cache.warm(event)})
+
+
+@api_view(['GET'])
+@permission_classes([IsOrganizerOrAdmin])
+def validation_cache_stats(request):
+    """Hit/miss counters of the validation cache"""
+    return Response({
+        'enabled': validation_cache.get_config()['ENABLED'],
+        **validation_cache.stats()
+    })
+
+
+# 📈 Live Scan Metrics
+@api_view(['GET'])
+@permission_classes([IsOrganizerOrAdmin])
+def event_scan_metrics(request, event_id):
+    """
+    Scan rate, accept/reject mix and gate latency over the last ?window=
+    seconds (default 60), overall and per scanner; read from in-process
+    aggregates, no database query beyond the permission check
+    """
+    event = get_object_or_404(Event, id=event_id)
+
+    if not event.can_be_scanned_by(request.user):
+        return Response({
+            'error': 'You don\'t have permission to scan tickets for this event'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    config = scan_metrics.get_config()
+    try:
+        window = int(request.query_params.get('window', 60))
+    except ValueError:
+        window = 0
+    if not 0 < window <= config['RETENTION']:
+        return Response({
+            'error': f"window must be between 1 and {config['RETENTION']} seconds"
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({'enabled': config['ENABLED'], **scan_metrics.snapshot(event.pk, window=window)})
+
+
+# 📡 Live Check-in Feed
+def _live_feed_access(request, event_id):
+    """(event, None) for an organizer who may watch the event, else (None, error response)"""
+    # Async views bypass DRF, so authenticate the same way its views do
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        allowed = IsOrganizerOrAdmin().has_permission(drf_request, None)
+    except Exception:
+        allowed = False
+    if not allowed:
+        return None, JsonResponse({'error': 'Authentication credentials were not provided or are invalid'}, status=401)
+
+    event = Event.objects.filter(id=event_id).first()
+    if event is None:
+        return None, JsonResponse({'error': 'Event not found'}, status=404)
+    if not event.can_be_scanned_by(drf_request.user):
+        return None, JsonResponse({
+            'error': 'You don\'t have permission to view stats for this event'
+        }, status=403)
+    return event, None
+
+
+async def event_live_feed(request, event_id):
+    """
+    Server-Sent Events stream of the event's check-in and booking counts
+    (see core/live_feed.py); a replacement for polling stats/. Serve under ASGI.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    if not isinstance(request, ASGIRequest):
+        # A WSGI server drains an async stream to the end before sending any
+        # of it; this one never ends, so it would hold the worker forever
+        return JsonResponse({
+            'error': 'The live feed needs the ASGI server (backend.asgi:application); poll stats/ instead'
+        }, status=501)
+    event, error = await sync_to_async(_live_feed_access)(request, event_id)
+    if error is not None:
+        return error
+
+    response = StreamingHttpResponse(live_feed.stream(event), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # let nginx pass events through unbuffered
+    return response
+
+
+# 🔑 Scanner Sessions
+@api_view(['POST'])
+@permission_classes([IsOrganizerOrAdmin])
+def open_scanner_session(request):
+    """
+    Open a scanner session for the given events; gate devices send the
+    token as `Authorization: Scanner <token>` and are authorized per scan
+    without a database lookup (see core/scanner_sessions.py)
+    """
+    event_ids = request.data.get('events') if hasattr(request.data, 'get') else None
+    max_events = scanner_sessions.get_config()['MAX_EVENTS']
+    # Ids the primary key column can hold; anything larger fails in the database
+    _, max_id = connection.ops.integer_field_range(Event._meta.pk.get_internal_type())
+    if (
+        not isinstance(event_ids, list) or not 0 < len(event_ids) <= max_events
+        or not all(
+            isinstance(event_id, int) and not isinstance(event_id, bool) and 0 < event_id <= max_id
+            for event_id in event_ids
+        )
+    ):
+        return Response({
+            'error': f'events must be a list of 1 to {max_events} event ids'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    events = list(Event.objects.filter(pk__in=event_ids).only('pk', 'organizer_id'))
+    missing = set(event_ids) - {event.pk for event in events}
+    if missing:
+        return Response({'error': f'Events not found: {sorted(missing)}'}, status=status.HTTP_404_NOT_FOUND)
+    forbidden = [event.pk for event in events if not event.can_be_scanned_by(request.user)]
+    if forbidden:
+        return Response({
+            'error': f'You don\'t have permission to scan tickets for events: {forbidden}'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    max_age = scanner_sessions.get_config()['MAX_AGE']
+    return Response({
+        'token': scanner_sessions.open_session(request.user, set(event_ids)),
+        'events': sorted(set(event_ids)),
+        'expires_at': timezone.now() + timedelta(seconds=max_age),
+    }, status=status.HTTP_201_CREATED)
@@ -0,0 +1,171 @@
+"""
+Virtual waiting room in front of events/<id>/book/.
+
+Clients join an event's queue and get a signed token carrying their
+position. An admission cursor advances at WAITING_ROOM['ADMIT_PER_SECOND']
+and every position below it may book once. The cursor never runs ahead of
+the number of positions handed out, so an idle queue cannot bank up
+admissions that a later surge would rush through.
+
+Queue state lives in a pluggable store (WAITING_ROOM['STORE']).
+"""
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+TOKEN_SALT = 'core.waiting_room'
+
+DEFAULTS = {
+    'ENABLED': False,
+    'ADMIT_PER_SECOND': 50,
+    'TOKEN_MAX_AGE': 600,
+    'STORE': 'core.waiting_room.CacheQueueStore',
+    'CACHE_ALIAS': 'default',
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'WAITING_ROOM', {})}
+
+
+class BaseQueueStore:
+    """
+    Keeps, per event, how many positions were issued and where the
+    admission cursor is. Subclasses provide storage; the cursor arithmetic
+    lives here.
+    """
+
+    def issue(self, event_id, rate, now):
+        """Hand out the next position (0-based) in the event's queue"""
+        raise NotImplementedError
+
+    def admitted(self, event_id, rate, now):
+        """Return the cursor: every position below it is admitted"""
+        raise NotImplementedError
+
+    def consume(self, event_id, position, ttl):
+        """Mark an admission as used; False if it already was"""
+        raise NotImplementedError
+
+    @staticmethod
+    def advance(state, issued, rate, now):
+        cursor, updated_at = state or (0.0, now)
+        cursor = min(float(issued), cursor + max(now - updated_at, 0) * rate)
+        return cursor, now
+
+
+class InMemoryQueueStore(BaseQueueStore):
+    """Process-local store; suitable for tests and single-process servers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._issued = {}
+        self._cursors = {}
+        self._consumed = set()
+        self._expiries = deque()
+
+    def issue(self, event_id, rate, now):
+        with self._lock:
+            position = self._issued.get(event_id, 0)
+            self._issued[event_id] = position + 1
+            self._cursors[event_id] = self.advance(self._cursors.get(event_id), position + 1, rate, now)
+            return position
+
+    def admitted(self, event_id, rate, now):
+        with self._lock:
+            state = self.advance(self._cursors.get(event_id), self._issued.get(event_id, 0), rate, now)
+            self._cursors[event_id] = state
+            return int(state[0])
+
+    def consume(self, event_id, position, ttl):
+        now = time.time()
+        with self._lock:
+            while self._expiries and self._expiries[0][0] <= now:
+                self._consumed.discard(self._expiries.popleft()[1])
+            if (event_id, position) in self._consumed:
+                return False
+            self._consumed.add((event_id, position))
+            self._expiries.append((now + ttl, (event_id, position)))
+            return True
+
+
+class CacheQueueStore(BaseQueueStore):
+    """
+    Store backed by a Django cache, shared between workers when the cache
+    is. Positions are handed out with atomic increments; the cursor is
+    updated last-writer-wins, which can only shift admissions slightly
+    because it is always capped at the number of positions issued.
+    """
+
+    def __init__(self):
+        self.cache = caches[get_config()['CACHE_ALIAS']]
+
+    def _keys(self, event_id):
+        return f'waiting-room:{event_id}:issued', f'waiting-room:{event_id}:cursor'
+
+    def issue(self, event_id, rate, now):
+        issued_key, cursor_key = self._keys(event_id)
+        self.cache.add(issued_key, 0, timeout=None)
+        position = self.cache.incr(issued_key) - 1
+        state = self.advance(self.cache.get(cursor_key), position + 1, rate, now)
+        self.cache.set(cursor_key, state, timeout=None)
+        return position
+
+    def admitted(self, event_id, rate, now):
+        issued_key, cursor_key = self._keys(event_id)
+        state = self.advance(self.cache.get(cursor_key), self.cache.get(issued_key, 0), rate, now)
+        self.cache.set(cursor_key, state, timeout=None)
+        return int(state[0])
+
+    def consume(self, event_id, position, ttl):
+        return self.cache.add(f'waiting-room:{event_id}:used:{position}', 1, timeout=ttl)
+
+
+@lru_cache(maxsize=None)
+def _load_store(path):
+    return import_string(path)()
+
+
+def get_queue_store():
+    return _load_store(get_config()['STORE'])
+
+
+def join_queue(event_id, user_id):
+    """Issue a queue position and its signed token"""
+    config = get_config()
+    position = get_queue_store().issue(event_id, config['ADMIT_PER_SECOND'], time.time())
+    token = signing.dumps({'e': event_id, 'u': user_id, 'p': position}, salt=TOKEN_SALT)
+    return position, token
+
+
+def read_token(token, event_id):
+    """Return the token payload, or None if it is forged, stale or for another event"""
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT, max_age=get_config()['TOKEN_MAX_AGE'])
+    except signing.BadSignature:
+        return None
+    if payload.get('e') != event_id:
+        return None
+    return payload
+
+
+def queue_status(event_id, position):
+    """Return (admitted, positions_ahead, seconds_to_wait) without touching the database"""
+    rate = get_config()['ADMIT_PER_SECOND']
+    cursor = get_queue_store().admitted(event_id, rate, time.time())
+    ahead = max(position - cursor + 1, 0)
+    return ahead == 0, ahead, ahead / rate if rate else None
+
+
+def admit(event_id, position):
+    """Use up an admission; False if the position is not admitted yet or was already used"""
+    admitted, _, _ = queue_status(event_id, position)
+    if not admitted:
+        return False
+    return get_queue_store().consume(event_id, position, get_config()['TOKEN_MAX_AGE'])